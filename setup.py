@@ -64,6 +64,8 @@ setup_args = dict(
     # Optional requirements
     extras_require={
         "test": ["pytest", "nose", "coverage"],
+        "zstd": ["zstandard"],
+        "numpy": ["numpy"],
     },
     setup_requires=["pytest-runner"],
     tests_require=["pytest"],
@@ -71,7 +73,8 @@ setup_args = dict(
         "console_scripts": [
             "pii-prep-csv = pii_preprocess.app.csvdoc:main",
             "pii-prep-text = pii_preprocess.app.textdoc:main",
-            "pii-doc = pii_preprocess.app.doc:main"
+            "pii-doc = pii_preprocess.app.doc:main",
+            "pii-doc-dataset = pii_preprocess.app.dataset:main"
         ]
     },
     include_package_data=True,
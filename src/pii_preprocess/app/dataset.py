@@ -0,0 +1,294 @@
+"""
+Script to convert a whole dataset (a directory tree of documents) to Source
+Documents, incrementally: a manifest of processed files is kept in the output
+directory, so that re-running it converts only new or changed files, and
+removes the outputs for deleted inputs.
+"""
+
+import os
+import json
+import tempfile
+from pathlib import Path
+from argparse import ArgumentParser, Namespace
+
+from typing import Dict, Iterator, List
+
+from pii_data.helper.exception import InvArgException
+from pii_data.types.doc import SrcDocument
+from pii_data.types.doc.document import TableSrcDocument
+from pii_data.types.doc.localdoc import dump_file
+
+from ..loader import DocumentLoader
+from ..instrument import StatsCollector
+from ..loader.utils import base_extension, file_fingerprint
+
+
+# Name of the manifest file, in the output directory
+MANIFEST_NAME = ".pii-manifest.json"
+
+# Format indicator for the manifest
+FMT_MANIFEST = "pii-preprocess:manifest:v1"
+
+# Number of conversions between manifest checkpoints
+CHECKPOINT = 100
+
+
+class ChunkCounter:
+    """
+    A document wrapper that counts the chunks with data produced by
+    iter_struct() (the iterator used to write documents), including those
+    nested in tree nodes
+    """
+
+    def __init__(self, doc: SrcDocument):
+        self.doc = doc
+        self.chunks = 0
+
+    def __getattr__(self, name: str):
+        return getattr(self.doc, name)
+
+    def _count(self, chunk: Dict):
+        self.chunks += "data" in chunk
+        for sub in chunk.get("chunks", ()):
+            self._count(sub)
+
+    def iter_struct(self) -> Iterator[Dict]:
+        for chunk in self.doc.iter_struct():
+            self._count(chunk)
+            yield chunk
+
+
+def file_state(name: Path, content_hash: bool = False) -> Dict:
+    """
+    Return the fingerprint of an input file, without its path
+    """
+    fp = file_fingerprint(name, content_hash)
+    del fp["path"]
+    return fp
+
+
+class DatasetConverter:
+    """
+    Convert all documents in a directory tree, keeping a manifest with
+    the fingerprint, output path, number of chunks and status of each input
+    """
+
+    def __init__(self, loader: DocumentLoader, inputdir: str, outputdir: str,
+                 format: str = "yml", workers: int = 1,
+                 content_hash: bool = False):
+        """
+          :param loader: the DocumentLoader object to use
+          :param inputdir: the base directory for input documents
+          :param outputdir: the base directory to write converted documents to
+          :param format: output format ("yml", "json" or "txt"; table
+            documents cannot be written as "txt", and fail conversion)
+          :param workers: number of worker processes to use
+          :param content_hash: use also file content hashes to detect changes
+        """
+        self.loader = loader
+        self.inputdir = Path(inputdir)
+        self.outputdir = Path(outputdir)
+        self.format = format
+        self.workers = workers
+        self.content_hash = content_hash
+        self.manifest_name = self.outputdir / MANIFEST_NAME
+        self.manifest = self.read_manifest()
+
+
+    def __repr__(self) -> str:
+        return f"<DatasetConverter {self.inputdir}>"
+
+
+    def read_manifest(self) -> Dict:
+        """
+        Read the manifest for the dataset. If it does not exist, or it was
+        created with a different loader configuration, start a new one.
+        """
+        config = self.loader.config_hash()
+        empty = {"format": FMT_MANIFEST, "config": config, "files": {}}
+        try:
+            with open(self.manifest_name, encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return empty
+        except ValueError as e:
+            raise InvArgException("invalid manifest {}: {}",
+                                  self.manifest_name, e) from e
+        if manifest.get("format") != FMT_MANIFEST:
+            raise InvArgException("invalid manifest format in {}",
+                                  self.manifest_name)
+        if manifest.get("config") != config:
+            # Keep the entries, so that outputs can be cleaned, but force
+            # all of them to be converted again
+            for entry in manifest["files"].values():
+                entry["status"] = "stale"
+            manifest["config"] = config
+        return manifest
+
+
+    def write_manifest(self):
+        """
+        Write (atomically) the manifest to the output directory
+        """
+        self.outputdir.mkdir(parents=True, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=self.outputdir, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=1, ensure_ascii=False)
+        os.replace(tmpname, self.manifest_name)
+
+
+    def inputs(self) -> List[str]:
+        """
+        Return the list of input documents, as paths relative to the input
+        directory
+        """
+        out = []
+        outdir = self.outputdir.resolve()
+        for root, dirs, files in os.walk(self.inputdir):
+            dirs.sort()
+            root = Path(root)
+            absroot = root.resolve()
+            if absroot == outdir or outdir in absroot.parents:
+                continue
+            for name in sorted(files):
+                if base_extension(name) in self.loader.types:
+                    out.append(str((root / name).relative_to(self.inputdir)))
+        return out
+
+
+    def output_name(self, relname: str) -> str:
+        """
+        Return the output name for an input document, relative to the output
+        directory
+        """
+        return f"{relname}.{self.format}"
+
+
+    def _remove_output(self, entry: Dict):
+        """
+        Remove the output file for a manifest entry, if it exists
+        """
+        if entry.get("output"):
+            try:
+                os.unlink(self.outputdir / entry["output"])
+            except FileNotFoundError:
+                pass
+
+
+    def write_output(self, doc: SrcDocument, outpath: Path) -> ChunkCounter:
+        """
+        Write (atomically) a converted document, so that a document failing
+        while it is being written leaves no partial output
+          :return: the document wrapper, with the number of written chunks
+        """
+        if self.format == "txt" and isinstance(doc, TableSrcDocument):
+            raise InvArgException("table documents cannot be written in "
+                                  "txt format")
+        outpath.parent.mkdir(parents=True, exist_ok=True)
+        tmpname = outpath.with_name(outpath.name + ".tmp")
+        doc = ChunkCounter(doc)
+        try:
+            dump_file(doc, tmpname, format=self.format)
+            os.replace(tmpname, outpath)
+        except BaseException:
+            tmpname.unlink(missing_ok=True)
+            raise
+        return doc
+
+
+    def run(self) -> Dict[str, int]:
+        """
+        Convert the new or changed documents, and remove the outputs for
+        deleted documents
+          :return: a dict with the number of documents in each situation
+        """
+        files = self.manifest["files"]
+        stats = {"converted": 0, "unchanged": 0, "failed": 0, "deleted": 0}
+
+        # Remove documents that no longer exist
+        current = self.inputs()
+        for relname in set(files) - set(current):
+            self._remove_output(files.pop(relname))
+            stats["deleted"] += 1
+
+        # Find the documents that need conversion
+        todo = {}
+        for relname in current:
+            state = file_state(self.inputdir / relname, self.content_hash)
+            entry = files.get(relname)
+            if entry and entry["status"] == "ok" and entry["fingerprint"] == state \
+               and (self.outputdir / entry["output"]).exists():
+                stats["unchanged"] += 1
+            else:
+                todo[relname] = state
+
+        # Convert them
+        names = [self.inputdir / n for n in todo]
+        for n, res in enumerate(self.loader.iter_many(names,
+                                                      workers=self.workers),
+                                start=1):
+            relname = str(Path(res.name).relative_to(self.inputdir))
+            old = files.get(relname) or {}
+            entry = files[relname] = {"fingerprint": todo[relname]}
+            try:
+                if res.error:
+                    raise res.error
+                outname = self.output_name(relname)
+                doc = self.write_output(res.doc, self.outputdir / outname)
+                entry.update(output=outname, status="ok", chunks=doc.chunks)
+                stats["converted"] += 1
+            except Exception as e:
+                entry.update(output=None, status="error", chunks=0,
+                             error=str(e))
+                stats["failed"] += 1
+                self._remove_output(old)
+            if n % CHECKPOINT == 0:
+                self.write_manifest()
+
+        self.write_manifest()
+        return stats
+
+
+# --------------------------------------------------------------------------
+
+def parse_args():
+    args = ArgumentParser(description="Convert a dataset of documents to PII Source Docs, incrementally")
+    args.add_argument("inputdir", help="Input directory")
+    args.add_argument("outputdir", help="Output directory")
+
+    g0 = args.add_argument_group("Config")
+    g0.add_argument("--config", nargs="+", metavar="CONFIG_FILE",
+                    help="additional loader configuration files")
+
+    g1 = args.add_argument_group("Processing")
+    g1.add_argument("--format", choices=("yml", "json", "txt"), default="yml",
+                    help="output format (default: %(default)s); table documents cannot be written as txt")
+    g1.add_argument("--workers", type=int, default=1,
+                    help="number of worker processes (default: %(default)s)")
+    g1.add_argument("--content-hash", action="store_true",
+                    help="use also file content hashes to detect changes")
+    g1.add_argument("--stats", metavar="JSON_FILE",
+                    help="write per-document loading statistics to a file")
+    return args.parse_args()
+
+
+def main(args: Namespace = None):
+
+    if not args:
+        args = parse_args()
+
+    loader = DocumentLoader(args.config)
+    conv = DatasetConverter(loader, args.inputdir, args.outputdir,
+                            format=args.format, workers=args.workers,
+                            content_hash=args.content_hash)
+    if args.stats:
+        with StatsCollector() as collector:
+            stats = conv.run()
+        collector.dump(args.stats)
+    else:
+        stats = conv.run()
+    print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""
+Open local files for reading, decompressing them if needed, with options for
+faster decompression:
+  - a read-ahead thread, that decompresses the next blocks of the file while
+    the current ones are being parsed (decompressors release the GIL, so both
+    run concurrently)
+  - parallel decompression of files made of several compressed members
+    (gzip members, bzip2 or xz streams, or zstd frames), such as those
+    produced by bgzip or pbzip2, or by concatenating compressed files: the
+    file is divided into ranges starting at member boundaries, and each range
+    is decompressed by a worker process
+
+It supports also zstd compressed files, if the `zstandard` package is
+installed.
+"""
+
+import io
+import os
+import bz2
+import lzma
+import zlib
+import queue
+import threading
+from collections import namedtuple, deque
+
+from typing import Iterable, Iterator, IO, List, Optional, Tuple
+
+from pii_data.helper.io import openfile
+from pii_data.helper.exception import ProcException
+
+
+# Size of the blocks of decompressed data produced
+BLOCK_SIZE = 1 << 20
+
+# Size of the compressed ranges for parallel decompression
+RANGE_SIZE = 1 << 23
+
+# Number of decompressed blocks (or ranges) held ahead of the reader
+READ_AHEAD = 4
+
+# A compression codec:
+#   - magic: the signature at the start of each member
+#   - decompressor: a callable creating a decompressor for a member (an
+#     object with `decompress()`, `eof` and `unused_data`)
+#   - reader: a callable that opens a binary file object for sequential
+#     decompression of a whole file
+Codec = namedtuple("Codec", "magic decompressor reader")
+
+
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError as e:
+        raise ProcException("zstd compressed files need the 'zstandard' package") from e
+
+
+def _gzip_reader(f: IO) -> IO:
+    import gzip
+    return gzip.GzipFile(fileobj=f)
+
+
+CODECS = {
+    ".gz": Codec(b"\x1f\x8b\x08", lambda: zlib.decompressobj(wbits=31),
+                 _gzip_reader),
+    ".bz2": Codec(b"BZh", bz2.BZ2Decompressor, bz2.BZ2File),
+    ".xz": Codec(b"\xfd7zXZ\x00", lzma.LZMADecompressor, lzma.LZMAFile),
+    ".zst": Codec(b"\x28\xb5\x2f\xfd",
+                  lambda: _zstd().ZstdDecompressor().decompressobj(),
+                  lambda f: _zstd().ZstdDecompressor().stream_reader(
+                      f, read_across_frames=True)),
+}
+
+
+def file_codec(name) -> Optional[Codec]:
+    """
+    Return the compression codec for a file, from its extension
+    """
+    return CODECS.get(os.path.splitext(str(name))[1])
+
+
+# ---------------------------------------------------------------------------
+
+
+def sequential_blocks(name: str, codec: Codec,
+                      start: int = 0) -> Iterator[bytes]:
+    """
+    Decompress a file sequentially, as a sequence of blocks
+      :param start: the compressed offset at which to start (must be at a
+        member start)
+    """
+    with open(name, "rb") as raw:
+        raw.seek(start)
+        with codec.reader(raw) as f:
+            yield from iter(lambda: f.read(BLOCK_SIZE), b"")
+
+
+def find_member(f: IO, codec: Codec, pos: int) -> Optional[int]:
+    """
+    Find the first possible member start after a given file position (a
+    position holding the codec signature)
+    """
+    magic = codec.magic
+    f.seek(pos)
+    prev = b""
+    while True:
+        block = f.read(BLOCK_SIZE)
+        if not block:
+            return None
+        buf = prev + block
+        idx = buf.find(magic)
+        if idx >= 0:
+            return pos - len(prev) + idx
+        prev = buf[-len(magic)+1:]
+        pos += len(block)
+
+
+def member_ranges(name: str, codec: Codec,
+                  range_size: int) -> List[Tuple[int, int]]:
+    """
+    Divide a compressed file into ranges that start at possible member starts
+      :return: a list of (start, end) offsets
+    """
+    size = os.path.getsize(name)
+    starts = [0]
+    with open(name, "rb") as f:
+        while starts[-1] + range_size < size:
+            pos = find_member(f, codec, starts[-1] + range_size)
+            if pos is None:
+                break
+            starts.append(pos)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _decompress_range(name: str, ext: str, start: int, end: int,
+                      limit: int) -> Tuple[Optional[bytes], int]:
+    """
+    Decompress the members starting within a file range
+      :param name: the file name
+      :param ext: the compression extension
+      :param start: start offset for the range (it should be a member start)
+      :param end: end offset for the range
+      :param limit: maximum offset to reach for a member that started within
+        the range
+      :return: a tuple (decompressed data, end offset of the last member), or
+        (None, start) if the data could not be decompressed (the start was
+        not a real member start, or a member exceeds the limit)
+    """
+    codec = CODECS[ext]
+    out = []
+    dec = None          # decompressor for the current member
+    try:
+        with open(name, "rb") as f:
+            f.seek(start)
+            bpos = start        # file offset of the buffer start
+            buf = b""
+            while True:
+                if not buf:
+                    buf = f.read(BLOCK_SIZE)
+                    if not buf:
+                        break
+                if dec is None:
+                    dec = codec.decompressor()
+                out.append(dec.decompress(buf))
+                if not dec.eof:
+                    bpos += len(buf)
+                    buf = b""
+                    if bpos > limit:
+                        return None, start
+                    continue
+                # End of a member: go on to the next one, if it starts in
+                # the range
+                buf = dec.unused_data
+                bpos = f.tell() - len(buf)
+                if bpos >= end:
+                    return b"".join(out), bpos
+                dec = None
+    except Exception:
+        return None, start
+    # End of file: valid only at the end of a member
+    return (b"".join(out), bpos) if dec is None else (None, start)
+
+
+def parallel_blocks(name: str, codec: Codec, workers: int) -> Iterator[bytes]:
+    """
+    Decompress a file with several members, using a pool of worker processes
+    over ranges starting at possible member starts. A range whose start
+    does not turn out to be a real member start (because the previous range
+    went past it) is discarded. If a range cannot be decompressed (its
+    members are too large, or there is an error), or it does not start
+    exactly where the previous decompressed range ended, the rest of the
+    file is decompressed sequentially.
+    """
+    ext = os.path.splitext(str(name))[1]
+    ranges = member_ranges(name, codec, RANGE_SIZE)
+    if len(ranges) == 1:
+        yield from sequential_blocks(name, codec)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        it = iter(ranges)
+        pos = 0          # the start of the next member to decompress
+        while True:
+            # Keep a bounded number of ranges being decompressed
+            for start, end in it:
+                pending.append((start, pool.submit(_decompress_range, name,
+                                                   ext, start, end,
+                                                   end + RANGE_SIZE)))
+                if len(pending) >= workers + READ_AHEAD:
+                    break
+            if not pending:
+                return
+            start, fut = pending.popleft()
+            if start < pos:
+                fut.cancel()
+                continue        # already decompressed
+            if start > pos:
+                break           # the members from pos were not decompressed
+            data, stop = fut.result()
+            if data is None:
+                break
+            yield data
+            pos = stop
+
+        # Fall back to sequential decompression
+        for _, fut in pending:
+            fut.cancel()
+    yield from sequential_blocks(name, codec, pos)
+
+
+# ---------------------------------------------------------------------------
+
+
+class BlockReader(io.RawIOBase):
+    """
+    A raw binary stream over a sequence of data blocks
+    """
+
+    def __init__(self, blocks: Iterable[bytes]):
+        self.blocks = iter(blocks)
+        self.buf = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def next_block(self) -> Optional[bytes]:
+        return next(self.blocks, None)
+
+    def readinto(self, b) -> int:
+        while not self.buf:
+            block = self.next_block()
+            if block is None:
+                return 0
+            self.buf = memoryview(block)
+        n = min(len(b), len(self.buf))
+        b[:n] = self.buf[:n]
+        self.buf = self.buf[n:]
+        return n
+
+    def close(self):
+        # Finish the block generator, so that it releases its resources
+        if not self.closed and hasattr(self.blocks, "close"):
+            self.blocks.close()
+        super().close()
+
+
+class ReadAheadReader(BlockReader):
+    """
+    A raw binary stream over a sequence of data blocks, produced in advance
+    by a background thread
+    """
+
+    def __init__(self, blocks: Iterable[bytes], depth: int = READ_AHEAD):
+        super().__init__(blocks)
+        self.queue = queue.Queue(depth)
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+        self.thread.start()
+
+    def _produce(self):
+        """
+        Produce the blocks into the queue (ending with `None`). An exception
+        is passed on to the reader.
+        """
+        try:
+            for block in self.blocks:
+                if self.stop.is_set():
+                    return
+                self.queue.put(block)
+            self.queue.put(None)
+        except BaseException as e:
+            self.queue.put(e)
+        finally:
+            if hasattr(self.blocks, "close"):
+                self.blocks.close()
+
+    def next_block(self) -> Optional[bytes]:
+        if self.stop.is_set():
+            return None
+        block = self.queue.get()
+        if isinstance(block, BaseException):
+            self.stop.set()
+            raise block
+        if block is None:
+            self.stop.set()
+        return block
+
+    def close(self):
+        # Unblock the producer thread and wait for it to finish (it closes
+        # the block generator)
+        self.stop.set()
+        while self.thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        io.RawIOBase.close(self)
+
+
+def open_file(name: str, mode: str = "rt", encoding: str = None,
+              workers: int = 1, readahead: bool = None) -> IO:
+    """
+    Open a local file, decompressing it if it is compressed (gzip, bzip2, xz
+    or zstd)
+      :param name: the file to open
+      :param mode: open mode
+      :param encoding: for text modes, charset encoding
+      :param workers: number of worker processes to decompress a file with
+        several members (1 means sequential decompression)
+      :param readahead: decompress in a background thread (default is to
+        do it for compressed files)
+    """
+    codec = file_codec(name)
+    if codec is None or not mode.startswith("r") or \
+       not isinstance(name, (str, os.PathLike)):
+        return openfile(name, mode, encoding)
+
+    if workers > 1:
+        blocks = parallel_blocks(name, codec, workers)
+    elif readahead is False and codec is not CODECS[".zst"]:
+        return openfile(name, mode, encoding)
+    else:
+        blocks = sequential_blocks(name, codec)
+
+    raw = BlockReader(blocks) if readahead is False else ReadAheadReader(blocks)
+    f = io.BufferedReader(raw, BLOCK_SIZE)
+    if mode.endswith("b"):
+        return f
+    return io.TextIOWrapper(f, encoding=encoding or "utf-8")
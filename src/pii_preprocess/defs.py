@@ -1,2 +1,5 @@
 # Config section name for the preprocessor loader
 FMT_CONFIG_LOADER = "pii-preprocess:loader:v1"
+
+# Extensions for compressed files
+COMPRESSION_EXT = (".gz", ".bz2", ".xz", ".zst")
@@ -1,2 +1,12 @@
-from .csv import CsvDocument, LocalCsvDocument
+"""
+Document format classes. They are imported lazily, on first access, so that
+a process only pays the import cost of the formats it actually uses.
+"""
 
+from .utils import make_lazy
+
+# Lazily imported objects, and the module they come from
+__getattr__, __dir__ = make_lazy(__name__, {
+    "CsvDocument": ".csv",
+    "LocalCsvDocument": ".csv"
+})
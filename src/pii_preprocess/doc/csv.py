@@ -4,17 +4,26 @@ Read a CSV file into a PII table source document
 
 import os
 import csv
-from itertools import islice
+import random
+from time import perf_counter
+from itertools import islice, count
 from collections import namedtuple
 from types import SimpleNamespace
+from contextlib import ExitStack
 
-from typing import Dict, Iterable, List, TextIO, Iterator
+from typing import BinaryIO, Callable, Dict, Iterable, List, Optional, \
+    TextIO, Tuple, Iterator, Union
 
-from pii_data.helper.exception import UnimplementedException
-from pii_data.helper.io import openfile
+from pii_data.helper.exception import UnimplementedException, \
+    InvArgException, ProcException
+from pii_data.helper.misc import import_object
 from pii_data.types.doc.document import TableSrcDocument, TYPE_META
 from pii_data.types.doc.localdoc import TableLocalSrcDocument
 
+from ..compress import open_file, file_codec
+from ..instrument import active, emit, track_chunks
+from .srcindex import SourceIndex
+from .csv_rowindex import RowIndex, ROWINDEX_STEP
 from .utils import add_default_meta, as_bool
 
 
@@ -29,32 +38,116 @@ class CsvDocument(TableSrcDocument):
 
     def __init__(self, iter_options: Dict = None,
                  csv_options: Dict = None,
-                 csv_header: bool = True, metadata: TYPE_META = None):
+                 csv_header: bool = True, metadata: TYPE_META = None,
+                 columns: Iterable[Union[str, int]] = None,
+                 row_filter: Union[str, Callable[[List], bool]] = None):
         """
           :param iter_options: iteration options
           :param csv_options: options to pass to the Python CSV reader
           :param csv_header: if the first row is a header row with column names
           :param metadata: document-level metadata to add to the document
+          :param columns: the columns to keep, as a list of column names or
+            column numbers (starting at 1). Other fields are dropped.
+          :param row_filter: a function (or the fully qualified name of a
+            function) that receives each parsed row (with all its fields)
+            and returns `False` for rows to skip. Rows keep their original
+            row numbers.
         """
         basemeta = {"document": {"type": "table", "origin": "csv"}}
         super().__init__(iter_options=iter_options, metadata=basemeta)
         if metadata:
             self.add_metadata(**metadata)
+        if isinstance(row_filter, str):
+            row_filter = import_object(row_filter)
+        if isinstance(columns, (str, int)):
+            columns = [columns]
         self._opt = SimpleNamespace(csv_options=csv_options,
-                                    csv_header=as_bool(csv_header))
+                                    csv_header=as_bool(csv_header),
+                                    columns=columns, projection=None,
+                                    row_filter=row_filter)
 
 
     def __repr__(self) -> str:
         return "<CsvDocument>"
 
 
+    def _source_name(self) -> str:
+        """
+        The name of the data source, for instrumentation events
+        """
+        return None
+
+
+    def _source_size(self) -> int:
+        """
+        The size of the data source, for instrumentation events
+        """
+        return None
+
+
+    def _projection(self, header: List = None) -> Optional[List[int]]:
+        """
+        Resolve the column selection into a list of column indexes (the
+        first time it is called), and set the names of the selected columns
+        in the metadata
+          :param header: the column names (default is to take them from the
+            metadata)
+          :return: the column indexes, or `None` if there is no selection
+        """
+        if self._opt.columns is None or self._opt.projection is not None:
+            return self._opt.projection
+        if header is None:
+            header = (self.metadata.get("column") or {}).get("name")
+        proj = []
+        for col in self._opt.columns:
+            if isinstance(col, int) and not isinstance(col, bool):
+                if col < 1:
+                    raise InvArgException("invalid column number: {}", col)
+                proj.append(col - 1)
+            elif header and col in header:
+                proj.append(list(header).index(col))
+            else:
+                raise InvArgException("unknown CSV column: {}", col)
+        if header:
+            names = [header[i] if i < len(header) else i + 1 for i in proj]
+            self.add_metadata(column={"name": names})
+        self._opt.projection = proj
+        return proj
+
+
+    def _iter_rows(self, rows: Iterator[Tuple[int, List]] = None
+                   ) -> Iterator[Tuple[int, List]]:
+        """
+        Iterate over the rows in the document, applying the row filter and
+        the column selection
+          :param rows: the rows to iterate over, as (row number, row) tuples
+            (default is all rows in the document)
+          :return: an iterator of tuples (row number, row)
+        """
+        if rows is None:
+            rows = enumerate(self.get_base_iter(), start=1)
+        keep = self._opt.row_filter
+        if keep:
+            rows = ((n, row) for n, row in rows if keep(row))
+        proj = self._projection()
+        if proj is None:
+            return rows
+
+        top = max(proj, default=-1)
+        def project(row: List) -> List:
+            if len(row) > top:
+                return [row[i] for i in proj]
+            return [row[i] if i < len(row) else "" for i in proj]
+
+        return ((n, project(row)) for n, row in rows)
+
+
     def iter_base(self) -> Iterable[List]:
         """
         Produce an iterable over document rows
         """
-        it = self.get_base_iter()
-        for n, row in enumerate(it, start=1):
-            yield {"id": f"R{n}", "data": row}
+        rows = ({"id": f"R{n}", "data": row} for n, row in self._iter_rows())
+        yield from track_chunks(self._source_name(), rows)
 
 
     def iter_base_block(self, block_size: int) -> Iterable[List]:
@@ -62,7 +155,7 @@ class CsvDocument(TableSrcDocument):
         Get a base iterable grouping rows in blocks.
           :param block_size: number of rows to deliver at each iteration
         """
-        it = self.get_base_iter()
+        it = (row for _, row in self._iter_rows())
         n = 1
         while True:
             chunk = list(islice(it, block_size))
@@ -72,6 +165,58 @@ class CsvDocument(TableSrcDocument):
             n += 1
 
 
+    def column_names(self, num: int) -> List:
+        """
+        Get the names for a number of columns: the names in the header (if
+        present in the metadata), completed with column numbers (starting
+        at 1) for any additional columns. Repeated names are also replaced
+        by column numbers.
+        """
+        header = (self.metadata.get("column") or {}).get("name") or []
+        names = []
+        for n in range(num):
+            name = header[n] if n < len(header) else n + 1
+            names.append(n + 1 if name in names else name)
+        return names
+
+
+    def iter_column_block(self, block_size: int,
+                          array_type: str = None) -> Iterable[Dict]:
+        """
+        Get a base iterable grouping rows in blocks, and delivering each
+        block by columns: a dict with the column names as keys, and the
+        column values in the block as values. Rows shorter than the others
+        are padded with empty strings.
+          :param block_size: number of rows to deliver at each iteration
+          :param array_type: deliver columns as NumPy arrays, either of
+            "object" type or of "str" type (default is to deliver lists)
+        """
+        if array_type is None:
+            convert = list
+        elif array_type in ("object", "str"):
+            try:
+                import numpy as np
+            except ImportError as e:
+                raise ProcException("column arrays need the 'numpy' package") from e
+            dtype = object if array_type == "object" else str
+            def convert(col):
+                return np.array(col, dtype=dtype)
+        else:
+            raise InvArgException("invalid array type: {}", array_type)
+
+        names = {}
+        for block in self.iter_base_block(block_size):
+            rows = block["data"]
+            num = max(map(len, rows))
+            if any(len(r) != num for r in rows):
+                rows = [r + [""]*(num - len(r)) for r in rows]
+            if num not in names:
+                names[num] = self.column_names(num)
+            columns = map(convert, zip(*rows))
+            block["data"] = dict(zip(names[num], columns))
+            yield block
+
+
 class TextIOCsvDocument(CsvDocument):
     """
     A slightly-less-abstract CSV document class.
@@ -103,16 +248,23 @@ class TextIOCsvDocument(CsvDocument):
         Open & prepare the source objects
         """
         # Open source and create a CSV reader around it
+        start = perf_counter()
         f = self.open()
         it = csv.reader(f, **(self._opt.csv_options or {}))
 
-        # Read the header row and add to metadata
-        if self._opt.csv_header:
-            colnames = list(next(it))
+        # Read the header row and add to metadata, resolving the column
+        # selection
+        colnames = list(next(it)) if self._opt.csv_header else None
+        if self._opt.columns is not None:
+            self._projection(colnames)
+        elif colnames is not None:
             self.add_metadata(column={'name': colnames})
 
         # Store objects
         self._src = SimpleNamespace(file=f, it=it, used=False)
+        if active():
+            emit("doc.open", self._source_name(), reader=type(self).__name__,
+                 elapsed=perf_counter() - start, bytes=self._source_size())
 
 
     def open(self):
@@ -138,18 +290,62 @@ class TextIOCsvDocument(CsvDocument):
 FileData = namedtuple("FILEDATA", "name id_path_prefix")
 
 
+class OffsetLines:
+    """
+    Read the lines of a binary file, decoding them and keeping the byte offset
+    of the next line to be read. Line endings are normalized to "\\n", as in
+    a text file opened with universal newlines.
+    """
+
+    def __init__(self, f: BinaryIO, encoding: str = "utf-8"):
+        self.file = f
+        self.encoding = encoding
+        self.pos = 0
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        line = next(self.file)
+        self.pos += len(line)
+        if line.endswith(b"\r\n"):
+            line = line[:-2] + b"\n"
+        return line.decode(self.encoding)
+
+    def close(self):
+        self.file.close()
+
+
 class LocalCsvDocument(TextIOCsvDocument, TableLocalSrcDocument):
     """
     A class to read a local CSV file
     """
 
     def __init__(self, filename: str, id_path_prefix: str = None,
-                 metadata: TYPE_META = None, **kwargs):
+                 metadata: TYPE_META = None, source_index: bool = False,
+                 decompress_workers: int = 1, readahead: bool = None,
+                 workers: int = 1, range_size: int = None,
+                 row_index: Union[bool, int] = False, **kwargs):
         """
           :param filename: CSV filename to open
           :param id_path_prefix: set the id to the document filename, removing
             the prefix indicated
           :param metadata: metadata to add to the document
+          :param source_index: build a source index, with the line number and
+            byte offset of each row
+          :param decompress_workers: number of worker processes used to
+            decompress a compressed file made of several members
+          :param readahead: decompress in a background thread (default is
+            to do it for all compressed files)
+          :param workers: number of worker processes used to parse the file
+            in parallel (only for uncompressed files larger than the range
+            size, and CSV dialects without an escape character)
+          :param range_size: size (in bytes) of the ranges the file is
+            divided into for parallel parsing
+          :param row_index: build (or reuse) a row index, with the byte
+            offset of one every K rows, stored in a sidecar file. It can be
+            `True` (to use the default K) or the value of K. Only for
+            uncompressed files.
 
         if `id_path_prefix` is `False`, the filename will not be used for the
         document id. If the document metadata includes an id, it will be
@@ -164,6 +360,21 @@ class LocalCsvDocument(TextIOCsvDocument, TableLocalSrcDocument):
 
         # Store file coordinates & initialize
         self._file = FileData(filename, id_path_prefix)
+        self.source_index = SourceIndex("csv") if as_bool(source_index) else None
+        self._open_opt = {
+            "workers": int(decompress_workers),
+            "readahead": None if readahead is None else as_bool(readahead)
+        }
+        self._parallel = SimpleNamespace(workers=int(workers),
+                                         range_size=range_size)
+        self.row_index = None
+        if isinstance(row_index, (bool, str)):
+            row_index = ROWINDEX_STEP if as_bool(row_index) else 0
+        if row_index and not file_codec(filename):
+            self.row_index = RowIndex(filename, int(row_index),
+                                      kwargs.get("csv_options"),
+                                      as_bool(kwargs.get("csv_header", True)))
+            self.row_index.load()
         super().__init__(metadata=metadata, **kwargs)
 
 
@@ -171,13 +382,180 @@ class LocalCsvDocument(TextIOCsvDocument, TableLocalSrcDocument):
         return f"<CsvDocument file={self._file.name}>"
 
 
+    def _source_name(self) -> str:
+        return self._file.name
+
+
+    def _source_size(self) -> int:
+        return os.path.getsize(self._file.name)
+
+
     def open(self) -> TextIO:
         """
         Open the local CSV file, as configured in the object
         """
         if self._file.id_path_prefix is not False:
             self.set_id_path(self._file.name, self._file.id_path_prefix)
-        return openfile(self._file.name, encoding='utf-8')
+        if self._pending_index():
+            return OffsetLines(open_file(self._file.name, "rb",
+                                         **self._open_opt))
+        return open_file(self._file.name, encoding='utf-8', **self._open_opt)
+
+
+    def _pending_index(self) -> Tuple[Optional[SourceIndex], Optional[RowIndex]]:
+        """
+        Return the indexes that need to be filled in the next iteration (or
+        an empty tuple if there are none)
+        """
+        out = tuple(idx if idx is not None and not idx.complete else None
+                    for idx in (self.source_index, self.row_index))
+        return out if any(idx is not None for idx in out) else ()
+
+
+    def get_base_iter(self) -> Iterator[List]:
+        """
+        Return the base iterator, filling the indexes if needed
+        """
+        if self._use_parallel():
+            return self._parallel_rows()
+        it = super().get_base_iter()
+        if not self._pending_index():
+            return it
+        return self._index_rows(it, self._src)
+
+
+    def _index_rows(self, it: Iterator[List],
+                    src: SimpleNamespace) -> Iterator[List]:
+        """
+        Iterate over rows, adding each one to the source index and/or the
+        row index. Rows are numbered as in the chunk ids produced by
+        iter_base().
+        """
+        index, row_index = self._pending_index()
+        for idx in (index, row_index):
+            if idx is not None:
+                idx.reset()
+        for n in count(1):
+            line = src.it.line_num + 1
+            pos = src.file.pos
+            try:
+                row = next(it)
+            except StopIteration:
+                break
+            if index is not None:
+                index.add(f"R{n}", n, line, pos)
+            if row_index is not None:
+                row_index.add(n, pos)
+            yield row
+        if index is not None:
+            index.finish()
+        if row_index is not None:
+            row_index.finish(n - 1)
+
+
+    def _use_parallel(self) -> bool:
+        """
+        Check if the file can be parsed in parallel
+        """
+        if self._parallel.workers <= 1 or file_codec(self._file.name):
+            return False
+        from .csv_parallel import RANGE_SIZE, parallel_dialect
+        if self._parallel.range_size is None:
+            self._parallel.range_size = RANGE_SIZE
+        return self._source_size() > int(self._parallel.range_size) and \
+            parallel_dialect(self._opt.csv_options)
+
+
+    def _parallel_rows(self) -> Iterator[List]:
+        """
+        Iterate over rows parsed in parallel, filling the source index if
+        needed
+        """
+        from .csv_parallel import parallel_rows
+        index, row_index = self._pending_index() or (None, None)
+        bounds = None
+        if self.row_index is not None and self.row_index.complete:
+            bounds = self.row_index.boundaries()
+        return parallel_rows(self._file.name, self._opt.csv_options,
+                             self._parallel.workers,
+                             int(self._parallel.range_size),
+                             self._opt.csv_header, index, row_index, bounds)
+
+
+    def get_rows(self, start: int, stop: int = None) -> Iterator[Dict]:
+        """
+        Iterate over a range of rows, as iter_base() does. If the document
+        has a complete row index, reading starts at the nearest indexed row;
+        otherwise the file is read from the start.
+          :param start: the number of the first row (as in the row ids)
+          :param stop: the number of the row after the last one (default is
+            to read until the end of the document)
+        """
+        start = max(start, 1)
+        row, offset = 1, None
+        if self.row_index is not None and self.row_index.complete:
+            row, offset = self.row_index.seek(start)
+
+        with ExitStack() as stack:
+            if offset is None:
+                it = self.get_base_iter()
+            else:
+                from .csv_parallel import range_reader
+                f = stack.enter_context(open(self._file.name, "rb"))
+                f.seek(offset)
+                it, _ = range_reader(f, self._opt.csv_options)
+            rows = islice(enumerate(it, start=row), start - row,
+                          None if stop is None else max(stop - row, 0))
+            for n, data in self._iter_rows(rows):
+                yield {"id": f"R{n}", "data": data}
+
+
+    def profile(self, size: int = None, method: str = "auto",
+                seed: int = None) -> List[Dict]:
+        """
+        Compute statistics for each column over a random sample of rows, and
+        add them to the document metadata, as the `column.profile` field
+          :param size: the number of rows in the sample
+          :param method: the sampling method: "reservoir" (a single pass over
+            the file, up to a maximum number of rows), "seek" (random seeks
+            into the file; only for uncompressed files) or "auto" (seek for
+            large uncompressed files, reservoir for the rest)
+          :param seed: seed for the random generator
+          :return: the statistics for each column
+        """
+        from . import csv_profile as prof
+        size = int(size or prof.SAMPLE_SIZE)
+        rnd = random.Random(seed)
+        compressed = file_codec(self._file.name) is not None
+        if method == "auto":
+            large = self._source_size() > prof.SEEK_MIN_SIZE
+            method = "seek" if large and not compressed else "reservoir"
+
+        if method == "reservoir":
+            rows = (row for _, row in self._iter_rows())
+            sample = prof.reservoir_sample(rows, size, rnd)
+        elif method == "seek":
+            if compressed:
+                raise InvArgException("cannot sample by seeking in a compressed file: {}",
+                                      self._file.name)
+            with open_file(self._file.name, encoding="utf-8") as f:
+                first = next(csv.reader(f, **(self._opt.csv_options or {})),
+                             None)
+            index = self.row_index if self.row_index is not None and \
+                self.row_index.complete else None
+            sample = prof.seek_sample(self._file.name, self._opt.csv_options,
+                                      size, rnd,
+                                      len(first) if first else None, index,
+                                      self._opt.csv_header)
+            sample = [row for _, row in self._iter_rows(enumerate(sample))]
+        else:
+            raise InvArgException("invalid sampling method: {}", method)
+
+        names = (self.metadata.get("column") or {}).get("name") or []
+        num = max(len(names), max(map(len, sample), default=0))
+        profile = prof.profile_columns(sample, num)
+        self.add_metadata(column={"profile": profile})
+        return profile
 
 
     def csv_options(self, csv_options: Dict = None, csv_header: bool = None):
@@ -0,0 +1,337 @@
+"""
+Parallel parsing of a large CSV file. The file is divided into byte ranges,
+each one starting at a record boundary, and the ranges are parsed by a pool
+of worker processes. The rows are delivered in file order, so that they get
+the same row numbers as with sequential parsing.
+
+Record boundaries are found in two steps:
+  - a first pass counts the quote characters in each range of the file
+  - the main process takes the quote parity at the nominal start of each
+    range, and moves forward to the first newline outside quotes
+
+This is exact for well-formed CSV files (in which quotes appear only around
+fields, and are escaped by doubling them). To protect against malformed
+files (e.g. stray quotes within an unquoted field) each worker also checks
+that parsing ended at a record boundary; if a range does not, the rest of
+the file, starting at the last verified boundary, is parsed sequentially.
+"""
+
+import io
+import os
+import csv
+import mmap
+from array import array
+from itertools import accumulate, chain
+from collections import deque
+
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .csv import OffsetLines
+from .srcindex import SourceIndex
+from .csv_rowindex import RowIndex, index_ranges
+
+
+# Default size (in bytes) of the ranges the file is divided into
+RANGE_SIZE = 1 << 25
+
+# Number of parsed ranges held ahead of the reader
+READ_AHEAD = 2
+
+# A value that cannot appear in a CSV file (a Unicode noncharacter), used to
+# check the parser state at the end of a range
+SENTINEL = "\ufdd0"
+
+# Candidate separators to pack the fields of a range into a single string
+# (also Unicode noncharacters)
+SEPARATORS = ("\ufdd1", "\ufdd2", "\ufdd3", "\uffff")
+
+
+def dialect(csv_options: Dict = None) -> csv.Dialect:
+    """
+    Get the CSV dialect defined by a set of CSV reader options
+    """
+    return csv.reader([], **(csv_options or {})).dialect
+
+
+def parallel_dialect(csv_options: Dict = None) -> bool:
+    """
+    Check if a CSV dialect can be parsed in parallel: quotes must be escaped
+    by doubling them (with an escape character, record boundaries cannot be
+    found by counting quotes)
+    """
+    d = dialect(csv_options)
+    return not d.escapechar and (d.doublequote or d.quoting == csv.QUOTE_NONE)
+
+
+def sentinel_row(csv_options: Dict = None) -> Tuple[str, List]:
+    """
+    Build the sentinel line appended to a range, and the row it produces
+    when parsed from a clean state
+    """
+    d = dialect(csv_options)
+    quote = "" if d.quoting == csv.QUOTE_NONE else d.quotechar
+    line = f"{quote}{SENTINEL}{quote}\n"
+    return line, next(csv.reader([line], **(csv_options or {})))
+
+
+def range_reader(f: BinaryIO, csv_options: Dict = None, indexed: bool = False,
+                 tail: Iterable[str] = ()) -> Tuple[Iterator[List], Iterator[str]]:
+    """
+    Create a CSV reader over a binary stream, decoded as in sequential reading
+      :param f: the binary stream
+      :param csv_options: options for the CSV reader
+      :param indexed: read the lines as the source index does
+      :param tail: additional lines to parse after the stream
+      :return: a tuple (CSV reader, line iterator)
+    """
+    lines = OffsetLines(f) if indexed else io.TextIOWrapper(f, encoding="utf-8")
+    return csv.reader(chain(lines, tail), **(csv_options or {})), lines
+
+
+def indexed_rows(reader: Iterator[List],
+                 lines: OffsetLines) -> Iterator[Tuple[List, int, int]]:
+    """
+    Iterate over the rows of a CSV reader, adding their position
+      :return: an iterator of tuples (row, line number, byte offset), with
+        the line number and offset of the row start relative to the stream
+        start
+    """
+    while True:
+        line = reader.line_num + 1
+        pos = lines.pos
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        yield row, line, pos
+
+
+def pack_rows(rows: List[List]) -> Optional[Tuple[str, str, array]]:
+    """
+    Pack a list of rows into a single string, which is much faster to
+    transfer between processes than a list of lists
+      :return: a tuple (separator, joined fields, row sizes), or `None` if
+        the rows cannot be packed (no separator is available, or fields are
+        not strings)
+    """
+    sizes = array("Q", map(len, rows))
+    for sep in SEPARATORS:
+        try:
+            data = sep.join(f for row in rows for f in row)
+        except TypeError:
+            return None
+        if not data or data.count(sep) == sum(sizes) - 1:
+            return sep, data, sizes
+    return None
+
+
+def unpack_rows(packed: Tuple[str, str, array]) -> Iterator[List]:
+    """
+    Unpack a list of rows packed by `pack_rows()`
+    """
+    sep, data, sizes = packed
+    fields = data.split(sep) if any(sizes) else []
+    pos = 0
+    for size in sizes:
+        yield fields[pos:pos+size]
+        pos += size
+
+
+def _count_quotes(filename: str, start: int, end: int, quote: bytes) -> int:
+    """
+    Count the quote characters in a file range
+    """
+    with open(filename, "rb") as f:
+        f.seek(start)
+        return f.read(end - start).count(quote)
+
+
+def _parse_range(filename: str, start: int, end: int, last: bool,
+                 csv_options: Dict, indexed: bool) -> Optional[Tuple]:
+    """
+    Parse a file range
+      :param filename: the file to read
+      :param start: start byte offset for the range
+      :param end: end byte offset for the range
+      :param last: if this is the last range in the file
+      :param csv_options: options for the CSV reader
+      :param indexed: compute row positions
+      :return: a tuple (rows, positions, number of lines), with the rows
+        packed by `pack_rows()` (if possible), positions as (line, offset)
+        pairs for each row (relative to the range start) and the number of
+        lines in the range (only if indexed, and not the last range); or
+        `None` if the range does not end at a record boundary
+    """
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    # Parse a sentinel line after the range: if the parser ends the range
+    # in a clean state, it will produce the sentinel row
+    line, sentinel = (None, None) if last else sentinel_row(csv_options)
+    reader, lines = range_reader(io.BytesIO(data), csv_options, indexed,
+                                 [line] if line else ())
+    pos = array("Q")
+    if indexed:
+        rows = []
+        for row, nline, offset in indexed_rows(reader, lines):
+            rows.append(row)
+            pos.extend((nline, offset))
+    else:
+        rows = list(reader)
+
+    nlines = 0
+    if not last:
+        if not rows or rows[-1] != sentinel:
+            return None
+        rows.pop()
+        if indexed:
+            nlines = pos[-2] - 1    # the sentinel row starts after the range
+            del pos[-2:]
+    return pack_rows(rows) or rows, pos, nlines
+
+
+def find_record(mm: mmap.mmap, pos: int, quote: Optional[bytes],
+                parity: int) -> int:
+    """
+    Find the first record boundary after a file position: the position after
+    the first newline found outside quotes
+      :param mm: the mapped file
+      :param pos: the position to start searching at
+      :param quote: the quote character (`None` if fields are not quoted)
+      :param parity: the number of quotes (modulo 2) before the position
+      :return: the boundary, or the file size if there is none
+    """
+    size = len(mm)
+    while True:
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            return size
+        if quote:
+            parity = (parity + mm[pos:nl].count(quote)) % 2
+        pos = nl + 1
+        if not parity:
+            return pos
+
+
+def record_ranges(filename: str, quote: Optional[bytes], counts: List[int],
+                  range_size: int) -> List[Tuple[int, int]]:
+    """
+    Divide a CSV file into ranges starting at record boundaries
+      :param filename: the file
+      :param quote: the quote character (`None` if fields are not quoted)
+      :param counts: number of quotes in each block of `range_size` bytes
+      :param range_size: the nominal range size
+      :return: a list of (start, end) byte offsets
+    """
+    bounds = [0]
+    with open(filename, "rb") as f, \
+         mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        size = len(mm)
+        for n, prev in enumerate(accumulate(counts), start=1):
+            pos = find_record(mm, n*range_size, quote, prev % 2)
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def parallel_rows(filename: str, csv_options: Dict = None, workers: int = 2,
+                  range_size: int = RANGE_SIZE, header: bool = False,
+                  index: SourceIndex = None, row_index: RowIndex = None,
+                  bounds: List[int] = None) -> Iterator[List]:
+    """
+    Parse a CSV file in parallel
+      :param filename: the file to read (an uncompressed UTF-8 file)
+      :param csv_options: options for the CSV reader
+      :param workers: number of worker processes
+      :param range_size: the size of the ranges the file is divided into
+      :param header: skip the first row (the header row)
+      :param index: a source index to fill with the row coordinates
+      :param row_index: a row index to fill with the row offsets
+      :param bounds: known record boundaries (e.g. from a row index), to
+        use as range starts instead of searching for them
+      :return: an iterator over the rows
+    """
+    csv_options = csv_options or {}
+    size = os.path.getsize(filename)
+    d = dialect(csv_options)
+    quote = None if d.quoting == csv.QUOTE_NONE or not d.quotechar \
+        else d.quotechar.encode("utf-8")
+    indexed = index is not None or row_index is not None
+    for idx in (index, row_index):
+        if idx is not None:
+            idx.reset()
+    num = 0 if header else 1        # the number of the next row
+
+    def add(row: int, line: int, offset: int):
+        if index is not None:
+            index.add(f"R{row}", row, line, offset)
+        if row_index is not None:
+            row_index.add(row, offset)
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        if bounds is not None:
+            ranges = index_ranges(bounds, size, range_size)
+        else:
+            starts = range(0, size, range_size)
+            if quote:
+                counts = list(pool.map(_count_quotes, [filename]*len(starts),
+                                       starts, [s + range_size for s in starts],
+                                       [quote]*len(starts)))
+            else:
+                counts = [0] * len(starts)
+            ranges = record_ranges(filename, quote, counts[:-1], range_size)
+
+        pending = deque()
+        it = iter(enumerate(ranges, start=1))
+        line = 0        # the number of lines before the current range
+        while True:
+            # Keep a bounded number of ranges being parsed
+            for n, (s, e) in it:
+                pending.append((s, pool.submit(_parse_range, filename, s, e,
+                                               n == len(ranges), csv_options,
+                                               indexed)))
+                if len(pending) >= workers + READ_AHEAD:
+                    break
+            if not pending:
+                start = None
+                break
+            start, fut = pending.popleft()
+            result = fut.result()
+            if result is None:
+                for _, fut in pending:
+                    fut.cancel()
+                break
+            rows, pos, nlines = result
+            if isinstance(rows, tuple):
+                rows = unpack_rows(rows)
+            for n, row in enumerate(rows):
+                if num:
+                    if indexed:
+                        add(num, line + pos[2*n], start + pos[2*n+1])
+                    yield row
+                num += 1
+            line += nlines
+
+    # Fall back to sequential parsing, from the last verified boundary
+    if start is not None:
+        with open(filename, "rb") as f:
+            f.seek(start)
+            reader, lines = range_reader(f, csv_options, indexed)
+            rows = indexed_rows(reader, lines) if indexed else \
+                ((row, 0, 0) for row in reader)
+            for row, nline, offset in rows:
+                if num:
+                    if indexed:
+                        add(num, line + nline, start + offset)
+                    yield row
+                num += 1
+
+    if index is not None:
+        index.finish()
+    if row_index is not None:
+        row_index.finish(num - 1)
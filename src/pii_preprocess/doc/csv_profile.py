@@ -0,0 +1,232 @@
+"""
+Sampled profiling of the columns in a CSV file: statistics computed over a
+bounded sample of rows, to find out cheaply which columns look like they may
+hold PII (e.g. values with a fixed shape and many digits, or with a high
+ratio of distinct values).
+
+Rows are sampled either:
+  - with a reservoir sample over the rows read in a single pass (bounded by
+    a maximum number of rows)
+  - with random seeks into the file, reading a few rows after each one. If
+    the document has a row index, windows of consecutive rows are chosen at
+    random among all the rows, and each one is read by seeking to the
+    nearest indexed row before it (a known record boundary) and parsing
+    forward; otherwise seeks go to the start of a line (or, for files without
+    a header, also to the start of the file, so that the first row can be
+    sampled), and a block of rows is accepted only if all its rows have the
+    expected number of fields (a start within a quoted field usually
+    produces a mismatch)
+"""
+
+import io
+import os
+import csv
+import random
+from itertools import islice
+from collections import Counter
+
+from typing import Dict, Iterable, List, Optional
+
+from .csv_rowindex import RowIndex
+from .csv_parallel import range_reader
+
+
+# Default number of rows in a sample
+SAMPLE_SIZE = 1000
+
+# Number of consecutive rows read after each random seek
+SEEK_ROWS = 10
+
+# Number of bytes read after each random seek
+SEEK_BLOCK = 1 << 16
+
+# Maximum number of rows read for a reservoir sample
+RESERVOIR_MAX_ROWS = 100000
+
+# Minimum file size to sample by seeking (smaller files are read in full)
+SEEK_MIN_SIZE = 1 << 24
+
+# Maximum length of the prefix of a value used to compute its shape
+SHAPE_LENGTH = 24
+
+# Number of most frequent shapes reported for each column
+TOP_SHAPES = 5
+
+
+def value_shape(value: str) -> str:
+    """
+    Compute the shape of a value: uppercase letters are replaced by "A",
+    lowercase letters by "a", and digits by "9". Long values are truncated.
+    """
+    shape = "".join("9" if c.isdigit() else
+                    ("A" if c.isupper() else "a") if c.isalpha() else c
+                    for c in value[:SHAPE_LENGTH])
+    return shape + "…" if len(value) > SHAPE_LENGTH else shape
+
+
+def column_profile(values: List[str]) -> Dict:
+    """
+    Compute the statistics for the values of a column
+    """
+    full = [v for v in values if v]
+    profile = {"count": len(values),
+               "empty_ratio": 1 - len(full)/len(values) if values else 0}
+    if not full:
+        return profile
+    lengths = list(map(len, full))
+    chars = sum(lengths)
+    digits = sum(c.isdigit() for v in full for c in v)
+    alpha = sum(c.isalpha() for v in full for c in v)
+    shapes = Counter(map(value_shape, full)).most_common(TOP_SHAPES)
+    profile.update({
+        "length": {"min": min(lengths), "max": max(lengths),
+                   "mean": round(chars/len(full), 2)},
+        "digit_ratio": round(digits/chars, 4),
+        "alpha_ratio": round(alpha/chars, 4),
+        "distinct_ratio": round(len(set(full))/len(full), 4),
+        "shapes": [{"shape": s, "ratio": round(n/len(full), 4)}
+                   for s, n in shapes]
+    })
+    return profile
+
+
+def profile_columns(rows: List[List], num: int = None) -> List[Dict]:
+    """
+    Compute the statistics for all the columns in a sample of rows
+      :param rows: the sample rows
+      :param num: number of columns (default is the longest row size)
+      :return: a list with the statistics for each column
+    """
+    if num is None:
+        num = max(map(len, rows), default=0)
+    return [column_profile([r[c] if c < len(r) else "" for r in rows])
+            for c in range(num)]
+
+
+def reservoir_sample(rows: Iterable, size: int, rnd: random.Random,
+                     max_rows: int = RESERVOIR_MAX_ROWS) -> List:
+    """
+    Take a uniform random sample of a sequence of rows, in a single pass
+      :param rows: the rows
+      :param size: the sample size
+      :param rnd: the random generator
+      :param max_rows: the maximum number of rows to read
+    """
+    sample = []
+    for n, row in enumerate(rows):
+        if n >= max_rows:
+            break
+        if n < size:
+            sample.append(row)
+        else:
+            pos = rnd.randrange(n + 1)
+            if pos < size:
+                sample[pos] = row
+    return sample
+
+
+def seek_sample(filename: str, csv_options: Dict, size: int,
+                rnd: random.Random, fields: Optional[int],
+                row_index: RowIndex = None,
+                header: bool = True) -> List[List]:
+    """
+    Take a random sample of the rows in an (uncompressed) CSV file, by
+    seeking to random positions
+      :param filename: the file
+      :param csv_options: options for the CSV reader
+      :param size: the sample size
+      :param rnd: the random generator
+      :param fields: the expected number of fields in a row (used to check
+        that reading did start at a record boundary, if there is no row
+        index)
+      :param row_index: a complete row index for the file
+      :param header: if the file starts with a header row (otherwise the
+        start of the file is also a candidate seek position)
+      :return: the sampled rows
+    """
+    if row_index is not None and row_index.rows is not None:
+        return _indexed_sample(filename, csv_options, size, rnd, row_index)
+
+    filesize = os.path.getsize(filename)
+    seeks = -(-size // SEEK_ROWS)
+    sample = []
+    seen = set()
+    with open(filename, "rb") as f:
+        for _ in range(3*seeks):
+            if len(sample) >= size:
+                break
+            # Position -1 stands for the start of the first record (only
+            # without a header, which is skipped otherwise)
+            pos = rnd.randrange(0 if header else -1, filesize)
+            f.seek(max(pos, 0))
+            data = f.read(SEEK_BLOCK)
+            if pos < 0:
+                pos = 0
+            else:
+                # Move to the start of the next line
+                nl = data.find(b"\n")
+                if nl < 0:
+                    continue
+                pos += nl + 1
+                data = data[nl+1:]
+            if pos in seen:
+                continue
+            seen.add(pos)
+            block = _parse_block(data, csv_options,
+                                 pos + len(data) >= filesize)
+            if fields is not None and any(len(r) != fields for r in block):
+                continue
+            sample += block[:size - len(sample)]
+    return sample
+
+
+def _indexed_sample(filename: str, csv_options: Dict, size: int,
+                    rnd: random.Random, row_index: RowIndex) -> List[List]:
+    """
+    Take a random sample of the rows in a CSV file with a complete row index:
+    choose at random windows of SEEK_ROWS consecutive rows, and read each one
+    by parsing forward from the nearest indexed row before it (or from the
+    end of the previous window, if it is nearer). The cost is bounded by the
+    number of windows times the index step.
+    """
+    windows = -(-row_index.rows // SEEK_ROWS)
+    chosen = sorted(rnd.sample(range(windows),
+                               min(windows, -(-size // SEEK_ROWS))))
+    sample = []
+    with open(filename, "rb") as f:
+        lines = rows = None
+        nxt = 0         # number of the next row to be read
+        for w in chosen:
+            first = w*SEEK_ROWS + 1
+            base, offset = row_index.seek(first)
+            if rows is None or base > nxt:
+                if lines is not None:
+                    lines.detach()      # so that it does not close the file
+                f.seek(offset)
+                rows, lines = range_reader(f, csv_options)
+                nxt = base
+            sample += islice(rows, first - nxt, first - nxt + SEEK_ROWS)
+            nxt = first + SEEK_ROWS
+        if lines is not None:
+            lines.detach()
+    return rnd.sample(sample, size) if len(sample) > size else sample
+
+
+def _parse_block(data: bytes, csv_options: Dict, eof: bool) -> List[List]:
+    """
+    Parse the first rows in a block of data. Unless the block reaches the
+    end of the file, its last row is left out, since it may be incomplete.
+    """
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8",
+                            errors="replace")
+    rows = []
+    try:
+        for row in csv.reader(text, **(csv_options or {})):
+            rows.append(row)
+            if len(rows) > SEEK_ROWS:
+                break
+    except csv.Error:
+        return []
+    if len(rows) > SEEK_ROWS:
+        return rows[:SEEK_ROWS]
+    return rows if eof else rows[:-1]
@@ -0,0 +1,184 @@
+"""
+A row-offset index for CSV files: the byte offset of one every K rows, so
+that a given row can be reached by seeking to the nearest indexed row and
+parsing from there, instead of parsing the file from the start.
+
+The index is built while the document is iterated, and when complete it is
+stored as a JSON sidecar file next to the CSV file, together with a
+fingerprint of the file and of the options used to parse it, so that it can
+be reused while the file does not change.
+"""
+
+import os
+import json
+import tempfile
+from array import array
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+# Format indicator for serialized row indexes
+FMT_ROWINDEX = "pii-preprocess:rowindex:v1"
+
+# Suffix for the sidecar file holding the index
+ROWINDEX_SUFFIX = ".rowindex.json"
+
+# Default number of rows between indexed rows
+ROWINDEX_STEP = 10000
+
+
+def parse_key(csv_options: Dict = None, csv_header: bool = True) -> Dict:
+    """
+    Build the key identifying the parsing options an index is valid for
+    """
+    opt = sorted((k, repr(v)) for k, v in (csv_options or {}).items())
+    return {"csv_options": [list(o) for o in opt], "csv_header": csv_header}
+
+
+def file_key(filename: str) -> Dict:
+    """
+    Build the key identifying the version of a file an index is valid for
+    """
+    st = os.stat(filename)
+    return {"size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+class RowIndex:
+    """
+    The byte offsets of the rows numbered 1, K+1, 2K+1, ... in a CSV file
+    (with rows numbered as in the chunk ids, i.e. excluding the header row)
+    """
+
+    def __init__(self, filename: str, step: int = ROWINDEX_STEP,
+                 csv_options: Dict = None, csv_header: bool = True,
+                 sidecar: str = None):
+        """
+          :param filename: the CSV file
+          :param step: the number of rows between indexed rows
+          :param csv_options: the options used to parse the file
+          :param csv_header: if the file has a header row
+          :param sidecar: name of the file to store the index in (default
+            is the CSV filename plus a suffix)
+        """
+        self.filename = str(filename)
+        self.step = int(step)
+        self.sidecar = sidecar or self.filename + ROWINDEX_SUFFIX
+        self._key = {"step": self.step, **parse_key(csv_options, csv_header)}
+        self.reset()
+
+
+    def __repr__(self) -> str:
+        return f"<RowIndex {self.filename} {len(self._offsets)}>"
+
+
+    def reset(self):
+        """
+        Empty the index, to fill it again
+        """
+        self._offsets = array("Q")
+        self.rows = None
+        self.complete = False
+
+
+    def add(self, row: int, offset: int):
+        """
+        Add a row to the index, if it is one of the indexed rows. Rows must
+        be added in order.
+          :param row: the row number
+          :param offset: the byte offset of the row start
+        """
+        if (row - 1) % self.step == 0 and \
+           (row - 1) // self.step == len(self._offsets):
+            self._offsets.append(offset)
+
+
+    def finish(self, rows: int):
+        """
+        Mark the index as complete, and save it
+          :param rows: the total number of rows in the file
+        """
+        self.rows = rows
+        self.complete = True
+        self.save()
+
+
+    def seek(self, row: int) -> Tuple[int, Optional[int]]:
+        """
+        Find the indexed row nearest to a row (at or before it)
+          :return: a tuple (row number, byte offset), or (1, None) if there is
+            no indexed row before it
+        """
+        pos = min((max(row, 1) - 1) // self.step, len(self._offsets) - 1)
+        if pos < 0:
+            return 1, None
+        return pos*self.step + 1, self._offsets[pos]
+
+
+    def boundaries(self) -> List[int]:
+        """
+        Return the byte offsets of all indexed rows, which are known record
+        boundaries
+        """
+        return self._offsets.tolist()
+
+
+    def as_dict(self) -> Dict:
+        """
+        Return a serializable version of the index
+        """
+        return {"format": FMT_ROWINDEX, "file": file_key(self.filename),
+                "key": self._key, "rows": self.rows,
+                "offsets": self._offsets.tolist()}
+
+
+    def save(self):
+        """
+        Write (atomically) the index to its sidecar file. An unwritable
+        sidecar is not an error, the index is then kept only in memory.
+        """
+        try:
+            dirname = os.path.dirname(os.path.abspath(self.sidecar))
+            fd, tmpname = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.as_dict(), f)
+            os.replace(tmpname, self.sidecar)
+        except OSError:
+            pass
+
+
+    def load(self) -> bool:
+        """
+        Load the index from its sidecar file, if it exists and is valid for
+        the current file version and parsing options
+          :return: if the index could be loaded
+        """
+        try:
+            with open(self.sidecar, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("format") != FMT_ROWINDEX or \
+               data.get("key") != self._key or \
+               data.get("file") != file_key(self.filename):
+                return False
+            self._offsets = array("Q", data["offsets"])
+            self.rows = data["rows"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+        self.complete = True
+        return True
+
+
+def index_ranges(bounds: Iterable[int], size: int,
+                 range_size: int) -> List[Tuple[int, int]]:
+    """
+    Divide a file into ranges of (approximately) a given size, starting at
+    known record boundaries
+      :param bounds: the known record boundaries, in order
+      :param size: the file size
+      :param range_size: the nominal range size
+      :return: a list of (start, end) byte offsets
+    """
+    starts = [0]
+    for pos in bounds:
+        if pos - starts[-1] >= range_size and pos < size:
+            starts.append(pos)
+    return list(zip(starts, starts[1:] + [size]))
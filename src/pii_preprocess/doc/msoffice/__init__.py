@@ -1 +1,6 @@
-from .msword import MsWordDocument
+from ..utils import make_lazy
+
+# Lazily imported objects, and the module they come from
+__getattr__, __dir__ = make_lazy(__name__, {
+    "MsWordDocument": ".msword"
+})
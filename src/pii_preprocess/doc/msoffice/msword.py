@@ -2,7 +2,9 @@
 Read Microsoft Word documents (docx)
 """
 
+import os
 from datetime import datetime
+from time import perf_counter
 
 from docx import Document
 from docx.text.paragraph import Paragraph
@@ -12,6 +14,10 @@ from typing import Dict, Iterable, Tuple
 from pii_data.types.doc.document import TreeSrcDocument, SequenceSrcDocument, TYPE_META
 from pii_data.types.doc.localdoc import dump_file
 
+from ...instrument import active, emit, track_chunks
+from ..srcindex import SourceIndex
+from ..utils import as_bool
+
 
 def add_subchunk(parent: Dict, subchunk: Dict):
     """
@@ -24,19 +30,21 @@ def add_subchunk(parent: Dict, subchunk: Dict):
     parent['chunks'].append(subchunk)
 
 
-def iter_paragraphs(it: Iterable[Paragraph]) -> Iterable[Tuple[str, str]]:
+def iter_paragraphs_pos(it: Iterable[Paragraph]) -> Iterable[Tuple[str, str, int, int]]:
     """
     Return paragraphs from the document. Will merge paragraphs containing
     only whitespace with the previous one.
      :param it: an iterable over the Word paragraphs
-     :return: a tuple (paragraph-text, paragraph-style)
+     :return: a tuple (paragraph-text, paragraph-style, position of the first
+       Word paragraph, number of Word paragraphs merged)
     """
     prev = None
-    for p in it:
-        cur = p.text + "\n", p.style.name
+    for n, p in enumerate(it):
+        cur = p.text + "\n", p.style.name, n, 1
         # If blank, add to previous paragraph and continue
         if not p.text or p.text.isspace():
-            prev = (prev[0]+cur[0], prev[1] or cur[1]) if prev else (cur[0], None)
+            prev = (prev[0]+cur[0], prev[1] or cur[1], prev[2], prev[3]+1) \
+                if prev else (cur[0], None, n, 1)
             continue
         # Return the previous paragraph
         if prev:
@@ -48,17 +56,30 @@ def iter_paragraphs(it: Iterable[Paragraph]) -> Iterable[Tuple[str, str]]:
         yield prev
 
 
+def iter_paragraphs(it: Iterable[Paragraph]) -> Iterable[Tuple[str, str]]:
+    """
+    Return paragraphs from the document. Will merge paragraphs containing
+    only whitespace with the previous one.
+     :param it: an iterable over the Word paragraphs
+     :return: a tuple (paragraph-text, paragraph-style)
+    """
+    for text, style, _, _ in iter_paragraphs_pos(it):
+        yield text, style
+
+
 class _TreeReader:
     """
     Iterate over the paragraphs of the document, building a tree by using its
     Heading styles
     """
 
-    def __init__(self, para: Iterable[Paragraph]):
+    def __init__(self, para: Iterable[Paragraph], index: SourceIndex = None):
         """
           :param para: an iterable over the document paragraphs
+          :param index: a source index to fill with the paragraph positions
         """
         self.para = para
+        self.index = index
 
 
     def __iter__(self) -> Iterable[Dict]:
@@ -73,8 +94,11 @@ class _TreeReader:
         heading = None
         topchunk = newchunk = None
         n = 0
+        index = self.index
+        if index is not None:
+            index.reset()
 
-        for text, style in iter_paragraphs(self.para):
+        for text, style, first, count in iter_paragraphs_pos(self.para):
 
             curlevel = newlevel
             heading = style.startswith("Heading")
@@ -86,6 +110,8 @@ class _TreeReader:
 
             n += 1
             newchunk = {"data": text, "id": f"P{n}"}
+            if index is not None:
+                index.add(f"P{n}", first, count)
 
             # A non-header
             if not heading:
@@ -132,6 +158,8 @@ class _TreeReader:
         # A last top-level group?
         if topchunk:
             yield topchunk
+        if index is not None:
+            index.finish()
 
 
 # ------------------------------------------------------------------------
@@ -139,15 +167,25 @@ class _TreeReader:
 
 class _BaseMsWordDocument:
 
-    def _open(self, filename: str, doctype: str) -> TYPE_META:
+    def _open(self, filename: str, doctype: str,
+              source_index: bool = False) -> TYPE_META:
         """
         Open an MS Word file and load it
           :param filename: Word filename to read
+          :param source_index: build a source index, with the position of
+            the Word paragraphs in each chunk
           :return: the document general metadata
         """
         # Open the Word file
         self.name = filename
+        self.source_index = SourceIndex("docx") if as_bool(source_index) \
+            else None
+        start = perf_counter()
         self.doc = Document(filename)
+        if active():
+            emit("doc.open", filename, reader=type(self).__name__,
+                 elapsed=perf_counter() - start,
+                 bytes=os.path.getsize(filename))
         #print(self.doc.sections)
         #print(self.doc.settings)
 
@@ -179,16 +217,34 @@ class SeqMsWordDocument(SequenceSrcDocument, _BaseMsWordDocument):
     (i.e. flat paragraphs).
     """
 
-    def __init__(self, filename: str, metadata: TYPE_META = None, **kwargs):
-        docmeta = self._open(filename, "sequence")
+    def __init__(self, filename: str, metadata: TYPE_META = None,
+                 source_index: bool = False, **kwargs):
+        docmeta = self._open(filename, "sequence", source_index)
         super().__init__(metadata=docmeta, **kwargs)
         if metadata:
             self.add_metadata(**metadata)
 
 
     def iter_base(self) -> Iterable[Dict]:
-        for n, (t, _) in enumerate(iter_paragraphs(self.doc.paragraphs), start=1):
-            yield {"data": t, "id": f"P{n}"}
+        para = iter_paragraphs_pos(self.doc.paragraphs)
+        if self.source_index is None or self.source_index.complete:
+            chunks = ({"data": t, "id": f"P{n}"}
+                      for n, (t, *_) in enumerate(para, start=1))
+        else:
+            chunks = self._index_chunks(para)
+        return track_chunks(self.name, chunks)
+
+
+    def _index_chunks(self, para: Iterable[Tuple]) -> Iterable[Dict]:
+        """
+        Produce the chunks, adding each one to the source index
+        """
+        index = self.source_index
+        index.reset()
+        for n, (text, _, first, count) in enumerate(para, start=1):
+            index.add(f"P{n}", first, count)
+            yield {"data": text, "id": f"P{n}"}
+        index.finish()
 
 
 class TreeMsWordDocument(TreeSrcDocument, _BaseMsWordDocument):
@@ -197,15 +253,19 @@ class TreeMsWordDocument(TreeSrcDocument, _BaseMsWordDocument):
     Heading styles to infer the tree.
     """
 
-    def __init__(self, filename: str, metadata: TYPE_META = None, **kwargs):
-        docmeta = self._open(filename, "tree")
+    def __init__(self, filename: str, metadata: TYPE_META = None,
+                 source_index: bool = False, **kwargs):
+        docmeta = self._open(filename, "tree", source_index)
         super().__init__(metadata=docmeta, **kwargs)
         if metadata:
             self.add_metadata(**metadata)
 
 
     def iter_base(self) -> Iterable[Dict]:
-        return _TreeReader(self.doc.paragraphs)
+        index = self.source_index
+        if index is not None and index.complete:
+            index = None
+        return track_chunks(self.name, _TreeReader(self.doc.paragraphs, index))
 
 
 
@@ -0,0 +1,154 @@
+"""
+A side index holding, for each chunk in a document, its coordinates in the
+source file, so that positions found in chunks (e.g. PII spans) can be mapped
+back to the file without scanning it again.
+
+The index is filled as the document is iterated, and is marked as complete
+when an iteration reaches the end of the document; further iterations leave
+it as it is.
+"""
+
+from array import array
+
+from typing import Dict, Iterator, Optional
+
+from pii_data.helper.exception import InvArgException
+
+
+# Format indicator for serialized source indexes
+FMT_SRCINDEX = "pii-preprocess:srcindex:v1"
+
+# Coordinate fields, by source type
+#  - text: character offset & length of the chunk in the decoded text, and
+#    byte offset & length in the file
+#  - csv: row number (as in the chunk id), line number of the row start and
+#    byte offset of the row start
+#  - docx: position of the first Word paragraph in the chunk, and number of
+#    paragraphs in it (blank paragraphs are merged with the previous one)
+FIELDS = {
+    "text": ("offset", "length", "byte_offset", "byte_length"),
+    "csv": ("row", "line", "byte_offset"),
+    "docx": ("paragraph", "count")
+}
+
+
+class SourceIndex:
+    """
+    A compact index of chunk source coordinates. Values are stored in a flat
+    integer array; chunk ids are stored only if given (otherwise the chunk
+    id is its position in the document, starting at 1, as for sequence
+    documents).
+    """
+
+    def __init__(self, source: str):
+        """
+          :param source: the source type, which defines the coordinate fields
+        """
+        self.source = source
+        self.fields = FIELDS[source]
+        self.reset()
+
+
+    def __repr__(self) -> str:
+        return f"<SourceIndex {self.source} {len(self)}>"
+
+
+    def __len__(self) -> int:
+        return len(self._values) // len(self.fields)
+
+
+    def reset(self):
+        """
+        Empty the index, to fill it again
+        """
+        self._values = array("q")
+        self._ids = None
+        self._pos = None
+        self.complete = False
+
+
+    def add(self, chunk_id: Optional[str], *values: int):
+        """
+        Add the coordinates for the next chunk
+          :param chunk_id: the chunk id, or `None` to use its position
+          :param values: the coordinate values, in field order
+        """
+        if chunk_id is not None:
+            if self._ids is None:
+                self._ids = [str(n) for n in range(1, len(self) + 1)]
+            self._ids.append(chunk_id)
+        elif self._ids is not None:
+            self._ids.append(str(len(self) + 1))
+        self._values.extend(values)
+        self._pos = None
+
+
+    def finish(self):
+        """
+        Mark the index as complete
+        """
+        self.complete = True
+
+
+    def _entry(self, pos: int) -> Dict:
+        num = len(self.fields)
+        values = self._values[pos*num:(pos+1)*num]
+        entry = {"id": self._ids[pos] if self._ids else str(pos + 1)}
+        entry.update(zip(self.fields, values))
+        return entry
+
+
+    def __iter__(self) -> Iterator[Dict]:
+        for pos in range(len(self)):
+            yield self._entry(pos)
+
+
+    def get(self, chunk_id: str) -> Optional[Dict]:
+        """
+        Get the coordinates for a chunk
+          :param chunk_id: the chunk id
+          :return: a dict with the chunk id and the coordinate fields, or
+            `None` if the chunk is not in the index
+        """
+        if self._ids is None:
+            try:
+                pos = int(chunk_id) - 1
+            except ValueError:
+                return None
+            return self._entry(pos) if 0 <= pos < len(self) else None
+        if self._pos is None:
+            self._pos = {cid: n for n, cid in enumerate(self._ids)}
+        pos = self._pos.get(chunk_id)
+        return None if pos is None else self._entry(pos)
+
+
+    def as_dict(self) -> Dict:
+        """
+        Return a serializable version of the index
+        """
+        return {"format": FMT_SRCINDEX, "source": self.source,
+                "fields": list(self.fields), "complete": self.complete,
+                "ids": self._ids, "values": self._values.tolist()}
+
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SourceIndex":
+        """
+        Create an index from its serialized version (as produced by
+        `as_dict()`)
+        """
+        if data.get("format") != FMT_SRCINDEX:
+            raise InvArgException("invalid source index format: {}",
+                                  data.get("format"))
+        index = cls(data["source"])
+        index._values = array("q", data["values"])
+        index._ids = data["ids"]
+        index.complete = data["complete"]
+        return index
+
+
+def source_index(doc) -> Optional[SourceIndex]:
+    """
+    Get the source index for a document, if it has one
+    """
+    return getattr(doc, "source_index", None)
@@ -1,2 +1,7 @@
+from ..utils import make_lazy
 from .defs import CHUNK_MODES
-from .load import TextSrcDocument
+
+# Lazily imported objects, and the module they come from
+__getattr__, __dir__ = make_lazy(__name__, {
+    "TextSrcDocument": ".load"
+})
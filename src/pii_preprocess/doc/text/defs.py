@@ -4,5 +4,30 @@ DEFAULT_INDENT = 2
 # Maximum number of words for a paragraph, in the relecant chunk modes
 DEFAULT_MAX_WORDS = 100
 
+# Maximum number of tokens for a chunk, in token mode
+DEFAULT_MAX_TOKENS = 512
+
+# Estimated number of characters per token, to count tokens when there is no
+# tokenizer
+DEFAULT_CHARS_PER_TOKEN = 4
+
 # Implemented chunking modes
-CHUNK_MODES = ("single", "line", "tree", "paragraph", "word")
+CHUNK_MODES = ("single", "line", "tree", "paragraph", "word", "token")
+
+# Default memory budget (in bytes) for reading a text document in memory;
+# larger documents are read in streaming mode, if the chunk mode supports it
+DEFAULT_MEMORY_BUDGET = 1 << 30
+
+# Estimated ratio between the memory needed to read & split a text document
+# in memory and its file size (uncompressed)
+MEMORY_FACTOR = 10
+
+# Estimated compression ratio, for compressed text files
+COMPRESSION_FACTOR = 5
+
+# Size (in characters) of the blocks read in streaming mode
+STREAM_BLOCK_SIZE = 1 << 16
+
+# Size (in bytes) of the ranges a text file is divided into for parallel
+# chunking
+PARALLEL_RANGE_SIZE = 1 << 26
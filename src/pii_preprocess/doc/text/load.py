@@ -7,7 +7,8 @@ from typing import Dict
 from pii_data.helper.exception import InvArgException
 from pii_data.types.doc.localdoc import BaseLocalSrcDocument
 
-from .read import SingleReader, LineReader, ParagraphReader, WordsReader, TreeReader
+from .read import SingleReader, LineReader, ParagraphReader, WordsReader, \
+    TreeReader, TokensReader
 
 
 # -----------------------------------------------------------------------
@@ -29,20 +30,27 @@ def load_text(inputfile: str, chunk_options: Dict,
       * "tree": indentation is used to define a document hierarchy
       * "paragraph": document is split into paragraphs
       * "words": document is split into chunks of whole words
+      * "token": document is split into chunks that fit a token budget
+
+    Large files are read in streaming mode (with bounded memory) when the
+    chunk mode supports it; see the "streaming" and "memory_budget" options.
+    They can also be chunked by a pool of processes; see the "workers" option.
     """
     # Instantiate the right object
     mode = chunk_options.get('mode', 'line')
     if mode == "single":
-        reader = SingleReader(**kwargs)
+        reader = SingleReader(chunk_options=chunk_options, **kwargs)
     elif mode == "line":
-        reader = LineReader(**kwargs)
+        reader = LineReader(chunk_options=chunk_options, **kwargs)
     elif mode == 'tree':
         indent = chunk_options.get("indent")
-        reader = TreeReader(indent, **kwargs)
+        reader = TreeReader(indent, chunk_options=chunk_options, **kwargs)
     elif mode in ("para", "paragraph"):
         reader = ParagraphReader(chunk_options=chunk_options, **kwargs)
     elif mode == "word":
         reader = WordsReader(chunk_options=chunk_options, **kwargs)
+    elif mode == "token":
+        reader = TokensReader(chunk_options=chunk_options, **kwargs)
     else:
         raise InvArgException(f"unknown mode {mode}")
 
@@ -3,3 +3,4 @@ from .read_lines import LineReader
 from .read_para import ParagraphReader
 from .read_tree import TreeReader
 from .read_words import WordsReader
+from .read_tokens import TokensReader
@@ -3,13 +3,97 @@ Base class for reading text files
 """
 
 import os
+from pathlib import Path
+from time import perf_counter
 
-from typing import Dict, TextIO
+from typing import Callable, Dict, Iterable, Iterator, TextIO, Tuple
 
-from pii_data.helper.io import openfile
 from pii_data.types.doc.document import TYPE_META
+from pii_data.types.doc.localdoc import BaseLocalSrcDocument, \
+    SequenceLocalSrcDocument
 
-from ...utils import add_default_meta
+from ....compress import open_file
+from ....defs import COMPRESSION_EXT
+from ....instrument import emit, track_chunks
+from ...srcindex import SourceIndex
+from ...utils import add_default_meta, as_bool, available_memory
+from ..defs import DEFAULT_MEMORY_BUDGET, MEMORY_FACTOR, COMPRESSION_FACTOR, \
+    STREAM_BLOCK_SIZE, PARALLEL_RANGE_SIZE
+from .offsets import IndexedChunks
+from .overlap import ContextWindows
+
+
+# A chunk together with its (start, end) character offsets in the document
+TYPE_SPAN = Tuple[int, int, str]
+
+
+def text_spans(chunks: Iterable[str]) -> Iterator[TYPE_SPAN]:
+    """
+    Add character offsets to a sequence of contiguous chunks
+    """
+    pos = 0
+    for chunk in chunks:
+        end = pos + len(chunk)
+        yield pos, end, chunk
+        pos = end
+
+
+class BaseSplitter:
+    """
+    Base class for the objects that split a document into chunks
+    """
+
+    def iter_spans(self) -> Iterator[TYPE_SPAN]:
+        """
+        Iterate over chunks, together with their (start, end) character
+        offsets in the document. This default implementation is valid only
+        for splitters whose chunks are contiguous in the document.
+        """
+        return text_spans(self)
+
+
+class TextBlocks:
+    """
+    A re-iterable source of text blocks from a file: each iteration reopens
+    the file and reads it incrementally
+    """
+
+    def __init__(self, inputfile: str, encoding: str = "utf-8",
+                 block_size: int = STREAM_BLOCK_SIZE,
+                 open_options: Dict = None):
+        """
+          :param open_options: options for `open_file()`
+        """
+        self.name = inputfile
+        self.encoding = encoding
+        self.block_size = block_size
+        self.open_options = open_options or {}
+
+    def __repr__(self) -> str:
+        return f"<TextBlocks {self.name}>"
+
+    def __iter__(self) -> Iterator[str]:
+        with open_file(self.name, encoding=self.encoding,
+                       **self.open_options) as f:
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    return
+                yield block
+
+
+class TextLines(TextBlocks):
+    """
+    A re-iterable source of text lines from a file
+    """
+
+    def __repr__(self) -> str:
+        return f"<TextLines {self.name}>"
+
+    def __iter__(self) -> Iterator[str]:
+        with open_file(self.name, encoding=self.encoding,
+                       **self.open_options) as f:
+            yield from f
 
 
 class BaseReader:
@@ -22,20 +106,226 @@ class BaseReader:
         self.opt = chunk_options
         self.meta = metadata or {}
         self.kwargs = kwargs
+        self.name = None
+        self.size = None
+        indexed = as_bool((chunk_options or {}).get("source_index", False))
+        self.index = SourceIndex("text") if indexed else None
+
+
+    def prepare(self, inputfile: str):
+        """
+        Prepare a local text file for reading
+        """
+        st = os.stat(inputfile)
+        add_default_meta(self.meta, origin="text", date=st.st_mtime)
+        self.name = inputfile
+        self.size = st.st_size
 
 
     def base_read(self, inputfile: str, encoding: str = 'utf-8') -> TextIO:
         """
         Prepare & open a local text file
         """
-        mtime = os.stat(inputfile).st_mtime
-        add_default_meta(self.meta, origin="text", date=mtime)
-        return openfile(inputfile, encoding=encoding)
+        self.prepare(inputfile)
+        return open_file(inputfile, encoding=encoding, **self.open_options())
+
+
+    def open_options(self) -> Dict:
+        """
+        The options to open a (possibly compressed) file, from the chunk
+        options:
+          * "decompress_workers": number of worker processes to decompress
+            files made of several compressed members (default is 1)
+          * "readahead": decompress in a background thread (by default it is
+            done for all compressed files)
+        """
+        opt = self.opt or {}
+        readahead = opt.get("readahead")
+        return {"workers": int(opt.get("decompress_workers", 1)),
+                "readahead": None if readahead is None else as_bool(readahead)}
+
+
+    def use_streaming(self, inputfile: str) -> bool:
+        """
+        Decide if a file should be read in streaming mode, according to the
+        "streaming" chunk option:
+          * `True` or `False`: always/never use streaming
+          * "auto" (default): use streaming if the estimated memory needed
+            to read the file in memory exceeds the memory budget (the
+            "memory_budget" chunk option, in bytes) or half the available
+            system memory
+        """
+        opt = self.opt or {}
+        mode = opt.get("streaming", "auto")
+        if mode != "auto":
+            return as_bool(mode)
+
+        size = Path(inputfile).stat().st_size
+        if str(inputfile).endswith(COMPRESSION_EXT):
+            size *= COMPRESSION_FACTOR
+        budget = int(opt.get("memory_budget") or DEFAULT_MEMORY_BUDGET)
+        avail = available_memory()
+        if avail:
+            budget = min(budget, avail // 2)
+        return size * MEMORY_FACTOR > budget
+
+
+    def use_mmap(self, inputfile: str, encoding: str = 'utf-8') -> bool:
+        """
+        Decide if a file should be read as a memory-mapped document, according
+        to the "mmap" chunk option. Compressed files, and files in encodings
+        that do not allow slicing by byte offsets, cannot be memory-mapped.
+        """
+        from .read_mmap import mappable_encoding
+        return as_bool((self.opt or {}).get("mmap", False)) and \
+            not str(inputfile).endswith(COMPRESSION_EXT) and \
+            mappable_encoding(encoding)
+
+
+    def mapped(self, inputfile: str, encoding: str,
+               splitter: Callable[[Iterable[str]], Iterable[str]]) -> Iterable[str]:
+        """
+        Prepare a local text file for reading as a memory-mapped document
+          :param splitter: a callable creating a streaming splitter over a
+            sequence of text blocks
+          :return: a re-iterable sequence of chunks
+        """
+        from .read_mmap import OffsetChunks
+        start = perf_counter()
+        self.prepare(inputfile)
+        self.opened(start)
+        block_size = (self.opt or {}).get("block_size", STREAM_BLOCK_SIZE)
+        return OffsetChunks(inputfile, splitter, encoding, int(block_size),
+                            self.index)
+
+
+    def use_parallel(self, inputfile: str, mode: str,
+                     encoding: str = 'utf-8') -> bool:
+        """
+        Decide if a file should be chunked in parallel, according to the
+        "workers" chunk option (the number of worker processes). Only
+        uncompressed files in UTF-8 larger than two ranges (as defined by the
+        "range_size" chunk option), and with no carriage returns, can be
+        chunked in parallel.
+        """
+        from .parallel import parallel_mode, parallel_encoding, \
+            has_carriage_returns
+        opt = self.opt or {}
+        if int(opt.get("workers", 1)) <= 1 or \
+           str(inputfile).endswith(COMPRESSION_EXT) or \
+           not parallel_mode(mode, opt) or not parallel_encoding(encoding):
+            return False
+        range_size = int(opt.get("range_size", PARALLEL_RANGE_SIZE))
+        return Path(inputfile).stat().st_size > 2*range_size and \
+            not has_carriage_returns(inputfile)
+
+
+    def parallel(self, inputfile: str, mode: str,
+                 encoding: str = 'utf-8') -> Iterable[str]:
+        """
+        Chunk a local text file in parallel, creating a memory-mapped document
+          :return: a re-iterable sequence of chunks
+        """
+        from .read_mmap import OffsetChunks
+        from .parallel import parallel_offsets
+        start = perf_counter()
+        self.prepare(inputfile)
+        opt = self.opt or {}
+        range_size = int(opt.get("range_size", PARALLEL_RANGE_SIZE))
+        offsets = parallel_offsets(inputfile, mode, opt, encoding,
+                                   int(opt["workers"]), range_size, self.index)
+        self.opened(start)
+        return OffsetChunks(inputfile, None, encoding, index=self.index,
+                            offsets=offsets)
+
+
+    def blocks(self, inputfile: str, encoding: str = 'utf-8') -> TextBlocks:
+        """
+        Prepare a local text file for reading in streaming mode
+          :return: a re-iterable source of text blocks
+        """
+        start = perf_counter()
+        self.prepare(inputfile)
+        self.opened(start)
+        block_size = (self.opt or {}).get("block_size", STREAM_BLOCK_SIZE)
+        return TextBlocks(inputfile, encoding, int(block_size),
+                          self.open_options())
+
+
+    def lines(self, inputfile: str, encoding: str = 'utf-8') -> TextLines:
+        """
+        Prepare a local text file for reading in streaming mode, line by line
+          :return: a re-iterable source of text lines
+        """
+        start = perf_counter()
+        self.prepare(inputfile)
+        self.opened(start)
+        return TextLines(inputfile, encoding, open_options=self.open_options())
+
+
+    def opened(self, start: float):
+        """
+        Report that the file has been opened & read
+          :param start: the time at which the opening started
+        """
+        emit("doc.open", self.name, reader=type(self).__name__,
+             elapsed=perf_counter() - start, bytes=self.size)
+
+
+    def split(self, blocks: Iterable[str],
+              splitter: Callable[[Iterable[str]], Iterable[str]],
+              encoding: str = 'utf-8') -> Iterable[str]:
+        """
+        Create the sequence of chunks for a document
+          :param blocks: a (re-iterable) source of text blocks
+          :param splitter: a callable creating a splitter over a sequence of
+            text blocks
+          :param encoding: the file encoding (used to compute byte offsets
+            for the source index)
+        """
+        if self.index is None:
+            return splitter(blocks)
+        return IndexedChunks(blocks, splitter, encoding, self.index)
+
+
+    def windows(self, chunks: Iterable[str],
+                count: Callable[[str], int] = None) -> Iterable:
+        """
+        Add overlapping context to the document chunks, as defined by the
+        "overlap" chunk option (the context size at each side of a chunk)
+          :param count: a token counter, if the overlap is measured in tokens
+            (else it is measured in words)
+        """
+        overlap = int((self.opt or {}).get("overlap", 0))
+        if overlap <= 0:
+            return chunks
+        return ContextWindows(chunks, overlap, count)
+
+
+    def track(self, chunks: Iterable) -> Iterable:
+        """
+        Wrap the document chunks so that their iteration can be instrumented
+        """
+        return track_chunks(self.name, chunks, reiterable=True)
+
+
+    def document(self, chunks: Iterable,
+                 cls: type = SequenceLocalSrcDocument) -> BaseLocalSrcDocument:
+        """
+        Create the document object, attaching the source index (if any)
+        """
+        doc = cls(chunks=self.track(chunks), metadata=self.meta, **self.kwargs)
+        if self.index is not None:
+            doc.source_index = self.index
+        return doc
 
 
     def read(self, inputfile: str, encoding: str = 'utf-8') -> str:
         """
         Read a local text file
         """
+        start = perf_counter()
         with self.base_read(inputfile, encoding=encoding) as f:
-            return f.read()
+            doc = f.read()
+        self.opened(start)
+        return doc
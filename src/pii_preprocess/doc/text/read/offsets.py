@@ -0,0 +1,119 @@
+"""
+Compute the source coordinates (character and byte offsets) of text chunks
+"""
+
+import codecs
+from collections import deque
+
+from typing import Callable, Iterable, Iterator, Tuple
+
+from ...srcindex import SourceIndex
+
+
+# A block of decoded text: (character offset, byte offset, text)
+TYPE_BLOCK = Tuple[int, int, str]
+
+
+def plain_encoding(encoding: str) -> str:
+    """
+    Return the encoding to use to compute the byte length of text fragments
+    (i.e. without a signature)
+    """
+    name = codecs.lookup(encoding).name
+    return "utf-8" if name == "utf-8-sig" else name
+
+
+def encoded_blocks(blocks: Iterable[str],
+                   encoding: str) -> Iterator[TYPE_BLOCK]:
+    """
+    Add character and byte offsets to a sequence of text blocks
+    """
+    encoding = plain_encoding(encoding)
+    cpos = bpos = 0
+    for text in blocks:
+        yield cpos, bpos, text
+        cpos += len(text)
+        bpos += len(text.encode(encoding))
+
+
+class ByteMapper:
+    """
+    Convert (non-decreasing) character offsets into byte offsets, over a
+    sequence of decoded blocks. Only the blocks not yet passed are kept.
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self.blocks = deque()
+        self.cur = 0         # character position within the first block
+        self.bpos = 0        # byte offset for that position
+
+    def track(self, blocks: Iterable[TYPE_BLOCK]) -> Iterator[str]:
+        """
+        Record the blocks as they are consumed, and pass on their text
+        """
+        for block in blocks:
+            self.blocks.append(block)
+            yield block[2]
+
+    def byte_offset(self, cpos: int) -> int:
+        """
+        Compute the byte offset for a character offset
+        """
+        blocks = self.blocks
+        while len(blocks) > 1 and cpos >= blocks[1][0]:
+            blocks.popleft()
+            self.cur = 0
+            self.bpos = blocks[0][1]
+        if not blocks:
+            return self.bpos
+        start, _, text = blocks[0]
+        pos = cpos - start
+        if pos > self.cur:
+            self.bpos += len(text[self.cur:pos].encode(self.encoding))
+            self.cur = pos
+        return self.bpos
+
+
+class IndexedChunks:
+    """
+    A re-iterable sequence of text chunks that fills a source index with
+    the coordinates of each chunk. Once the index is complete, subsequent
+    iterations just produce the chunks.
+    """
+
+    def __init__(self, blocks: Iterable[str],
+                 splitter: Callable[[Iterable[str]], Iterable[str]],
+                 encoding: str, index: SourceIndex):
+        """
+          :param blocks: a (re-iterable) source of text blocks
+          :param splitter: a callable that receives a sequence of text
+            blocks and returns a splitter object for them (an object with
+            an `iter_spans()` method)
+          :param encoding: the file encoding
+          :param index: the source index to fill
+        """
+        self.blocks = blocks
+        self.splitter = splitter
+        self.encoding = encoding
+        self.index = index
+
+    def __repr__(self) -> str:
+        return f"<IndexedChunks {self.index}>"
+
+    def __iter__(self) -> Iterator[str]:
+        if self.index.complete:
+            return iter(self.splitter(self.blocks))
+        return self._scan()
+
+    def _scan(self) -> Iterator[str]:
+        index = self.index
+        index.reset()
+        mapper = ByteMapper(plain_encoding(self.encoding))
+        blocks = mapper.track(encoded_blocks(self.blocks, self.encoding))
+        for start, end, chunk in self.splitter(blocks).iter_spans():
+            bstart = mapper.byte_offset(start)
+            bend = mapper.byte_offset(end)
+            index.add(None, start, end - start, bstart, bend - bstart)
+            yield chunk
+        index.finish()
@@ -0,0 +1,157 @@
+"""
+Add overlapping context to text chunks: each chunk is extended with the text
+around it (the end of the previous chunks and the start of the next ones), so
+that it can be processed independently of its neighbours. The position of the
+chunk's own text within the extended text is recorded in the chunk context,
+so that the overlapping text is not processed twice.
+"""
+
+import re
+from collections import deque
+
+from typing import Callable, Dict, Iterable, Iterator
+
+
+WORD = re.compile(r"\w+")
+
+
+def head_words(text: str, num: int) -> str:
+    """
+    Return the start of a text, up to the end of its n-th word
+    """
+    if num <= 0:
+        return ""
+    n = 0
+    for m in WORD.finditer(text):
+        n += 1
+        if n == num:
+            return text[:m.end()]
+    return text
+
+
+def tail_words(text: str, num: int) -> str:
+    """
+    Return the end of a text, from the start of its n-th word from the end
+    """
+    pos = len(text)
+    for _ in range(num):
+        while pos > 0 and not WORD.match(text[pos-1]):
+            pos -= 1
+        if pos == 0:
+            return text
+        while pos > 0 and WORD.match(text[pos-1]):
+            pos -= 1
+    return text[pos:]
+
+
+def count_words(text: str, limit: int) -> int:
+    """
+    Count the words in a text, stopping at a limit
+    """
+    num = 0
+    for _ in WORD.finditer(text):
+        num += 1
+        if num >= limit:
+            break
+    return num
+
+
+class ContextWindows:
+    """
+    A re-iterable sequence of chunks with overlapping context. Each chunk is
+    produced as a dict with:
+      - data: the chunk text, preceded and followed by its context
+      - context: a dict with a "core" element, holding the "start" and "end"
+        positions of the chunk text within the data
+    """
+
+    def __init__(self, chunks: Iterable[str], overlap: int,
+                 count: Callable[[str], int] = None):
+        """
+          :param chunks: the source chunks
+          :param overlap: the size of the context at each side, in words (or
+            in tokens, if a token counter is given)
+          :param count: a token counter, if the overlap is measured in tokens
+        """
+        self.chunks = chunks
+        self.overlap = overlap
+        self.count = count
+
+
+    def __repr__(self) -> str:
+        return f"<ContextWindows {self.overlap}>"
+
+
+    def size(self, text: str) -> int:
+        """
+        The size of a text, in context units (capped at the overlap size)
+        """
+        if self.count is None:
+            return count_words(text, self.overlap)
+        return min(self.count(text), self.overlap)
+
+
+    def fit(self, text: str, cut: Callable[[str, int], str]) -> str:
+        """
+        Cut a text at word boundaries, to the context size
+          :param cut: the function to cut the text to a number of words
+        """
+        if self.count is None:
+            return cut(text, self.overlap)
+        # Find the largest number of words that fit in the token budget
+        lo, hi = 0, self.overlap
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.count(cut(text, mid)) <= self.overlap:
+                lo = mid
+            else:
+                hi = mid - 1
+        return cut(text, lo)
+
+
+    def window(self, before: Iterable, chunk: str, after: Iterable) -> Dict:
+        """
+        Build a chunk with its context
+          :param before: the previous chunks, as (text, size) tuples
+          :param chunk: the chunk text
+          :param after: the next chunks, as (text, size) tuples
+        """
+        pre = self.fit("".join(c[0] for c in before), tail_words)
+        post = self.fit("".join(c[0] for c in after), head_words)
+        start = len(pre)
+        return {"data": pre + chunk + post,
+                "context": {"core": {"start": start,
+                                     "end": start + len(chunk)}}}
+
+
+    def __iter__(self) -> Iterator[Dict]:
+        before = deque()     # previous chunks, as many as needed for context
+        pending = deque()    # the current chunk, plus the next ones
+        before_size = ahead_size = 0
+
+        for chunk in self.chunks:
+
+            # Add the chunk to the pending ones
+            size = self.size(chunk)
+            if pending:
+                ahead_size += size
+            pending.append((chunk, size))
+            if ahead_size < self.overlap:
+                continue
+
+            # There is enough context after the current chunk: produce it
+            cur, size = pending.popleft()
+            yield self.window(before, cur, pending)
+            ahead_size -= pending[0][1]
+
+            # Move it to the previous chunks, dropping those not needed
+            before.append((cur, size))
+            before_size += size
+            while before_size - before[0][1] >= self.overlap:
+                before_size -= before.popleft()[1]
+
+        # Produce the remaining chunks
+        while pending:
+            cur, size = pending.popleft()
+            yield self.window(before, cur, pending)
+            before.append((cur, size))
@@ -0,0 +1,319 @@
+"""
+Parallel chunking of a large text file. The file is divided into byte ranges,
+each one starting at a "safe boundary": a position at which the chunking for
+the active mode restarts from a clean state, so that chunking a range on its
+own produces the same chunks as chunking the whole file. The ranges are
+chunked by a pool of worker processes, and their chunk offsets are stitched
+together into a memory-mapped document.
+
+Safe boundaries are:
+  - line mode: the start of a non-blank line
+  - paragraph mode: the end of a run of blank lines. With a minimum number of
+    words per chunk, the end of a paragraph that exceeds that minimum (which
+    is always the end of a chunk)
+  - word mode: the start of a word. Since chunks are groups of a fixed number
+    of words, a first pass counts the words in each range, so that each range
+    knows where its first full chunk starts; the chunk that straddles two
+    ranges is joined when stitching
+"""
+
+import re
+import codecs
+from array import array
+from itertools import accumulate
+
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ...srcindex import SourceIndex
+from ..defs import DEFAULT_MAX_WORDS
+from .base import text_spans
+from .offsets import ByteMapper
+from .read_mmap import mapped_file
+from .read_lines import LineSplitter
+from .read_para import ParagraphSplitter
+from .read_words import WordSplitter, word_chunk_regex
+
+
+# Chunk modes that can be processed in parallel
+PARALLEL_MODES = ("line", "paragraph", "word")
+
+# Encodings that can be processed in parallel (those in which a character
+# start can be found from any byte position)
+PARALLEL_ENCODINGS = ("utf-8", "utf-8-sig", "ascii")
+
+# Initial size (in bytes) of the window searched for a safe boundary
+BOUNDARY_WINDOW = 1 << 16
+
+# Size (in words) of the groups used to count words
+COUNT_GROUP_SIZE = 1000
+
+# A position after a newline, followed by a non-blank line
+LINE_START = re.compile(r"\n(?=[^\S\n]*\S)")
+# A position after a run of blank lines, followed by a non-blank line
+PARA_START = re.compile(r"\n\s*\n(?=[^\S\n]*\S)")
+# The start of a word
+WORD_START = re.compile(r"\W(?=\w)")
+
+WORD_SEP = re.compile(r"\W+")
+NONWS = re.compile(r"\S")
+
+
+def parallel_mode(mode: str, chunk_options: Dict) -> bool:
+    """
+    Check if a chunk mode (with its options) can be processed in parallel
+    """
+    if mode == "word":
+        return bool(chunk_options.get("max_words", DEFAULT_MAX_WORDS))
+    return mode in PARALLEL_MODES
+
+
+def parallel_encoding(encoding: str) -> bool:
+    """
+    Check if an encoding can be processed in parallel
+    """
+    try:
+        return codecs.lookup(encoding).name in PARALLEL_ENCODINGS
+    except LookupError:
+        return False
+
+
+def has_carriage_returns(filename: str) -> bool:
+    """
+    Check if a file contains carriage returns. Sequential reading translates
+    them as newlines, while chunking from a mapped file keeps them, so such
+    files cannot be chunked in parallel with identical results.
+    """
+    with mapped_file(filename) as mm:
+        return mm.find(b"\r") >= 0
+
+
+def boundary_finder(mode: str,
+                    chunk_options: Dict) -> Callable[[str], Optional[int]]:
+    """
+    Create the function that finds the first safe boundary in a text
+    fragment for a chunk mode
+      :return: a function that receives a text and returns the character
+         offset of its first safe boundary (or `None` if there is none)
+    """
+    regex = LINE_START if mode == "line" else \
+        WORD_START if mode == "word" else PARA_START
+
+    def find(text: str) -> Optional[int]:
+        m = regex.search(text)
+        return m.end() if m else None
+
+    if mode != "paragraph" or not int(chunk_options.get("min_words", 0)):
+        return find
+
+    def find_para(text: str) -> Optional[int]:
+        # Move on to the end of the first paragraph exceeding the minimum.
+        # A paragraph is complete only if there is text after its separator.
+        pos = find(text)
+        if pos is None:
+            return None
+        splitter = ParagraphSplitter(text[pos:], chunk_options)
+        for _, end, para in text_spans(splitter.paragraphs()):
+            if not NONWS.search(text, pos + end):
+                return None
+            if splitter.count_words(para) > splitter.wmin:
+                return pos + end
+        return None
+
+    return find_para
+
+
+def find_boundary(buf: bytes, pos: int, find: Callable[[str], Optional[int]],
+                  window: int = BOUNDARY_WINDOW) -> int:
+    """
+    Find the first safe boundary after a byte position in a UTF-8 buffer
+      :param buf: the buffer
+      :param pos: the byte position to start searching at
+      :param find: the function that finds a boundary in a text fragment
+      :param window: the initial size of the fragment to search (it is
+        doubled until a boundary is found)
+      :return: the byte offset of the boundary (the buffer size if there is
+        none)
+    """
+    size = len(buf)
+    # Move to the start of a character
+    while pos < size and buf[pos] & 0xC0 == 0x80:
+        pos += 1
+    while pos < size:
+        final = pos + window >= size
+        dec = codecs.getincrementaldecoder("utf-8")()
+        text = dec.decode(buf[pos:pos+window], final)
+        cpos = find(text)
+        if cpos is not None:
+            return pos + len(text[:cpos].encode("utf-8"))
+        if final:
+            break
+        window *= 2
+    return size
+
+
+def byte_ranges(buf: bytes, start: int, range_size: int,
+                find: Callable[[str], Optional[int]]) -> List[Tuple[int, int]]:
+    """
+    Divide a buffer into ranges of (approximately) a given size, each one
+    starting at a safe boundary
+      :return: a list of (start, end) byte offsets
+    """
+    bounds = [start]
+    while True:
+        pos = find_boundary(buf, bounds[-1] + range_size, find)
+        if pos >= len(buf):
+            break
+        bounds.append(pos)
+    bounds.append(len(buf))
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _count_words(filename: str, start: int, end: int) -> int:
+    """
+    Count the words in a file range (as the number of word separators)
+    """
+    with mapped_file(filename) as mm:
+        text = str(mm[start:end], "utf-8")
+    # Count first whole groups of words, which is faster than counting
+    # separators one by one
+    group = word_chunk_regex(COUNT_GROUP_SIZE)
+    num = pos = 0
+    while True:
+        m = group.match(text, pos)
+        if not m:
+            return num + len(WORD_SEP.findall(text, pos))
+        num += COUNT_GROUP_SIZE
+        pos = m.end()
+
+
+def word_spans(text: str, chunk_options: Dict,
+               skip: int) -> Iterable[Tuple[int, int]]:
+    """
+    Split a range into word chunks
+      :param skip: number of words that complete the chunk started in the
+        previous ranges
+      :return: an iterable of (start, end) offsets; the first one is the end
+        of the previous chunk (if `skip` is not 0), and the last one is the
+        start of the next chunk (if the range is not the last one)
+    """
+    pos = 0
+    if skip:
+        m = word_chunk_regex(skip).match(text)
+        if not m:
+            return [(0, len(text))]
+        pos = m.end()
+    spans = [(0, pos)] if skip else []
+    sp = WordSplitter(text[pos:], chunk_options)
+    spans += ((pos + s, pos + e) for s, e, _ in sp.iter_spans())
+    return spans
+
+
+def _chunk_range(filename: str, mode: str, chunk_options: Dict,
+                 start: int, end: int, last: bool,
+                 skip: int = 0) -> Tuple[array, array, int]:
+    """
+    Chunk a file range
+      :param filename: the file to read
+      :param mode: chunk mode
+      :param chunk_options: chunk options
+      :param start: start byte offset for the range
+      :param end: end byte offset for the range
+      :param last: if this is the last range in the file
+      :param skip: (in word mode) the number of words that complete the
+        chunk started in the previous ranges
+      :return: a tuple (byte offsets, character offsets, range length in
+        characters). Offsets are stored as (start, end) pairs for each chunk,
+        byte offsets relative to the file and character offsets relative to
+        the range.
+    """
+    with mapped_file(filename) as mm:
+        text = str(mm[start:end], "utf-8")
+
+    if mode == "line":
+        spans = ((s, e) for s, e, _ in LineSplitter(text).iter_spans())
+    elif mode == "paragraph":
+        sp = ParagraphSplitter(text, chunk_options)
+        spans = ((s, e) for s, e, _ in sp.iter_spans())
+    else:
+        spans = word_spans(text, chunk_options, skip)
+
+    mapper = ByteMapper("utf-8")
+    mapper.bpos = start
+    mapper.blocks.append((0, start, text))
+    boffs = array("Q")
+    coffs = array("Q")
+    for s, e in spans:
+        boffs.extend((mapper.byte_offset(s), mapper.byte_offset(e)))
+        coffs.extend((s, e))
+
+    # With word limits, paragraph mode produces an empty chunk at the end of
+    # the text; it is valid only at the end of the file
+    if not last and coffs and coffs[-2] == coffs[-1] == len(text) \
+       and mode == "paragraph":
+        del boffs[-2:], coffs[-2:]
+
+    return boffs, coffs, len(text)
+
+
+def parallel_offsets(filename: str, mode: str, chunk_options: Dict,
+                     encoding: str, workers: int, range_size: int,
+                     index: SourceIndex = None) -> array:
+    """
+    Chunk a text file in parallel
+      :param filename: the file to read
+      :param mode: chunk mode (one of PARALLEL_MODES)
+      :param chunk_options: chunk options
+      :param encoding: file encoding (one of PARALLEL_ENCODINGS)
+      :param workers: number of worker processes
+      :param range_size: the size of the ranges the file is divided into
+      :param index: a source index to fill with the chunk coordinates
+      :return: the chunk offsets, as (start, end) byte offset pairs
+    """
+    find = boundary_finder(mode, chunk_options)
+    with mapped_file(filename) as mm:
+        skip = 3 if codecs.lookup(encoding).name == "utf-8-sig" and \
+            mm[:3] == codecs.BOM_UTF8 else 0
+        ranges = byte_ranges(mm, skip, range_size, find)
+    num = len(ranges)
+    names = [filename] * num
+    starts = [r[0] for r in ranges]
+    ends = [r[1] for r in ranges]
+    last = [False] * (num - 1) + [True]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as pool:
+        skips = [0] * num
+        if mode == "word":
+            # Find the words needed to complete the chunk open at each range
+            size = int(chunk_options.get("max_words", DEFAULT_MAX_WORDS))
+            counts = pool.map(_count_words, names, starts, ends)
+            skips = [-n % size for n in accumulate(counts, initial=0)][:-1]
+        results = pool.map(_chunk_range, names, [mode] * num,
+                           [chunk_options] * num, starts, ends, last, skips)
+
+        # Stitch the chunks. In word mode, the last chunk in a range (except
+        # for the last range) continues in the next range
+        offsets = array("Q")
+        cbase = 0
+        carry = None
+        if index is not None:
+            index.reset()
+        for n, (boffs, coffs, nchars) in enumerate(results):
+            if index is not None:
+                coffs = array("Q", (c + cbase for c in coffs))
+                cbase += nchars
+            if carry is not None:
+                boffs[0], coffs[0] = carry
+                carry = None
+            if mode == "word" and not last[n]:
+                carry = boffs[-2], coffs[-2]
+                del boffs[-2:], coffs[-2:]
+            offsets.extend(boffs)
+            if index is not None:
+                for i in range(0, len(boffs), 2):
+                    index.add(None, coffs[i], coffs[i+1] - coffs[i],
+                              boffs[i], boffs[i+1] - boffs[i])
+
+    if index is not None:
+        index.finish()
+    return offsets
@@ -4,19 +4,33 @@ Read a text document and split it by lines
 
 import re
 
-from typing import Dict, Iterator
+from typing import Dict, Iterable, Iterator
 
 from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
 
-from ...utils import chunker
-from .base import BaseReader
+from .base import BaseReader, BaseSplitter
 
 
 # A newline, possibly followed by blank lines
 NEWLINE = r"( \s*\n (?:\s*\n)* )"
 
 
-class LineSplitter:
+def iter_lines(blocks: Iterable[str]) -> Iterator[str]:
+    """
+    Split a sequence of text blocks into lines (only "\\n" is considered a
+    line terminator). The last line may be unterminated.
+    """
+    pending = ""
+    for block in blocks:
+        lines = (pending + block).split("\n")
+        for line in lines[:-1]:
+            yield line + "\n"
+        pending = lines[-1]
+    if pending:
+        yield pending
+
+
+class LineSplitter(BaseSplitter):
 
     def __init__(self, doc: str, chunk_options: Dict = None):
         self.doc = doc
@@ -24,7 +38,40 @@ class LineSplitter:
         self.regex = re.compile(NEWLINE, flags=re.X)
 
     def __iter__(self) -> Iterator[str]:
-        return chunker(self.regex.split(self.doc), 2, smin=2)
+        # Each chunk is a line plus its newline separator; an unterminated
+        # last line is not produced
+        pos = 0
+        for m in self.regex.finditer(self.doc):
+            yield self.doc[pos:m.end()]
+            pos = m.end()
+
+
+class StreamLineSplitter(BaseSplitter):
+    """
+    Split a document given as a sequence of text lines, producing the same
+    chunks as LineSplitter: each chunk is a non-blank line followed by all
+    the blank lines after it, and an unterminated last line is dropped.
+    It holds in memory only the current chunk.
+    """
+
+    def __init__(self, lines: Iterable[str], chunk_options: Dict = None):
+        """
+         :param lines: a (re-iterable) source of text lines
+        """
+        self.lines = lines
+
+    def __iter__(self) -> Iterator[str]:
+        chunk = ""
+        for line in self.lines:
+            if not line.endswith("\n"):
+                break   # an unterminated last line
+            if chunk and not line.isspace():
+                yield chunk
+                chunk = line
+            else:
+                chunk += line
+        if chunk:
+            yield chunk
 
 
 class LineReader(BaseReader):
@@ -37,7 +84,16 @@ class LineReader(BaseReader):
         """
         Read a local text file
         """
-        doc = super().read(inputfile, encoding)
-        chunks = LineSplitter(doc)
-        return SequenceLocalSrcDocument(chunks=chunks, metadata=self.meta,
-                                        **self.kwargs)
+        if self.use_parallel(inputfile, "line", encoding):
+            chunks = self.parallel(inputfile, "line", encoding)
+        elif self.use_mmap(inputfile, encoding):
+            chunks = self.mapped(inputfile, encoding,
+                                 lambda b: StreamLineSplitter(iter_lines(b)))
+        elif self.use_streaming(inputfile):
+            chunks = self.split(self.lines(inputfile, encoding),
+                                StreamLineSplitter, encoding)
+        else:
+            doc = super().read(inputfile, encoding)
+            chunks = self.split([doc], lambda b: LineSplitter("".join(b)),
+                                encoding)
+        return self.document(chunks)
@@ -0,0 +1,157 @@
+"""
+Memory-mapped text documents: the file is mapped (not read) into memory, and
+chunks are stored as (start, end) byte offsets into the mapping, decoded on
+demand.
+
+The first iteration over the document scans the mapped file (decoding it
+incrementally, block by block) with a streaming splitter, and records the
+byte offsets of each chunk. Subsequent iterations just slice the mapping at
+the recorded offsets. Since the file contents live in the OS page cache, and
+not in the process heap, opening a document is immediate and several
+processes reading the same file share its memory.
+"""
+
+import mmap
+import codecs
+from array import array
+from contextlib import contextmanager
+
+from typing import Callable, Iterable, Iterator
+
+from ...srcindex import SourceIndex
+from ..defs import STREAM_BLOCK_SIZE
+from .offsets import TYPE_BLOCK, ByteMapper
+
+
+# Encodings that cannot be used with memory-mapped documents (their encoded
+# form for a substring is not a slice of the encoded document)
+UNSUPPORTED_ENCODINGS = ("utf-16", "utf-32")
+
+
+def mappable_encoding(encoding: str) -> bool:
+    """
+    Check if an encoding can be used for memory-mapped documents
+    """
+    try:
+        name = codecs.lookup(encoding).name
+    except LookupError:
+        return False
+    return not name.startswith(UNSUPPORTED_ENCODINGS)
+
+
+@contextmanager
+def mapped_file(filename: str):
+    """
+    A context manager providing a read-only mapping of a file (or an empty
+    bytes object for an empty file, which cannot be mapped)
+    """
+    with open(filename, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            yield b""
+            return
+        with mm:
+            yield mm
+
+
+def decode_blocks(buf: bytes, encoding: str,
+                  block_size: int = STREAM_BLOCK_SIZE,
+                  start: int = 0) -> Iterator[TYPE_BLOCK]:
+    """
+    Decode a byte buffer incrementally, in blocks. No newline translation is
+    done.
+      :param start: byte offset at which to start decoding
+      :return: an iterator of (character offset, byte offset, text) tuples
+    """
+    dec = codecs.getincrementaldecoder(encoding)()
+    cpos = 0
+    for bpos in range(start, len(buf), block_size):
+        # Bytes from the previous block still pending in the decoder belong
+        # to the first character in this one
+        pending = len(dec.getstate()[0])
+        final = bpos + block_size >= len(buf)
+        text = dec.decode(buf[bpos:bpos+block_size], final)
+        if text:
+            yield cpos, bpos - pending, text
+            cpos += len(text)
+
+
+class OffsetChunks:
+    """
+    A re-iterable sequence of text chunks from a memory-mapped file, stored
+    as byte offsets
+    """
+
+    def __init__(self, filename: str,
+                 splitter: Callable[[Iterable[str]], Iterable[str]],
+                 encoding: str = "utf-8",
+                 block_size: int = STREAM_BLOCK_SIZE,
+                 index: SourceIndex = None, offsets: array = None):
+        """
+          :param filename: name of the text file
+          :param splitter: a callable that receives a sequence of text
+            blocks and returns a splitter object for them (an object with
+            an `iter_spans()` method)
+          :param encoding: the file encoding
+          :param block_size: size (in bytes) of the blocks to decode
+          :param index: a source index to fill with the chunk coordinates
+          :param offsets: the chunk byte offsets, if already computed (then
+            the file is never scanned)
+        """
+        self.name = filename
+        self.splitter = splitter
+        self.encoding = encoding
+        self.block_size = block_size
+        self.offsets = offsets
+        self.index = index
+
+    def __repr__(self) -> str:
+        return f"<OffsetChunks {self.name}>"
+
+    def __iter__(self) -> Iterator[str]:
+        if self.offsets is None:
+            return self._scan()
+        return self._slices()
+
+    def _scan(self) -> Iterator[str]:
+        """
+        Split the file into chunks, recording their byte offsets. They are
+        kept only if the iteration is complete.
+        """
+        # A signature-aware encoding skips the BOM (if present)
+        encoding = self.encoding
+        skip = 0
+        offsets = array("Q")
+        index = self.index
+        if index is not None:
+            index.reset()
+        with mapped_file(self.name) as mm:
+            if codecs.lookup(encoding).name == "utf-8-sig":
+                encoding = "utf-8"
+                if mm[:3] == codecs.BOM_UTF8:
+                    skip = 3
+            mapper = ByteMapper(encoding)
+            mapper.bpos = skip
+            blocks = decode_blocks(mm, encoding, self.block_size, skip)
+            splitter = self.splitter(mapper.track(blocks))
+            for start, end, chunk in splitter.iter_spans():
+                bstart = mapper.byte_offset(start)
+                bend = mapper.byte_offset(end)
+                offsets.append(bstart)
+                offsets.append(bend)
+                if index is not None:
+                    index.add(None, start, end - start, bstart, bend - bstart)
+                yield chunk
+        self.offsets = offsets
+        if index is not None:
+            index.finish()
+
+    def _slices(self) -> Iterator[str]:
+        """
+        Produce the chunks from their recorded offsets
+        """
+        offsets = self.offsets
+        with mapped_file(self.name) as mm:
+            for n in range(0, len(offsets), 2):
+                yield str(mm[offsets[n]:offsets[n+1]], self.encoding)
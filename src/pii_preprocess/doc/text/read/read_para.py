@@ -5,16 +5,17 @@ options to limit paragraph sizes.
 """
 import re
 
-from typing import Dict, Iterator
+from typing import Dict, Iterable, Iterator, Tuple
 
 from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
 
-from ...utils import chunker
-from .base import BaseReader
+from .base import BaseReader, BaseSplitter, TYPE_SPAN, text_spans
+from .read_words import word_chunk_regex
 
 
 # End of sentence punctuation for Latin, Devanagari, Chinese & Arabic scripts
-EOS = r"[\.\?!।|。！？⋯…؟]+"
+EOS_CHARS = ".?!।|。！？⋯…؟"
+EOS = "[" + re.escape(EOS_CHARS) + "]+"
 
 # End of paragraph marked by blank lines
 EOP_BLK = r"\n (?:\s*\n){1,}"
@@ -26,7 +27,7 @@ EOP_EOS = r"(?:" + EOS + r"\s*\n (?:\s*\n)* | \n (?:\s*\n){1,} )"
 
 
 
-class ParagraphSplitter:
+class ParagraphSplitter(BaseSplitter):
     """
     Take a string buffer and create an iterator by paragraphs
     """
@@ -49,31 +50,84 @@ class ParagraphSplitter:
         self.wmin = int(chunk_options.get("min_words", 0))
         self.wmax = int(chunk_options.get("max_words", 0))
         if self.wmin or self.wmax:
-            self.ws = re.compile(r"(\W+)")
+            self.ws = re.compile(r"\W+")
+            self.cap = max(self.wmin + 1, self.wmax)
+            self.wcap = word_chunk_regex(self.cap)
+        if self.wmax:
+            self.wgroup = word_chunk_regex(self.wmax, partial=True)
+
+
+    def paragraphs(self) -> Iterator[str]:
+        """
+        Iterator over raw paragraphs (each one including its separator). The
+        last one is the text after the last separator (possibly empty).
+        """
+        pos = 0
+        for m in self.reg.finditer(self.doc):
+            yield self.doc[pos:m.end()]
+            pos = m.end()
+        yield self.doc[pos:]
+
+
+    def count_words(self, para: str) -> int:
+        """
+        Count the words in a paragraph, as the number of word separators.
+        Counts are capped at a value large enough to decide on the word
+        limits, so that long paragraphs are checked with a single match.
+        """
+        if self.wcap.match(para):
+            return self.cap
+        return sum(1 for _ in self.ws.finditer(para))
+
+
+    def split_words(self, para: str) -> Iterator[Tuple[int, int]]:
+        """
+        Split a paragraph into chunks of "max_words" words, each one ending
+        at a word separator (text after the last separator is not included)
+          :return: an iterator of (start, end) offsets in the paragraph
+        """
+        pos = 0
+        while True:
+            m = self.wgroup.match(para, pos)
+            if not m:
+                return
+            yield pos, m.end()
+            pos = m.end()
 
 
     def __iter__(self) -> Iterator[str]:
         """
         Iterator over paragraphs, possibly with word limits
         """
+        for _, _, chunk in self.iter_spans():
+            yield chunk
+
+
+    def iter_spans(self) -> Iterator[TYPE_SPAN]:
+        """
+        Iterator over paragraphs, possibly with word limits, together with
+        their offsets in the document
+        """
         # If there are no word limits, just iterate over paragraphs
         if not self.wmin and not self.wmax:
-            for para in chunker(self.reg.split(self.doc), 2):
-                if para:
-                    yield para
+            for span in text_spans(self.paragraphs()):
+                if span[2]:
+                    yield span
             return
 
         # Iteration with word limits
         prev = ""
+        prev_start = 0
         prev_nw = 0
-        for para in chunker(self.reg.split(self.doc), 2):
+        for start, end, para in text_spans(self.paragraphs()):
 
-            # Split paragraph into words (chunks of word+ws), and count them
-            words = list(chunker(self.ws.split(para), 2, 2))
-            para_nw = len(words)
+            # Count the words in the paragraph
+            para_nw = self.count_words(para)
 
             # If there is minimum and we don't reach it, continue iterating
             if self.wmin and prev_nw + para_nw <= self.wmin:
+                if not prev:
+                    prev_start = start
                 prev += para
                 prev_nw += para_nw
                 continue
@@ -81,20 +135,21 @@ class ParagraphSplitter:
             if not self.wmax or prev_nw + para_nw < self.wmax:
 
                 # If there is no maximum, or we are below it, produce a chunk
-                yield prev + para
+                yield (prev_start if prev else start), end, prev + para
 
             else:
 
                 # Here we are above the maximum
                 if prev:
-                    yield prev  # release previous chunk buffer
+                    # release previous chunk buffer
+                    yield prev_start, prev_start + len(prev), prev
 
                 if para_nw < self.wmax:
-                    yield para  # the currrent chunk is below max
+                    yield start, end, para  # the currrent chunk is below max
                 else:
                     # the chunk is above max, split it
-                    for i in range(0, len(words), self.wmax):
-                        yield "".join(words[i:i+self.wmax])
+                    for s, e in self.split_words(para):
+                        yield start + s, start + e, para[s:e]
 
             # Reset
             prev = ""
@@ -102,7 +157,62 @@ class ParagraphSplitter:
 
         # Last chunk, if present
         if prev:
-            yield prev
+            yield prev_start, prev_start + len(prev), prev
+
+
+class StreamParagraphSplitter(ParagraphSplitter):
+    """
+    Split a document given as a sequence of text blocks into paragraphs. It
+    produces the same chunks as ParagraphSplitter, but holds in memory only
+    the current block and the unfinished paragraph.
+    """
+
+    def __init__(self, blocks: Iterable[str], chunk_options: Dict):
+        """
+          :param blocks: a (re-iterable) source of text blocks
+          :param chunk_options: chunking options, as in ParagraphSplitter
+        """
+        super().__init__(None, chunk_options)
+        self.blocks = blocks
+        self.nonws = re.compile(r"\S")
+
+
+    def paragraphs(self) -> Iterator[str]:
+        """
+        Iterator over raw paragraphs. A separator found in a block is final
+        only if it is followed by non-whitespace text, since otherwise it could
+        continue in the next block. Text that may still be part of a separator
+        (the final run of whitespace & punctuation) is kept in "tail" and
+        scanned again together with the next block; the rest of the
+        unfinished paragraph is kept in "pending".
+        """
+        pending = []
+        tail = ""
+        for block in self.blocks:
+            buf = tail + block
+            pos = 0
+            for m in self.reg.finditer(buf):
+                if not self.nonws.search(buf, m.end()):
+                    break
+                yield "".join(pending) + buf[pos:m.end()]
+                pending = []
+                pos = m.end()
+
+            # Find the final run of characters that can start a separator
+            end = len(buf)
+            while end > pos and (buf[end-1].isspace() or
+                                 buf[end-1] in EOS_CHARS):
+                end -= 1
+            pending.append(buf[pos:end])
+            tail = buf[end:]
+
+        # Process the remaining text, and produce the last paragraph
+        pos = 0
+        for m in self.reg.finditer(tail):
+            yield "".join(pending) + tail[pos:m.end()]
+            pending = []
+            pos = m.end()
+        yield "".join(pending) + tail[pos:]
 
 
 class ParagraphReader(BaseReader):
@@ -116,9 +226,21 @@ class ParagraphReader(BaseReader):
         Read a local text file
         """
         # Read document and create a paragraph splitter from it
-        doc = super().read(inputfile, encoding)
-        chunks = ParagraphSplitter(doc, self.opt)
+        if self.use_parallel(inputfile, "paragraph", encoding):
+            chunks = self.parallel(inputfile, "paragraph", encoding)
+        elif self.use_mmap(inputfile, encoding):
+            chunks = self.mapped(inputfile, encoding,
+                                 lambda b: StreamParagraphSplitter(b, self.opt))
+        elif self.use_streaming(inputfile):
+            blocks = self.blocks(inputfile, encoding)
+            chunks = self.split(blocks,
+                                lambda b: StreamParagraphSplitter(b, self.opt),
+                                encoding)
+        else:
+            doc = super().read(inputfile, encoding)
+            chunks = self.split([doc],
+                                lambda b: ParagraphSplitter("".join(b), self.opt),
+                                encoding)
 
         # Return the SrcDocument object
-        return SequenceLocalSrcDocument(chunks=chunks, metadata=self.meta,
-                                        **self.kwargs)
+        return self.document(self.windows(chunks))
@@ -5,6 +5,7 @@ Read a text document as a single chunk
 from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
 
 from .base import BaseReader
+from .offsets import plain_encoding
 
 
 class SingleReader(BaseReader):
@@ -18,5 +19,8 @@ class SingleReader(BaseReader):
         Read a local text file
         """
         doc = super().read(inputfile, encoding)
-        return SequenceLocalSrcDocument(chunks=[doc], metadata=self.meta,
-                                        **self.kwargs)
+        if self.index is not None:
+            size = len(doc.encode(plain_encoding(encoding)))
+            self.index.add(None, 0, len(doc), 0, size)
+            self.index.finish()
+        return self.document([doc])
@@ -0,0 +1,223 @@
+"""
+Read a text document and split it into chunks that fit a token budget, by
+packing whole paragraphs (and splitting at word boundaries the paragraphs
+that do not fit by themselves)
+"""
+
+from math import ceil
+
+from typing import Callable, Dict, Iterator, List, Union
+
+from pii_data.helper.exception import InvArgException
+from pii_data.helper.misc import import_object
+from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
+
+from ..defs import DEFAULT_MAX_TOKENS, DEFAULT_CHARS_PER_TOKEN
+from .base import BaseReader, BaseSplitter
+from .read_para import ParagraphSplitter, StreamParagraphSplitter
+
+
+TYPE_TOKENIZER = Callable[[str], Union[int, List]]
+
+
+def char_estimator(chars_per_token: float) -> Callable[[str], int]:
+    """
+    Create a token counter that estimates the number of tokens from the
+    number of characters
+    """
+    def estimate(text: str) -> int:
+        return ceil(len(text) / chars_per_token)
+    return estimate
+
+
+def token_counter(chunk_options: Dict) -> Callable[[str], int]:
+    """
+    Create the token counter defined by the chunk options:
+      - tokenizer: a callable (or the fully qualified name of a callable)
+        that receives a string and returns either its number of tokens, or
+        the list of its tokens
+      - chars_per_token: if there is no tokenizer, the ratio used to
+        estimate the number of tokens from the number of characters
+    """
+    tokenizer = chunk_options.get("tokenizer")
+    if not tokenizer:
+        ratio = float(chunk_options.get("chars_per_token",
+                                        DEFAULT_CHARS_PER_TOKEN))
+        if ratio <= 0:
+            raise InvArgException("invalid chars_per_token: {}", ratio)
+        return char_estimator(ratio)
+
+    if isinstance(tokenizer, str):
+        tokenizer = import_object(tokenizer)
+    if not callable(tokenizer):
+        raise InvArgException("tokenizer is not callable: {}", tokenizer)
+
+    def count(text: str) -> int:
+        n = tokenizer(text)
+        return n if isinstance(n, int) else len(n)
+    return count
+
+
+class TokenSplitter(BaseSplitter):
+    """
+    Split a document into chunks of at most "max_tokens" tokens, each one
+    holding as many whole paragraphs as fit. A paragraph that does not fit in
+    the current chunk starts a new one, unless the current chunk is less than
+    half full (or the paragraph does not fit in a chunk by itself): then the
+    paragraph is split at word boundaries, its first piece completing the
+    current chunk and its last piece starting the next one. Chunks are
+    contiguous: together they hold all the document text.
+
+    Token counts for a chunk are computed as the sum of the counts for its
+    paragraphs (or paragraph pieces).
+    """
+
+    def __init__(self, paragraphs: ParagraphSplitter, chunk_options: Dict):
+        """
+          :param paragraphs: the splitter providing the document paragraphs
+          :param chunk_options: chunking options
+             - max_tokens: maximum number of tokens in a chunk
+             - tokenizer, chars_per_token: how to count tokens (see
+               `token_counter()`)
+        """
+        self.para = paragraphs
+        self.max = int(chunk_options.get("max_tokens", DEFAULT_MAX_TOKENS))
+        if self.max <= 0:
+            raise InvArgException("invalid max_tokens: {}", self.max)
+        self.count = token_counter(chunk_options)
+
+
+    def fit(self, para: str, pos: int, size: int, budget: int,
+            force: bool = True) -> int:
+        """
+        Find the end of a piece of a paragraph, starting at a given position
+        and ending at a word boundary, that fits into a token budget
+          :param para: the paragraph
+          :param pos: the start position of the piece
+          :param size: the estimated piece size, in characters
+          :param budget: the token budget
+          :param force: if no word fits, cut the first word (else return an
+            empty piece)
+          :return: the end position of the piece
+        """
+        while True:
+            end = min(pos + size, len(para))
+            if end < len(para):
+                # Move back to the end of the last word separator
+                cut = end
+                while cut > pos and (para[cut-1].isalnum() or para[cut-1] == "_"):
+                    cut -= 1
+                if cut > pos:
+                    end = cut
+                elif not force:
+                    return pos
+            num = self.count(para[pos:end])
+            if num <= budget:
+                return end
+            if end - pos <= 1:
+                return end if force else pos
+            size = max(1, (end - pos) * budget // num)
+
+
+    def split(self, para: str, num: int, first: int,
+              force: bool = False) -> Iterator[str]:
+        """
+        Split a paragraph into pieces that fit the token budget
+          :param para: the paragraph
+          :param num: its number of tokens
+          :param first: the token budget for the first piece (which may be
+            empty, if not even one word fits in it)
+          :param force: cut the first word if it does not fit in the first
+            piece, so that the piece is never empty
+        """
+        size = max(1, len(para) * self.max // num)
+        end = self.fit(para, 0, max(1, size * first // self.max), first, force)
+        yield para[:end]
+        pos = end
+        while pos < len(para):
+            end = self.fit(para, pos, size, self.max)
+            yield para[pos:end]
+            pos = end
+
+
+    def __iter__(self) -> Iterator[str]:
+        buf = []
+        buf_nt = 0
+        for para in self.para.paragraphs():
+            if not para:
+                continue
+            para_nt = self.count(para)
+
+            # The paragraph fits in the current chunk
+            if buf_nt + para_nt <= self.max:
+                buf.append(para)
+                buf_nt += para_nt
+                continue
+
+            # Release the current chunk if it is at least half full, and
+            # start a new one with the paragraph, if it fits
+            if 2*buf_nt >= self.max:
+                yield "".join(buf)
+                buf, buf_nt = [], 0
+                if para_nt <= self.max:
+                    buf, buf_nt = [para], para_nt
+                    continue
+
+            # Split the paragraph: the first piece completes the current
+            # chunk (it may be empty, unless the chunk is), and the last one
+            # starts the next chunk
+            pieces = self.split(para, para_nt, self.max - buf_nt, not buf)
+            first = next(pieces)
+            if first:
+                buf.append(first)
+            last = None
+            for last in pieces:
+                yield "".join(buf)
+                buf = [last]
+            buf_nt = self.count(last) if last is not None else \
+                buf_nt + self.count(first)
+
+        if buf:
+            yield "".join(buf)
+
+
+class TokensReader(BaseReader):
+    """
+    Read a text file creating chunks that fit a token budget
+    """
+
+    def read(self, inputfile: str,
+             encoding: str = 'utf-8') -> SequenceLocalSrcDocument:
+        """
+        Read a local text file
+        """
+        opt = self.opt or {}
+        popt = {"eos": opt.get("eos", False)}
+
+        # With overlapping context, the chunk text plus its context at both
+        # sides must fit in the token budget
+        overlap = int(opt.get("overlap", 0))
+        if overlap > 0:
+            budget = int(opt.get("max_tokens", DEFAULT_MAX_TOKENS)) - 2*overlap
+            if budget <= 0:
+                raise InvArgException("overlap too large for max_tokens: {}",
+                                      overlap)
+            opt = {**opt, "max_tokens": budget}
+
+        if self.use_mmap(inputfile, encoding):
+            chunks = self.mapped(
+                inputfile, encoding,
+                lambda b: TokenSplitter(StreamParagraphSplitter(b, popt), opt))
+        elif self.use_streaming(inputfile):
+            blocks = self.blocks(inputfile, encoding)
+            chunks = self.split(
+                blocks,
+                lambda b: TokenSplitter(StreamParagraphSplitter(b, popt), opt),
+                encoding)
+        else:
+            doc = super().read(inputfile, encoding)
+            chunks = self.split(
+                [doc],
+                lambda b: TokenSplitter(ParagraphSplitter("".join(b), popt), opt),
+                encoding)
+        return self.document(self.windows(chunks, token_counter(opt)))
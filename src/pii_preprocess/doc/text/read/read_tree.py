@@ -2,14 +2,18 @@
 Read a text document and create a tree by using indent
 """
 
-from typing import TextIO, Iterable
+from time import perf_counter
+
+from typing import Dict, Iterable, Iterator, TextIO
 
 from pii_data.helper.exception import InvalidDocument
 from pii_data.types.doc.localdoc import \
     BaseLocalSrcDocument, TreeLocalSrcDocument, SequenceLocalSrcDocument
 
+from ...srcindex import SourceIndex
 from ..defs import DEFAULT_INDENT
 from .base import BaseReader
+from .offsets import plain_encoding
 
 
 def add_blank(src: Iterable[str]) -> Iterable[str]:
@@ -29,54 +33,134 @@ def add_blank(src: Iterable[str]) -> Iterable[str]:
         yield prev
 
 
-class TreeReader(BaseReader):
+def nested(levels: Iterable[int]) -> bool:
     """
-    Convert a plain text file to a data structure for a YAML PII Source
-    Document, reading the file line by line.
-    If instructed to do so, it can infer hierarchy from leading indent, and
-    thus create a tree source document.
+    Check if a sequence of line levels produces a nested tree, i.e. if
+    there is a line with a deeper level than a line still open before it
     """
+    stack = []
+    for lev in levels:
+        while stack and stack[-1] >= lev:
+            stack.pop()
+        if stack:
+            return True
+        stack.append(lev)
+    return False
 
-    def __init__(self, indent: int, **kwargs):
-        super().__init__(**kwargs)
-        self.ind = int(indent) if indent is not None else DEFAULT_INDENT
+
+class TreeChunks:
+    """
+    A re-iterable sequence of top-level tree chunks (each one holding its
+    subtree) from a sequence of text lines. Each subtree is produced as soon
+    as a line returns to the top level, so only the current top-level
+    subtree is held in memory.
+    """
+
+    def __init__(self, lines: Iterable[str], indent: int,
+                 encoding: str = "utf-8", index: SourceIndex = None):
+        """
+          :param lines: a (re-iterable) source of text lines
+          :param indent: the number of indent characters per level
+          :param encoding: the file encoding (used to compute byte offsets
+            for the source index)
+          :param index: a source index to fill with the chunk coordinates
+        """
+        self.lines = lines
+        self.ind = indent
+        self.encoding = plain_encoding(encoding)
+        self.index = index
+
+
+    def __repr__(self) -> str:
+        return f"<TreeChunks {self.lines}>"
 
 
-    def read_tree(self, src: TextIO) -> BaseLocalSrcDocument:
+    def level(self, line: str) -> int:
         """
-        Read chunks from the file and build a data stack tree
+        Compute the hierarchy level of a line from its indent
+        """
+        return (len(line) - len(line.lstrip()))//self.ind if self.ind else 0
+
+
+    def levels(self) -> Iterator[int]:
+        """
+        Iterate over the levels of all the lines
         """
-        chunkid = 0
-        currlev = 0
-        maxlev = 0
-        base = {"chunks": []}
-        stack = [base]
-        for line in add_blank(src):
+        return (self.level(line) for line in add_blank(self.lines))
+
+
+    def __iter__(self) -> Iterator[Dict]:
+        # Each chunk is added below the closest previous chunk with a lower
+        # level. The stack holds the open chunks, as (level, chunk) tuples.
+        index = self.index
+        if index is not None and index.complete:
+            index = None
+        if index is not None:
+            index.reset()
+            encoding = self.encoding
+            pos = bpos = 0
+        stack = []
+        for chunkid, line in enumerate(add_blank(self.lines), start=1):
 
             # Read the line, compute hierarchy level from indent
             raw = line.lstrip()
-            lev = (len(line) - len(raw))//self.ind if self.ind else 0
+            lev = self.level(line)
 
             # Create the chunk
-            chunkid += 1
             chunk = dict(id=str(chunkid), data=raw)
 
-            # Find the place where to add the chunk
-            if lev < currlev:
-                stack = stack[:-1]
-            elif lev > currlev:
-                top = stack[-1]["chunks"][-1]
-                top["chunks"] = []
-                stack.append(top)
+            # Record its source coordinates
+            if index is not None:
+                skip = len(line) - len(raw)
+                bskip = len(line[:skip].encode(encoding))
+                blen = len(raw.encode(encoding))
+                index.add(str(chunkid), pos + skip, len(raw), bpos + bskip, blen)
+                pos += len(line)
+                bpos += bskip + blen
+
+            # Close the chunks at the same or deeper levels. If all are
+            # closed, the previous top-level subtree is complete
+            while stack and stack[-1][0] >= lev:
+                top = stack.pop()
+            if not stack and chunkid > 1:
+                yield top[1]
+
+            # Add the chunk below its parent
+            if stack:
+                stack[-1][1].setdefault("chunks", []).append(chunk)
+            stack.append((lev, chunk))
+
+        if stack:
+            yield stack[0][1]
+        if index is not None:
+            index.finish()
 
-            # Add it
-            stack[-1]["chunks"].append(chunk)
-            currlev = lev
-            maxlev = max(maxlev, currlev)
 
-        # Create the document and return it
-        cls = TreeLocalSrcDocument if maxlev else SequenceLocalSrcDocument
-        return cls(chunks=base["chunks"], metadata=self.meta, **self.kwargs)
+class TreeReader(BaseReader):
+    """
+    Convert a plain text file to a data structure for a YAML PII Source
+    Document, reading the file line by line.
+    If instructed to do so, it can infer hierarchy from leading indent, and
+    thus create a tree source document.
+
+    In streaming mode the file is read again on each iteration, and the
+    memory needed is bounded by the size of the largest top-level subtree.
+    """
+
+    def __init__(self, indent: int, **kwargs):
+        super().__init__(**kwargs)
+        self.ind = int(indent) if indent is not None else DEFAULT_INDENT
+
+
+    def read_tree(self, src: TextIO,
+                  encoding: str = 'utf-8') -> BaseLocalSrcDocument:
+        """
+        Read chunks from the file and build a data stack tree
+        """
+        chunks = list(TreeChunks(src, self.ind, encoding, self.index))
+        cls = TreeLocalSrcDocument if any("chunks" in c for c in chunks) \
+            else SequenceLocalSrcDocument
+        return self.document(chunks, cls)
 
 
     def read(self, inputfile: str,
@@ -84,8 +168,22 @@ class TreeReader(BaseReader):
         """
         Open a raw text file and read it as a PII Source Document
         """
+        if self.use_streaming(inputfile):
+            # Find out first if the document is a tree
+            chunks = TreeChunks(self.lines(inputfile, encoding), self.ind,
+                                encoding, self.index)
+            try:
+                tree = nested(chunks.levels())
+            except Exception as e:
+                raise InvalidDocument(f"invalid text document '{inputfile}': {e}") from e
+            cls = TreeLocalSrcDocument if tree else SequenceLocalSrcDocument
+            return self.document(chunks, cls)
+
+        start = perf_counter()
         with self.base_read(inputfile, encoding=encoding) as f:
             try:
-                return self.read_tree(f)
+                doc = self.read_tree(f, encoding)
             except Exception as e:
                 raise InvalidDocument(f"invalid text document '{inputfile}': {e}") from e
+        self.opened(start)
+        return doc
@@ -4,16 +4,28 @@ Read a text document and split it by word chunks.
 
 import re
 
-from typing import Dict, Iterator
+from typing import Dict, Iterable, Iterator, Pattern
 
 from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
 
-from ...utils import chunker
 from ..defs import DEFAULT_MAX_WORDS
-from .base import BaseReader
+from .base import BaseReader, BaseSplitter
 
 
-class WordSplitter:
+def word_chunk_regex(size: int, partial: bool = False) -> Pattern:
+    """
+    Build a regex that matches a group of words, each one followed by its
+    separator (non-word characters). The negative lookahead ensures each
+    separator is matched in full, so that a group always ends at a word
+    boundary.
+      :param size: number of words in the group
+      :param partial: allow also groups with fewer words (at least one)
+    """
+    rep = f"{{1,{size}}}" if partial else f"{{{size}}}"
+    return re.compile(r"(?:\w*\W+(?!\W))" + rep)
+
+
+class WordSplitter(BaseSplitter):
     """
     Split a document into chunks having at most "max_words" each, splitting
     words by whitespace
@@ -24,13 +36,69 @@ class WordSplitter:
          :param chunk_options: max_words = maximum number of words in a chunk
         """
         self.doc = doc
-        self.regex = re.compile(r"(\W+)")
-        # multiply by 2 max_size, since we have a word + whitespace pair at
-        # each split
-        self.size = chunk_options.get("max_words", DEFAULT_MAX_WORDS)*2
+        self.size = chunk_options.get("max_words", DEFAULT_MAX_WORDS)
+        if self.size:
+            self.regex = word_chunk_regex(self.size)
 
     def __iter__(self) -> Iterator[str]:
-        return chunker(self.regex.split(self.doc), self.size)
+        # Each regex match is a full chunk, so the document is sliced just
+        # once per chunk, without creating intermediate strings per word
+        if not self.size:
+            return
+        doc = self.doc
+        pos = 0
+        while True:
+            m = self.regex.match(doc, pos)
+            if not m:
+                break
+            yield doc[pos:m.end()]
+            pos = m.end()
+        yield doc[pos:]
+
+
+class StreamWordSplitter(BaseSplitter):
+    """
+    Split a document given as a sequence of text blocks into chunks having at
+    most "max_words" each. It produces the same chunks as WordSplitter, but
+    holds in memory only the current block and the pending chunk.
+    """
+
+    def __init__(self, blocks: Iterable[str], chunk_options: Dict):
+        """
+         :param blocks: a (re-iterable) source of text blocks
+         :param chunk_options: max_words = maximum number of words in a chunk
+        """
+        self.blocks = blocks
+        self.size = chunk_options.get("max_words", DEFAULT_MAX_WORDS)
+        if self.size:
+            self.regex = word_chunk_regex(self.size)
+
+    def __iter__(self) -> Iterator[str]:
+        # A chunk that reaches the end of the buffer is not final, since its
+        # last separator might continue in the next block
+        if not self.size:
+            return
+        buf = ""
+        for block in self.blocks:
+            buf += block
+            pos = 0
+            while True:
+                m = self.regex.match(buf, pos)
+                if not m or m.end() == len(buf):
+                    break
+                yield buf[pos:m.end()]
+                pos = m.end()
+            buf = buf[pos:]
+
+        # Finish the last block
+        pos = 0
+        while True:
+            m = self.regex.match(buf, pos)
+            if not m:
+                break
+            yield buf[pos:m.end()]
+            pos = m.end()
+        yield buf[pos:]
 
 
 class WordsReader(BaseReader):
@@ -44,7 +112,19 @@ class WordsReader(BaseReader):
         """
         Read a local text file
         """
-        doc = super().read(inputfile, encoding)
-        chunks = WordSplitter(doc, self.opt)
-        return SequenceLocalSrcDocument(chunks=chunks, metadata=self.meta,
-                                        **self.kwargs)
+        if self.use_parallel(inputfile, "word", encoding):
+            chunks = self.parallel(inputfile, "word", encoding)
+        elif self.use_mmap(inputfile, encoding):
+            chunks = self.mapped(inputfile, encoding,
+                                 lambda b: StreamWordSplitter(b, self.opt))
+        elif self.use_streaming(inputfile):
+            blocks = self.blocks(inputfile, encoding)
+            chunks = self.split(blocks,
+                                lambda b: StreamWordSplitter(b, self.opt),
+                                encoding)
+        else:
+            doc = super().read(inputfile, encoding)
+            chunks = self.split([doc],
+                                lambda b: WordSplitter("".join(b), self.opt),
+                                encoding)
+        return self.document(self.windows(chunks))
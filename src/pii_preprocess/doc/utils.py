@@ -1,8 +1,11 @@
 
+import os
+import sys
+import importlib
 from datetime import datetime
 from itertools import islice
 
-from typing import Iterable, Dict
+from typing import Callable, Iterable, Dict, List, Tuple
 
 
 def chunker(it: Iterable[str], size: int, smin: int = 0) -> Iterable[str]:
@@ -41,3 +44,44 @@ def as_bool(value) -> bool:
     Convert strings or numbers into a boolean
     """
     return str(value).lower() in ('1', 't', 'true', 'yes')
+
+
+def available_memory() -> int:
+    """
+    Return the available system memory (in bytes), or `None` if it cannot
+    be determined
+    """
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def make_lazy(module_name: str,
+              mapping: Dict[str, str]) -> Tuple[Callable, Callable]:
+    """
+    Create the module-level `__getattr__` and `__dir__` functions for a
+    package whose objects are imported lazily, on first access
+      :param module_name: the name of the package
+      :param mapping: the lazily imported objects, and the module (relative
+        to the package) each one comes from
+      :return: a tuple with the `__getattr__` and `__dir__` functions
+    """
+    def getattr_(name: str):
+        if name not in mapping:
+            raise AttributeError(
+                f"module {module_name!r} has no attribute {name!r}")
+        return getattr(importlib.import_module(mapping[name], module_name),
+                       name)
+
+    def dir_() -> List[str]:
+        return sorted(list(vars(sys.modules[module_name])) + list(mapping))
+
+    return getattr_, dir_
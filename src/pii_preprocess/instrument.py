@@ -0,0 +1,280 @@
+"""
+Per-document instrumentation: the loader and the reader classes emit events
+as they open, parse and chunk documents, which are delivered to all registered
+hooks. A hook is a callable receiving the event name and a dict with the event
+data; all events contain the document `name`.
+
+Events:
+  * "doc.open": a reader has opened (and, if eager, read) a file
+      - reader: the reader class name
+      - elapsed: time (seconds) to open & read the file
+      - bytes: file size on disk
+  * "doc.chunks": a document has been iterated
+      - elapsed: time (seconds) spent producing chunks
+      - chunks: number of (top-level) chunks produced
+      - size: chunk size distribution (in characters): "min", "max",
+        "total", and "hist", a histogram in power-of-two buckets (bucket
+        `k` counts the chunks with size in `[k/2, k)`)
+      - complete: `False` if the iteration was abandoned before the end
+  * "doc.load": the loader has finished trying to load a document
+      - mime: the type of the candidate that succeeded (`None` if all failed)
+      - loader: the class name of the candidate that succeeded
+      - elapsed: time (seconds) to instantiate the successful candidate
+      - failed: list of the types of the candidates that failed
+      - cached: `True` if the document was fetched from the conversion cache
+
+Hooks must be registered before loading documents, since chunk tracking is
+set up when the document is created. If no hook is registered,
+instrumentation adds no overhead to chunk iteration.
+"""
+
+import os
+import json
+import threading
+from time import perf_counter
+from contextlib import contextmanager
+
+from typing import Callable, Dict, Iterable, Iterator, List
+
+
+# Format indicator for collected statistics
+FMT_STATS = "pii-preprocess:stats:v1"
+
+TYPE_HOOK = Callable[[str, Dict], None]
+
+# The registered hooks
+_HOOKS = []
+
+
+def add_hook(hook: TYPE_HOOK):
+    """
+    Register an instrumentation hook
+    """
+    if hook not in _HOOKS:
+        _HOOKS.append(hook)
+
+
+def remove_hook(hook: TYPE_HOOK):
+    """
+    Unregister an instrumentation hook
+    """
+    if hook in _HOOKS:
+        _HOOKS.remove(hook)
+
+
+def active() -> bool:
+    """
+    Return `True` if there is at least one registered hook
+    """
+    return bool(_HOOKS)
+
+
+def emit(event: str, name: str, **data):
+    """
+    Send an event to all registered hooks
+      :param event: event name
+      :param name: the document filename
+      :param data: event data
+    """
+    if not _HOOKS:
+        return
+    data["name"] = os.fspath(name) if name is not None else None
+    for hook in list(_HOOKS):
+        hook(event, data)
+
+
+@contextmanager
+def recording() -> Iterator[List]:
+    """
+    A context manager that temporarily replaces all registered hooks with one
+    that records events in a list, so that they can be sent elsewhere (e.g.
+    from a worker process to the main process) and re-emitted there.
+    """
+    events = []
+    saved = _HOOKS[:]
+    _HOOKS[:] = [lambda event, data: events.append((event, data))]
+    try:
+        yield events
+    finally:
+        _HOOKS[:] = saved
+
+
+def replay(events: Iterable):
+    """
+    Re-emit events recorded with `recording()`
+    """
+    for event, data in events or ():
+        data = dict(data)
+        emit(event, data.pop("name", None), **data)
+
+
+# -----------------------------------------------------------------------
+
+
+def chunk_size(chunk: Dict) -> int:
+    """
+    Compute the size (in characters) of a chunk, including its subchunks
+    """
+    data = chunk.get("data") if isinstance(chunk, dict) else chunk
+    if isinstance(data, str):
+        size = len(data)
+    elif isinstance(data, (list, tuple)):
+        size = sum(len(str(v)) for v in data)
+    else:
+        size = 0
+    if isinstance(chunk, dict):
+        size += sum(chunk_size(c) for c in chunk.get("chunks", ()))
+    return size
+
+
+def _track(name: str, chunks: Iterable) -> Iterator:
+    """
+    Iterate over chunks, timing their production and computing their sizes,
+    and emit a "doc.chunks" event when done
+    """
+    elapsed = 0
+    num = total = 0
+    smin = smax = None
+    hist = {}
+    complete = False
+    it = iter(chunks)
+    try:
+        while True:
+            t0 = perf_counter()
+            try:
+                chunk = next(it)
+            except StopIteration:
+                complete = True
+                return
+            finally:
+                elapsed += perf_counter() - t0
+            size = chunk_size(chunk)
+            num += 1
+            total += size
+            smin = size if smin is None else min(smin, size)
+            smax = size if smax is None else max(smax, size)
+            bucket = 1 << size.bit_length() if size else 0
+            hist[bucket] = hist.get(bucket, 0) + 1
+            yield chunk
+    finally:
+        emit("doc.chunks", name, elapsed=elapsed, chunks=num,
+             size={"min": smin, "max": smax, "total": total,
+                   "hist": dict(sorted(hist.items()))},
+             complete=complete)
+
+
+class TrackedChunks:
+    """
+    A re-iterable wrapper over a chunk iterable, tracking each iteration
+    """
+
+    def __init__(self, name: str, chunks: Iterable):
+        self.name = name
+        self.chunks = chunks
+
+    def __iter__(self) -> Iterator:
+        return _track(self.name, self.chunks)
+
+    def __getattr__(self, name: str):
+        # Delegate everything else (e.g. list.append) to the wrapped object
+        return getattr(self.chunks, name)
+
+
+def track_chunks(name: str, chunks: Iterable, reiterable: bool = False):
+    """
+    Wrap a chunk iterable so that its iteration is tracked. If there are no
+    registered hooks, return the iterable unchanged.
+      :param name: the document filename
+      :param chunks: the chunk iterable
+      :param reiterable: return a wrapper that can be iterated many times
+        (else return a one-shot iterator)
+    """
+    if not _HOOKS:
+        return chunks
+    return TrackedChunks(name, chunks) if reiterable else _track(name, chunks)
+
+
+# -----------------------------------------------------------------------
+
+
+class StatsCollector:
+    """
+    A hook that aggregates the instrumentation events, producing a record
+    per document and a summary per document type
+    """
+
+    def __init__(self):
+        self.docs = {}
+        self._lock = threading.Lock()
+
+
+    def __repr__(self) -> str:
+        return f"<StatsCollector {len(self.docs)}>"
+
+
+    def __call__(self, event: str, data: Dict):
+        with self._lock:
+            doc = self.docs.setdefault(data["name"], {"name": data["name"]})
+            if event == "doc.load":
+                doc.update(mime=data.get("mime"), loader=data.get("loader"),
+                           load_time=data.get("elapsed"),
+                           failed=data.get("failed", []),
+                           cached=data.get("cached", False))
+            elif event == "doc.open":
+                doc.update(reader=data.get("reader"),
+                           open_time=data.get("elapsed"),
+                           bytes=data.get("bytes"))
+            elif event == "doc.chunks":
+                doc.update(parse_time=data.get("elapsed"),
+                           chunks=data.get("chunks"),
+                           chunk_size=data.get("size"),
+                           complete=data.get("complete"))
+
+
+    def __enter__(self) -> "StatsCollector":
+        add_hook(self)
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        remove_hook(self)
+
+
+    def summary(self) -> Dict:
+        """
+        Aggregate the document records by document type
+        """
+        out = {}
+        for doc in self.docs.values():
+            mime = doc.get("mime") or \
+                ("cached" if doc.get("cached") else "error")
+            agg = out.setdefault(mime, {"documents": 0, "bytes": 0,
+                                        "chunks": 0, "load_time": 0,
+                                        "parse_time": 0})
+            agg["documents"] += 1
+            for f in ("bytes", "chunks", "load_time", "parse_time"):
+                agg[f] += doc.get(f) or 0
+        return out
+
+
+    def slowest(self, num: int = 10) -> List[Dict]:
+        """
+        Return the records for the slowest documents (by load + parse time)
+        """
+        def total(d):
+            return (d.get("load_time") or 0) + (d.get("parse_time") or 0)
+        return sorted(self.docs.values(), key=total, reverse=True)[:num]
+
+
+    def as_dict(self) -> Dict:
+        return {"format": FMT_STATS,
+                "summary": self.summary(),
+                "documents": list(self.docs.values())}
+
+
+    def dump(self, outname: str):
+        """
+        Write the collected statistics to a JSON file
+        """
+        with open(outname, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2, ensure_ascii=False)
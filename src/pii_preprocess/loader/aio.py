@@ -0,0 +1,126 @@
+"""
+An asyncio interface for document loading. Loading (including the parsing of
+the documents) is carried out in an executor, so that it does not block the
+event loop.
+"""
+
+import asyncio
+from concurrent.futures import Executor
+
+from typing import Callable, Dict, Iterable, AsyncIterable, AsyncIterator, \
+    Union
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc import SrcDocument
+
+from .batch import LoadResult, load_one
+
+
+TYPE_NAMES = Union[Iterable[str], AsyncIterable[str]]
+
+
+async def _aiter(names: TYPE_NAMES) -> AsyncIterator[str]:
+    """
+    Iterate over either a sync or an async iterable
+    """
+    if hasattr(names, "__aiter__"):
+        async for name in names:
+            yield name
+    else:
+        for name in names:
+            yield name
+
+
+async def aload_result(loader, index: int, docname: str, metadata: Dict = None,
+                       executor: Executor = None, timeout: float = None,
+                       on_finish: Callable[[], None] = None) -> LoadResult:
+    """
+    Load a document in an executor, capturing any error
+      :param loader: the DocumentLoader object to use
+      :param index: the document position in the batch
+      :param docname: the document filename
+      :param metadata: document metadata to add
+      :param executor: the executor to use (if `None`, the default loop
+        executor)
+      :param timeout: maximum time (in seconds) to wait for the document.
+        A timeout does not stop the load: it goes on running in the
+        executor, and its result is discarded
+      :param on_finish: a function to call when the load has actually
+        finished in the executor (after a timeout, this happens later than
+        the return from this function)
+    """
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(executor, load_one, loader, index, docname,
+                               metadata, True)
+    if on_finish:
+        fut.add_done_callback(lambda _: on_finish())
+    try:
+        # Shield the executor future, so that it is not marked as cancelled
+        # (and hence done) while the load is still running
+        return await asyncio.wait_for(asyncio.shield(fut), timeout)
+    except asyncio.TimeoutError:
+        err = ProcException("timeout loading document: {}", docname)
+        return LoadResult(index, docname, None, err)
+    except asyncio.CancelledError:
+        fut.cancel()        # only effective if the load has not started
+        raise
+
+
+async def aload(loader, docname: str, metadata: Dict = None,
+                executor: Executor = None,
+                timeout: float = None) -> SrcDocument:
+    """
+    Load a document in an executor
+    """
+    res = await aload_result(loader, 0, docname, metadata, executor, timeout)
+    if res.error:
+        raise res.error
+    return res.doc
+
+
+async def aiter_many(loader, docnames: TYPE_NAMES, concurrency: int = 4,
+                     metadata: Dict = None, executor: Executor = None,
+                     timeout: float = None) -> AsyncIterator[LoadResult]:
+    """
+    Load a number of documents concurrently, delivering them as they are
+    finished
+      :param loader: the DocumentLoader object to use
+      :param docnames: an iterable (sync or async) of document filenames
+      :param concurrency: maximum number of documents being loaded at once
+      :param metadata: metadata to add to all documents
+      :param executor: the executor to use (if `None`, the default loop
+        executor)
+      :param timeout: maximum time (in seconds) to wait for each document
+      :return: an async iterator of LoadResult tuples
+
+    A document that times out is delivered as an error, but its load is not
+    stopped: it keeps one of the `concurrency` slots until it finishes in the
+    executor. If the iteration is abandoned or cancelled, pending loads are
+    cancelled (loads already running in the executor cannot be interrupted).
+    """
+    pending = set()
+    slots = asyncio.Semaphore(concurrency)
+    try:
+        n = 0
+        async for name in _aiter(docnames):
+            if len(pending) >= concurrency:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+            # Wait for a free slot (held by loads still running after timing
+            # out)
+            await slots.acquire()
+            coro = aload_result(loader, n, name, metadata, executor, timeout,
+                                slots.release)
+            pending.add(asyncio.ensure_future(coro))
+            n += 1
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,129 @@
+"""
+Load many documents at once, spreading them across a pool of worker processes
+"""
+
+import os
+from collections import namedtuple, deque
+
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from .. import instrument
+from .utils import local_document
+
+
+# The result of loading one document in a batch
+#  - index: position of the document in the input sequence
+#  - name: document filename
+#  - doc: the loaded SrcDocument (None if there was an error)
+#  - error: the exception raised while loading (None if successful)
+LoadResult = namedtuple("LoadResult", "index name doc error")
+
+# Maximum number of pending documents per worker process
+PENDING_PER_WORKER = 4
+
+# The loader object used inside each worker process
+_WORKER_LOADER = None
+
+
+def _init_worker(loader):
+    """
+    Initialize a worker process, by storing the loader it will use
+    """
+    global _WORKER_LOADER
+    _WORKER_LOADER = loader
+
+
+def load_one(loader, index: int, name: str, metadata: Dict = None,
+             materialize: bool = False) -> LoadResult:
+    """
+    Load a single document, capturing any error
+      :param loader: the DocumentLoader object to use
+      :param index: the document position in the batch
+      :param name: the document filename
+      :param metadata: document metadata to add
+      :param materialize: convert the document to an in-memory local document
+    """
+    try:
+        doc = loader.load(name, metadata=metadata)
+        if materialize:
+            doc = local_document(doc)
+        return LoadResult(index, name, doc, None)
+    except Exception as e:
+        return LoadResult(index, name, None, e)
+
+
+def _worker_load(index: int, name: str, metadata: Dict,
+                 record: bool = False) -> Tuple[LoadResult, List]:
+    """
+    Load a document inside a worker process
+      :param record: record the instrumentation events produced while
+        loading, so that they can be re-emitted in the main process
+      :return: a tuple (result, recorded events)
+    """
+    if not record:
+        return load_one(_WORKER_LOADER, index, name, metadata, True), None
+    with instrument.recording() as events:
+        res = load_one(_WORKER_LOADER, index, name, metadata, True)
+    return res, events
+
+
+def _result(fut) -> LoadResult:
+    """
+    Get the result of a worker process, re-emitting its events
+    """
+    res, events = fut.result()
+    instrument.replay(events)
+    return res
+
+
+def iter_many(loader, docnames: Iterable[str], workers: int = None,
+              metadata: Dict = None, ordered: bool = True) -> Iterator[LoadResult]:
+    """
+    Load a number of documents, using a pool of worker processes
+      :param loader: the DocumentLoader object to use
+      :param docnames: an iterable of document filenames
+      :param workers: number of worker processes (default is the number of
+        CPUs). If 1 or less, documents are loaded in the current process
+      :param metadata: metadata to add to all documents
+      :param ordered: deliver results in input order; if `False` they are
+        delivered as they are finished
+      :return: an iterator of LoadResult tuples
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    # Sequential load
+    if workers <= 1:
+        for n, name in enumerate(docnames):
+            yield load_one(loader, n, name, metadata)
+        return
+
+    # Load with a process pool, keeping a bounded number of pending documents
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    maxpending = workers * PENDING_PER_WORKER
+    record = instrument.active()
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(loader,)) as pool:
+        pending = deque() if ordered else set()
+        for n, name in enumerate(docnames):
+            fut = pool.submit(_worker_load, n, name, metadata, record)
+            if ordered:
+                pending.append(fut)
+                if len(pending) >= maxpending:
+                    yield _result(pending.popleft())
+            else:
+                pending.add(fut)
+                if len(pending) >= maxpending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        yield _result(fut)
+
+        # Deliver all remaining documents
+        if ordered:
+            while pending:
+                yield _result(pending.popleft())
+        else:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield _result(fut)
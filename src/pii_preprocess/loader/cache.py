@@ -0,0 +1,181 @@
+"""
+A persistent on-disk cache for converted documents, keyed by a fingerprint
+of the source file and of the loader configuration used to convert it
+"""
+
+import os
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+from typing import Dict, Optional
+
+from pii_data.defs import FMT_SRCDOCUMENT
+from pii_data.types.doc.localdoc import BaseLocalSrcDocument, \
+    SequenceLocalSrcDocument, TreeLocalSrcDocument, TableLocalSrcDocument
+
+from ..doc.srcindex import SourceIndex, source_index
+from .utils import file_fingerprint, data_hash, plain_metadata
+
+
+# Default maximum cache size (in bytes)
+DEFAULT_MAX_SIZE = 1 << 30
+
+# Suffix for cache entries
+ENTRY_SUFFIX = ".json.gz"
+
+# Local document classes, by document type
+DOC_CLASS = {
+    "sequence": SequenceLocalSrcDocument,
+    "tree": TreeLocalSrcDocument,
+    "table": TableLocalSrcDocument
+}
+
+
+class ConversionCache:
+    """
+    Store converted documents in a local directory, in a compact serialized
+    form (compressed JSON), evicting the least recently used entries when the
+    cache grows beyond a maximum size
+    """
+
+    def __init__(self, cachedir: str, max_size: int = DEFAULT_MAX_SIZE,
+                 content_hash: bool = False):
+        """
+          :param cachedir: directory to store cache entries in
+          :param max_size: maximum size of the cache (in bytes)
+          :param content_hash: add a hash of the file contents to the
+            fingerprint (in addition to path, size and modification time)
+        """
+        self.dir = Path(cachedir)
+        self.max_size = int(max_size)
+        self.content_hash = content_hash
+        self._size = None
+
+
+    def __repr__(self) -> str:
+        return f"<ConversionCache {self.dir}>"
+
+
+    def key(self, docname: str, config_hash: str,
+            metadata: Dict = None) -> Optional[str]:
+        """
+        Compute the cache key for a document
+          :param docname: the document filename
+          :param config_hash: a hash of the effective loader configuration
+          :param metadata: additional metadata passed when loading
+          :return: the key, or `None` if the file cannot be fingerprinted
+        """
+        try:
+            fp = file_fingerprint(docname, self.content_hash)
+        except OSError:
+            return None
+        return data_hash([fp, config_hash, metadata])
+
+
+    def _path(self, key: str) -> Path:
+        return self.dir / key[:2] / (key + ENTRY_SUFFIX)
+
+
+    def get(self, key: str) -> Optional[BaseLocalSrcDocument]:
+        """
+        Fetch a document from the cache
+          :return: the document, or `None` if it is not in the cache
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+            os.utime(path)      # mark as recently used
+        except (OSError, ValueError):
+            return None
+
+        hdr = data.get("header", {})
+        cls = DOC_CLASS.get(hdr.get("document", {}).get("type"),
+                            SequenceLocalSrcDocument)
+        doc = cls(chunks=data.get("chunks"), metadata=hdr,
+                  iter_options=data.get("iter_options"))
+        if data.get("source_index"):
+            doc.source_index = SourceIndex.from_dict(data["source_index"])
+        return doc
+
+
+    def put(self, key: str, doc: BaseLocalSrcDocument):
+        """
+        Store a document in the cache
+        """
+        data = {
+            "format": FMT_SRCDOCUMENT,
+            "header": plain_metadata(doc.metadata),
+            "iter_options": plain_metadata(getattr(doc, "_iter_options",
+                                                   None)),
+            "chunks": list(doc.iter_struct())
+        }
+        index = source_index(doc)
+        if index is not None:
+            data["source_index"] = index.as_dict()
+        raw = gzip.compress(json.dumps(data, ensure_ascii=False,
+                                       separators=(",", ":"),
+                                       default=str).encode("utf-8"))
+
+        # Write atomically
+        path = self._path(key)
+        try:
+            old_size = path.stat().st_size
+        except OSError:
+            old_size = 0
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmpname, path)
+
+        # Update the cache size, and evict entries if needed
+        if self._size is None:
+            self._size = sum(e.stat().st_size for e in self._entries())
+        else:
+            self._size += len(raw) - old_size
+        if self._size > self.max_size:
+            self.evict()
+
+
+    def _entries(self):
+        """
+        Iterate over all the cache entries, as DirEntry objects
+        """
+        if not self.dir.is_dir():
+            return
+        for sub in os.scandir(self.dir):
+            if sub.is_dir():
+                for e in os.scandir(sub.path):
+                    if e.name.endswith(ENTRY_SUFFIX):
+                        yield e
+
+
+    def evict(self, max_size: int = None):
+        """
+        Remove the least recently used entries, until the cache size is below
+        the limit
+        """
+        if max_size is None:
+            max_size = self.max_size
+        entries = sorted((e.stat().st_mtime_ns, e.stat().st_size, e.path)
+                         for e in self._entries())
+        size = sum(e[1] for e in entries)
+        for _, esize, path in entries:
+            if size <= max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            size -= esize
+        self._size = size
+
+
+    def clear(self):
+        """
+        Remove all entries in the cache
+        """
+        self.evict(0)
@@ -3,36 +3,92 @@ Define a loader class that can load a local fila in a numberformats as
 an SrcDocument, by dispatching to an appropriate loader
 """
 
-from collections import defaultdict
+from time import perf_counter
+from collections import defaultdict, namedtuple
 from pathlib import Path
+from types import MappingProxyType
 
-from typing import Dict
+from typing import Dict, Iterable, Iterator, List, Tuple, Any, Union, \
+    AsyncIterator, TYPE_CHECKING
 
 from pii_data.helper.exception import ProcException, InvalidDocument
-from pii_data.helper.io import base_extension
 from pii_data.helper.misc import import_object
 from pii_data.helper.config import load_single_config, TYPE_CONFIG_LIST
 from pii_data.types.doc import SrcDocument
 
-from .. import defs
+from .. import defs, instrument
+from .batch import LoadResult, iter_many
+from .utils import base_extension, local_document, data_hash, \
+    plain_metadata
+from .sniff import get_sniffer, read_prefix
+from .plugins import discover_plugins, plugin_config
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from .aio import TYPE_NAMES
+    from .cache import ConversionCache
 
 
 DEFAULT_CONFIG = "doc-loader.json"
 
+# A compiled loader candidate for a file extension
+#  - mime: the document MIME type
+#  - cls: the (already imported) loader class
+#  - kwargs: frozen keyword arguments for the class constructor
+#  - metadata: frozen default metadata for the document
+#  - sniffer: a function to check the file contents for the type, or None
+LoaderEntry = namedtuple("LoaderEntry", "mime cls kwargs metadata sniffer")
+
+
+def freeze(value: Any) -> Any:
+    """
+    Return a read-only version of a configuration value
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    elif isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
 
 
 class DocumentLoader:
 
-    def __init__(self, config: TYPE_CONFIG_LIST = None):
+    def __init__(self, config: TYPE_CONFIG_LIST = None,
+                 sniff: Union[bool, str] = "auto",
+                 cache: Union[str, Path, "ConversionCache"] = None,
+                 plugins: Union[bool, str, Path] = True):
         """
          :param configfile: list of configuration files to add on top of the
-           default config
+           default config (and of the plugin config)
+         :param sniff: when to examine file contents to select the loader:
+           "auto" (when the file extension is unknown or maps to more than
+           one type), `True` (always) or `False` (never)
+         :param cache: an optional conversion cache, or a directory to create
+           one in
+         :param plugins: add the loaders declared by installed packages in
+           the `pii_preprocess.loaders` entry point group. It can also be the
+           name of the file to use as the plugin registry cache
         """
+        self.sniff = sniff
+        if isinstance(cache, (str, Path)):
+            from .cache import ConversionCache
+            cache = ConversionCache(cache)
+        self.cache = cache
+        self._config_hash = None
         self.types = defaultdict(list)
         self.loaders = {}
+        self._plan = {}
 
         # Load configuration
         base = Path(__file__).parents[1] / "resources" / DEFAULT_CONFIG
+        if plugins:
+            cachefile = None if plugins is True else plugins
+            found = discover_plugins(cachefile)
+            if found:
+                if not isinstance(config, (list, tuple)):
+                    config = [config] if config else []
+                config = [plugin_config(found)] + list(config)
         config = load_single_config(base, defs.FMT_CONFIG_LOADER, config)
         self.add_config(config)
 
@@ -41,10 +97,21 @@ class DocumentLoader:
         return f"<DocumentLoader {len(self.loaders)}>"
 
 
+    def __getstate__(self) -> Dict:
+        # The compiled plan is not picklable; it will be rebuilt on demand
+        state = self.__dict__.copy()
+        state["_plan"] = {}
+        return state
+
+
     def add_config(self, config: Dict):
         """
         Add a configuration dictionary to the object
         """
+        # Invalidate the compiled dispatch plan
+        self._plan = {}
+        self._config_hash = None
+
         # Add loaders
         self.loaders.update(config.get("loaders", {}))
 
@@ -62,20 +129,21 @@ class DocumentLoader:
                 self.types[e].append(elem)
 
 
-    def load(self, docname: str, metadata: Dict = None) -> SrcDocument:
+    def _compile(self, ext: str = None) -> Tuple[LoaderEntry]:
         """
-        Load a source document by finding the appropriate loader class and
-        instantiating it
-          :param docname: filename containing the document to load
-          :param metadata: optional document-level metadata to add
+        Compile the dispatch plan for a file extension: the ordered list of
+        candidate loaders, with their classes imported and their arguments
+        frozen. If no extension is given, compile the plan for all the types
+        that have a sniffer.
         """
-        ext = base_extension(docname)
-        if ext not in self.types:
-            raise ProcException("cannot find a type for file: {}", docname)
-        err = []
+        if ext is not None:
+            elemlist = self.types[ext]
+        else:
+            elemlist = {id(e): e for elems in self.types.values()
+                        for e in elems if e.get("sniffer")}.values()
 
-        # Search all the mime types for this extension
-        for elem in self.types[ext]:
+        plan = []
+        for elem in elemlist:
 
             # Find the loader for this mime type
             mime = elem.get("mime")
@@ -84,18 +152,205 @@ class DocumentLoader:
             loader = self.loaders[mime]
             if "class" not in loader:
                 raise ProcException("invalid loader config for type: {}: no class", mime)
-            # Import the loader class
+
+            # Import the loader class & separate its arguments
             cls = import_object(loader["class"])
-            kwargs = loader.get("class_kwargs", {})
-            meta = kwargs.pop("metadata", {})
+            kwargs = dict(loader.get("class_kwargs", {}))
+            meta = kwargs.pop("metadata", None) or {}
+            sniffer = elem.get("sniffer")
+            if sniffer:
+                sniffer = get_sniffer(sniffer)
+            plan.append(LoaderEntry(mime, cls, freeze(kwargs), freeze(meta),
+                                    sniffer))
+
+        self._plan[ext] = plan = tuple(plan)
+        return plan
+
+
+    def _sniff(self, docname: str,
+               plan: Tuple[LoaderEntry]) -> Tuple[LoaderEntry]:
+        """
+        Select the candidate loaders for a file by examining its contents
+          :param docname: the file to load
+          :param plan: the candidate loaders given by the file extension
+        """
+        prefix = read_prefix(docname)
+        if prefix is None:
+            return plan     # let the loader class report the problem
+
+        # Check the candidates for the file extension. Sniffed ones go first,
+        # then those without a sniffer (which cannot be discarded)
+        found = [e for e in plan if e.sniffer and e.sniffer(prefix)]
+        if found:
+            return found + [e for e in plan if not e.sniffer]
+
+        # Try all other types
+        allplan = self._plan.get(None) or self._compile()
+        mimes = set(e.mime for e in plan)
+        found = [e for e in allplan
+                 if e.mime not in mimes and e.sniffer(prefix)]
+        return found[:1] or plan
+
+
+    def candidates(self, docname: str) -> Tuple[LoaderEntry]:
+        """
+        Find the candidate loaders for a file, as given by its extension and,
+        if needed, by its contents
+        """
+        ext = base_extension(docname)
+        plan = self._plan.get(ext)
+        if plan is None:
+            plan = self._compile(ext) if ext in self.types else ()
+
+        # Decide if we need to examine the file contents
+        if self.sniff and (len(plan) != 1 or self.sniff != "auto"):
+            plan = self._sniff(docname, plan)
+
+        if not plan:
+            raise ProcException("cannot find a type for file: {}", docname)
+        return plan
+
+
+    def config_hash(self) -> str:
+        """
+        Return a hash of the effective loader configuration
+        """
+        if self._config_hash is None:
+            self._config_hash = data_hash([self.types, self.loaders,
+                                           self.sniff])
+        return self._config_hash
+
+
+    def load(self, docname: str, metadata: Dict = None) -> SrcDocument:
+        """
+        Load a source document by finding the appropriate loader class and
+        instantiating it
+          :param docname: filename containing the document to load
+          :param metadata: optional document-level metadata to add
+
+        If the loader has a conversion cache, the document is first searched
+        for in the cache. Documents returned when using a cache are always
+        local documents, holding all their chunks in memory.
+        """
+        if not self.cache:
+            return self._load(docname, metadata)
+
+        key = self.cache.key(docname, self.config_hash(), metadata)
+        if key is None:
+            return self._load(docname, metadata)
+        doc = self.cache.get(key)
+        if doc is not None:
+            instrument.emit("doc.load", docname, mime=None, loader=None,
+                            elapsed=0, failed=[], cached=True)
+        else:
+            doc = local_document(self._load(docname, metadata))
+            self.cache.put(key, doc)
+        return doc
+
+
+    def _load(self, docname: str, metadata: Dict = None) -> SrcDocument:
+        """
+        Load a source document by trying the candidate loader classes
+        """
+        try:
+            plan = self.candidates(docname)
+        except ProcException:
+            instrument.emit("doc.load", docname, mime=None, loader=None,
+                            elapsed=None, failed=[])
+            raise
+        err = []
+        failed = []
+
+        # Try all the candidate loaders
+        for entry in plan:
+
+            # Build the document metadata
+            meta = plain_metadata(entry.metadata)
             if metadata:
                 meta.update(metadata)
 
             # Instantiate the class
+            start = perf_counter()
             try:
-                return cls(docname, metadata=meta, **kwargs)
+                doc = entry.cls(docname, metadata=meta, **entry.kwargs)
             except InvalidDocument as e:
-                err.add(str(e))
+                err.append(str(e))
+                failed.append(entry.mime)
+                continue
+            instrument.emit("doc.load", docname, mime=entry.mime,
+                            loader=entry.cls.__name__,
+                            elapsed=perf_counter() - start, failed=failed)
+            return doc
 
+        instrument.emit("doc.load", docname, mime=None, loader=None,
+                        elapsed=None, failed=failed)
         raise ProcException("cannot load document '{}': {}", docname,
                             ",".join(err))
+
+
+    def iter_many(self, docnames: Iterable[str], workers: int = None,
+                  metadata: Dict = None,
+                  ordered: bool = True) -> Iterator[LoadResult]:
+        """
+        Load a batch of documents, spreading them across worker processes.
+        Errors are reported per document, and do not stop the batch.
+          :param docnames: an iterable of document filenames
+          :param workers: number of worker processes (default is the number
+            of CPUs); if 1, documents are loaded in the current process
+          :param metadata: optional document-level metadata to add
+          :param ordered: produce results in input order, else produce them
+            as they are finished
+          :return: an iterator of `LoadResult` tuples (index, name, doc, error)
+
+        Documents loaded in worker processes are delivered as local documents
+        holding all their chunks in memory.
+        """
+        return iter_many(self, docnames, workers=workers, metadata=metadata,
+                         ordered=ordered)
+
+
+    def load_many(self, docnames: Iterable[str], workers: int = None,
+                  metadata: Dict = None,
+                  ordered: bool = True) -> List[LoadResult]:
+        """
+        Load a batch of documents, spreading them across worker processes.
+        Same arguments as `iter_many()`, but returns a list.
+        """
+        return list(self.iter_many(docnames, workers=workers,
+                                   metadata=metadata, ordered=ordered))
+
+
+    async def aload(self, docname: str, metadata: Dict = None,
+                    executor: "Executor" = None,
+                    timeout: float = None) -> SrcDocument:
+        """
+        Load a source document from asyncio code. The document is loaded and
+        parsed in an executor, and returned as a local document.
+          :param docname: filename containing the document to load
+          :param metadata: optional document-level metadata to add
+          :param executor: executor to use (default is the loop executor)
+          :param timeout: maximum time (in seconds) to wait for the document
+        """
+        from . import aio
+        return await aio.aload(self, docname, metadata=metadata,
+                               executor=executor, timeout=timeout)
+
+
+    def aiter_many(self, docnames: "TYPE_NAMES", concurrency: int = 4,
+                   metadata: Dict = None, executor: "Executor" = None,
+                   timeout: float = None) -> AsyncIterator[LoadResult]:
+        """
+        Load a batch of documents from asyncio code, with bounded concurrency
+          :param docnames: an iterable (sync or async) of document filenames
+          :param concurrency: maximum number of documents loaded at once
+          :param metadata: optional document-level metadata to add
+          :param executor: executor to use (default is the loop executor). For
+            CPU-bound parsing, a `ProcessPoolExecutor` can be used
+          :param timeout: maximum time (in seconds) to wait for each document
+          :return: an async iterator of `LoadResult` tuples, delivered as they
+            are finished
+        """
+        from . import aio
+        return aio.aiter_many(self, docnames, concurrency=concurrency,
+                              metadata=metadata, executor=executor,
+                              timeout=timeout)
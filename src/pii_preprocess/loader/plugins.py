@@ -0,0 +1,163 @@
+"""
+Discovery of third-party document loaders through package entry points.
+
+A package can declare loaders in the `pii_preprocess.loaders` entry point
+group. Each entry point must point to either a dict or a callable returning a
+dict (or a list of dicts), with these fields:
+  * `mime`: the document MIME type
+  * `ext`: file extension(s) for the type (a string or a list of strings)
+  * `class`: fully qualified name of the loader class
+  * `class_kwargs`: (optional) keyword arguments for the class constructor
+  * `sniffer`: (optional) a content sniffer for the type
+
+The discovered declarations are stored in an on-disk cache, which is reused
+as long as the directories in the Python path have not changed (i.e. no
+distribution has been installed, upgraded or removed), so that installed
+distributions are not scanned (and plugin modules are not imported) on every
+startup.
+"""
+
+import os
+import sys
+import json
+import warnings
+from pathlib import Path
+
+from typing import Dict, List
+
+from .. import defs
+
+
+# Entry point group for loader plugins
+ENTRY_POINT_GROUP = "pii_preprocess.loaders"
+
+# Format indicator for the plugin registry cache
+FMT_PLUGIN_CACHE = "pii-preprocess:plugins:v1"
+
+# Environment variable that can define the plugin registry cache file
+ENV_PLUGIN_CACHE = "PII_PREPROCESS_PLUGIN_CACHE"
+
+
+def default_cachefile() -> Path:
+    """
+    Return the default location for the plugin registry cache
+    """
+    if os.environ.get(ENV_PLUGIN_CACHE):
+        return Path(os.environ[ENV_PLUGIN_CACHE])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "pii-preprocess" / "plugins.json"
+
+
+def path_fingerprint() -> List:
+    """
+    Compute a fingerprint of the Python path, which changes when any
+    distribution is installed, upgraded or removed
+    """
+    fp = [sys.version]
+    for p in sys.path:
+        try:
+            fp.append([p, os.stat(p or ".").st_mtime_ns])
+        except OSError:
+            pass
+    return fp
+
+
+def _entry_points() -> List:
+    """
+    Get the entry points in the plugin group
+    """
+    from importlib.metadata import entry_points
+    eps = entry_points()
+    if hasattr(eps, "select"):
+        return list(eps.select(group=ENTRY_POINT_GROUP))
+    return list(eps.get(ENTRY_POINT_GROUP, []))     # Python < 3.10
+
+
+def check_declaration(decl: Dict, name: str) -> Dict:
+    """
+    Validate a plugin declaration
+    """
+    if not isinstance(decl, dict):
+        raise ValueError(f"invalid declaration in plugin: {name}")
+    for f in ("mime", "ext", "class"):
+        if f not in decl:
+            raise ValueError(f"no '{f}' field in plugin: {name}")
+    out = {f: decl[f] for f in ("mime", "ext", "class", "class_kwargs",
+                                "sniffer") if f in decl}
+    out["plugin"] = name
+    return out
+
+
+def scan_plugins() -> List[Dict]:
+    """
+    Scan the installed distributions for loader plugins. Plugins that cannot
+    be loaded are skipped, with a warning.
+      :return: a list of plugin declarations
+    """
+    out = []
+    for ep in _entry_points():
+        try:
+            decl = ep.load()
+            if callable(decl):
+                decl = decl()
+            if not isinstance(decl, (list, tuple)):
+                decl = [decl]
+            out += [check_declaration(d, ep.name) for d in decl]
+        except Exception as e:
+            warnings.warn(f"cannot load document loader plugin '{ep.name}': {e}")
+    return out
+
+
+def discover_plugins(cachefile: str = None, refresh: bool = False) -> List[Dict]:
+    """
+    Get the declarations of all installed loader plugins, using the on-disk
+    cache if it is still valid
+      :param cachefile: the cache file (if not given, use the default one)
+      :param refresh: ignore the cache, and scan distributions again
+      :return: a list of plugin declarations
+    """
+    cachefile = Path(cachefile) if cachefile else default_cachefile()
+    fp = path_fingerprint()
+
+    # Try the cache
+    if not refresh:
+        try:
+            with open(cachefile, encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache.get("format") == FMT_PLUGIN_CACHE and \
+               cache.get("fingerprint") == fp:
+                return cache["plugins"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    # Scan the installed distributions, and save the result (atomically).
+    # An unwritable cache is not an error
+    plugins = scan_plugins()
+    data = {"format": FMT_PLUGIN_CACHE, "fingerprint": fp, "plugins": plugins}
+    try:
+        import tempfile     # only needed here; keep startup imports small
+        cachefile.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=cachefile.parent, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmpname, cachefile)
+    except OSError:
+        pass
+    return plugins
+
+
+def plugin_config(plugins: List[Dict]) -> Dict:
+    """
+    Convert a list of plugin declarations into a loader configuration
+    """
+    types = []
+    loaders = {}
+    for p in plugins:
+        elem = {"mime": p["mime"], "ext": p["ext"]}
+        if p.get("sniffer"):
+            elem["sniffer"] = p["sniffer"]
+        types.append(elem)
+        loaders[p["mime"]] = {"class": p["class"],
+                              "class_kwargs": p.get("class_kwargs", {})}
+    return {defs.FMT_CONFIG_LOADER: {"name": "plugins", "types": types,
+                                     "loaders": loaders}}
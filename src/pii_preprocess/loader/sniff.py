@@ -0,0 +1,156 @@
+"""
+Content sniffers: functions that examine a small prefix of a file and decide
+if it can correspond to a given document type, so that the loader can select
+the right loader class before fully parsing the file.
+
+A sniffer receives the initial bytes of the (uncompressed) file, and returns
+a boolean.
+"""
+
+import re
+import csv
+import struct
+
+from typing import Callable, List, Optional
+
+from pii_data.helper.misc import import_object
+from pii_data.helper.exception import ConfigException
+
+from ..compress import open_file
+
+
+# Maximum number of bytes to read from a file for sniffing
+SNIFF_SIZE = 8192
+
+# Delimiters to consider when sniffing CSV files
+CSV_DELIMITERS = ",;\t|"
+
+# Signature for a ZIP local file header
+ZIP_SIGNATURE = b"PK\x03\x04"
+
+# The format indicator in a serialized Source Document
+SRCDOC_FORMAT = re.compile(r"""^ \W* format \W* : \s* ["']? piisa:src-document:""",
+                           flags=re.X | re.M)
+
+TYPE_SNIFFER = Callable[[bytes], bool]
+
+
+def read_prefix(filename: str, size: int = SNIFF_SIZE) -> Optional[bytes]:
+    """
+    Read the initial bytes of a file (uncompressing it if needed)
+      :return: the bytes read, or `None` if the file cannot be read
+    """
+    try:
+        with open_file(filename, "rb", readahead=False) as f:
+            return f.read(size)
+    except Exception:
+        return None
+
+
+def decode_prefix(prefix: bytes, encoding: str = "utf-8") -> Optional[str]:
+    """
+    Decode a file prefix as text. A truncated character at the end of the
+    prefix is ignored.
+      :return: the decoded string, or `None` if it is not valid text
+    """
+    if b"\0" in prefix:
+        return None
+    try:
+        return prefix.decode(encoding)
+    except UnicodeDecodeError as e:
+        if e.reason != "unexpected end of data" or len(prefix) - e.start > 3:
+            return None
+        return prefix[:e.start].decode(encoding)
+
+
+def zip_members(prefix: bytes) -> List[str]:
+    """
+    Return the names of the members of a ZIP archive whose local headers are
+    contained in the prefix
+    """
+    names = []
+    pos = 0
+    while prefix[pos:pos+4] == ZIP_SIGNATURE and pos + 30 <= len(prefix):
+        flags, csize, nlen, xlen = struct.unpack_from("<6xH10xI4xHH", prefix,
+                                                      pos)
+        names.append(prefix[pos+30:pos+30+nlen].decode("utf-8", "replace"))
+        if flags & 0x08:
+            break       # sizes are in a data descriptor, cannot skip
+        pos += 30 + nlen + xlen + csize
+    return names
+
+
+# -----------------------------------------------------------------------
+
+
+def sniff_ooxml_word(prefix: bytes) -> bool:
+    """
+    Sniff an Office Open XML Word document (docx)
+    """
+    if not prefix.startswith(ZIP_SIGNATURE):
+        return False
+    names = zip_members(prefix)
+    if any(n.startswith("word/") for n in names):
+        return True
+    # If we have found other Office components, it is not a Word document
+    return not any(n.startswith(("xl/", "ppt/")) for n in names)
+
+
+def sniff_src_document(prefix: bytes) -> bool:
+    """
+    Sniff a serialized PII Source Document (YAML or JSON)
+    """
+    text = decode_prefix(prefix)
+    return bool(text and SRCDOC_FORMAT.search(text))
+
+
+def sniff_text(prefix: bytes) -> bool:
+    """
+    Sniff a plain text document
+    """
+    return decode_prefix(prefix) is not None
+
+
+def sniff_csv(prefix: bytes) -> bool:
+    """
+    Sniff a CSV document: there must be at least two rows, all of them with
+    the same number (greater than one) of fields
+    """
+    text = decode_prefix(prefix)
+    if not text:
+        return False
+
+    # If the prefix is truncated, remove the last (possibly partial) line
+    lines = text.splitlines(keepends=True)
+    if len(prefix) >= SNIFF_SIZE:
+        lines = lines[:-1]
+    sample = "".join(lines)
+
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        rows = [r for r in csv.reader(lines, dialect) if r]
+    except csv.Error:
+        return False
+    return len(rows) > 1 and len(rows[0]) > 1 and \
+        all(len(r) == len(rows[0]) for r in rows)
+
+
+# Predefined sniffers, available by name
+SNIFFERS = {
+    "ooxml-word": sniff_ooxml_word,
+    "src-document": sniff_src_document,
+    "csv": sniff_csv,
+    "text": sniff_text
+}
+
+
+def get_sniffer(name: str) -> TYPE_SNIFFER:
+    """
+    Get a sniffer function, either a predefined one or a Python function
+    given by its fully qualified name
+    """
+    if name in SNIFFERS:
+        return SNIFFERS[name]
+    elif "." in name:
+        return import_object(name)
+    raise ConfigException("unknown sniffer: {}", name)
@@ -0,0 +1,97 @@
+"""
+Miscellaneous utilities for the document loader
+"""
+
+import os
+import json
+import hashlib
+
+from collections.abc import Mapping
+
+from typing import Any, Dict
+
+from pii_data.types.doc.document import SrcDocument, TreeSrcDocument, \
+    TableSrcDocument
+from pii_data.types.doc.localdoc import BaseLocalSrcDocument, \
+    SequenceLocalSrcDocument, TreeLocalSrcDocument, TableLocalSrcDocument
+
+from ..defs import COMPRESSION_EXT
+from ..doc.srcindex import source_index
+
+
+def base_extension(name: str) -> str:
+    """
+    Return the base file extension, once a (possible) compression extension
+    has been removed. This is equivalent to pii_data.helper.io.base_extension,
+    but avoids creating Path objects, since it is called once per document.
+    """
+    if not isinstance(name, (str, os.PathLike)):
+        return ""
+    base, ext = os.path.splitext(os.fspath(name))
+    return os.path.splitext(base)[1] if ext in COMPRESSION_EXT else ext
+
+
+def data_hash(data) -> str:
+    """
+    Compute a stable hash of a JSON-serializable data structure
+    """
+    raw = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def file_fingerprint(name: str, content_hash: bool = False) -> Dict:
+    """
+    Compute a fingerprint for a local file, to detect changes in it
+      :param name: the filename
+      :param content_hash: add also a hash of the file contents
+      :return: a dict with the file path, size and modification time (and
+        optionally, content hash)
+    """
+    st = os.stat(name)
+    fp = {"path": os.path.abspath(name), "size": st.st_size,
+          "mtime": st.st_mtime_ns}
+    if content_hash:
+        h = hashlib.sha256()
+        with open(name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        fp["hash"] = h.hexdigest()
+    return fp
+
+
+def plain_metadata(meta: Mapping) -> Dict:
+    """
+    Return a mutable copy of document metadata (or iteration options), with
+    nested mappings and sequences (such as the frozen ones in the loader
+    configuration) converted to plain dicts and lists. Scalar values are
+    kept as they are.
+    """
+    def plain(value: Any) -> Any:
+        if isinstance(value, Mapping):
+            return {k: plain(v) for k, v in value.items()}
+        elif isinstance(value, (list, tuple)):
+            return [plain(v) for v in value]
+        return value
+    return plain(meta or {})
+
+
+def local_document(doc: SrcDocument) -> BaseLocalSrcDocument:
+    """
+    Materialize a source document into a local document holding all its
+    chunks in memory. The result does not hold any open resources (files,
+    parsers) and hence can be pickled and sent across processes. A source
+    index in the document is carried over (the iteration completes it).
+    """
+    if isinstance(doc, TreeSrcDocument):
+        cls = TreeLocalSrcDocument
+    elif isinstance(doc, TableSrcDocument):
+        cls = TableLocalSrcDocument
+    else:
+        cls = SequenceLocalSrcDocument
+    local = cls(chunks=list(doc.iter_struct()),
+                metadata=plain_metadata(doc.metadata),
+                iter_options=getattr(doc, "_iter_options", None))
+    index = source_index(doc)
+    if index is not None:
+        local.source_index = index
+    return local
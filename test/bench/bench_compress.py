@@ -0,0 +1,98 @@
+"""
+Benchmark: throughput when reading compressed text files, per codec, for
+sequential decompression, decompression with a read-ahead thread, and
+parallel decompression of multi-member files. Each file is read in text mode
+and split into lines, so that decompression overlaps with some parsing work.
+
+Each variant runs in a fresh process.
+
+  PYTHONPATH=src python test/bench/bench_compress.py [SIZE_MB] [WORKERS]
+"""
+
+import os
+import sys
+import bz2
+import gzip
+import lzma
+import random
+import tempfile
+import subprocess
+from time import perf_counter
+
+from pii_preprocess.compress import open_file
+
+
+VOCABULARY = ["the", "mulberry", "tree", "is", "native", "to", "eastern",
+              "and", "central", "North", "America", "it", "grows", "fast",
+              "in", "moist", "soils", "(red)", "fruit", "1,200", "species"]
+
+# Size of each member in multi-member files
+MEMBER_SIZE = 4 << 20
+
+
+def zstd_compress(data: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdCompressor().compress(data)
+
+
+CODECS = {".gz": gzip.compress, ".bz2": bz2.compress, ".xz": lzma.compress,
+          ".zst": zstd_compress}
+
+
+def make_text(size: int) -> bytes:
+    """
+    Build a synthetic document of (approximately) the given size, in bytes
+    """
+    rnd = random.Random(42)
+    lines = [" ".join(rnd.choices(VOCABULARY, k=rnd.randint(3, 15))) + ".\n"
+             for _ in range(20000)]
+    sample = "".join(lines).encode("utf-8")
+    return (sample * (size // len(sample) + 1))[:size]
+
+
+def make_files(tmp: str, size: int):
+    """
+    Write the compressed files, as multi-member files
+    """
+    data = make_text(size)
+    for ext, compress in CODECS.items():
+        try:
+            with open(os.path.join(tmp, "doc.txt" + ext), "wb") as f:
+                for n in range(0, len(data), MEMBER_SIZE):
+                    f.write(compress(data[n:n+MEMBER_SIZE]))
+        except ImportError:
+            print(f"skipping {ext}: codec not available")
+
+
+def run(name: str, workers: int, readahead: bool):
+    """
+    Read one file, in the current process
+    """
+    t0 = perf_counter()
+    size = 0
+    with open_file(name, encoding="utf-8", workers=workers,
+                   readahead=readahead) as f:
+        for line in f:
+            size += len(line)
+    elapsed = perf_counter() - t0
+    ext = os.path.splitext(name)[1]
+    label = f"{ext} w={workers} ra={readahead}"
+    print(f"{label:>22}: {elapsed:7.2f} s  {size/elapsed/(1<<20):7.1f} MB/s")
+
+
+def main(size_mb: int = 100, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        make_files(tmp, size_mb << 20)
+        for name in sorted(os.listdir(tmp)):
+            for w, ra in ((1, False), (1, True), (workers, True)):
+                subprocess.run([sys.executable, __file__, "--run",
+                                os.path.join(tmp, name), str(w), str(ra)],
+                               check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run(sys.argv[2], int(sys.argv[3]), sys.argv[4] == "True")
+    else:
+        main(*map(int, sys.argv[1:]))
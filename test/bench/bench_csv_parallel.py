@@ -0,0 +1,78 @@
+"""
+Benchmark: throughput when parsing a large CSV file, sequentially and in
+parallel with several worker processes, with and without the source index.
+The file has quoted fields, some of them with embedded newlines. The CPU time
+used by the main process is also shown, since it bounds the throughput that
+can be reached with enough cores.
+
+Each variant runs in a fresh process.
+
+  PYTHONPATH=src python test/bench/bench_csv_parallel.py [SIZE_MB] [WORKERS]
+"""
+
+import os
+import sys
+import random
+import tempfile
+import subprocess
+from time import perf_counter, process_time
+
+from pii_preprocess.doc.csv import LocalCsvDocument
+
+
+VOCABULARY = ["the", "mulberry", "tree", "is", "native", "to", "eastern",
+              "and", "central", "North", "America", "it", "grows", "fast",
+              "in", "moist", "soils", "(red)", "fruit", "1,200", "species"]
+
+
+def make_csv(name: str, size: int):
+    """
+    Write a synthetic CSV file of (approximately) the given size, in bytes
+    """
+    rnd = random.Random(42)
+    rows = ["id,name,amount,description\n"]
+    for n in range(20000):
+        desc = " ".join(rnd.choices(VOCABULARY, k=rnd.randint(3, 30)))
+        if rnd.random() < 0.1:
+            desc += '\n"quoted" line'
+        desc = '"' + desc.replace('"', '""') + '"'
+        rows.append(f"{n},{rnd.choice(VOCABULARY)},{rnd.random():.2f},{desc}\n")
+    sample = "".join(rows[1:]).encode("utf-8")
+    with open(name, "wb") as f:
+        f.write(rows[0].encode("utf-8"))
+        for _ in range(size // len(sample) + 1):
+            f.write(sample)
+
+
+def run(name: str, workers: int, index: bool):
+    """
+    Parse the file, in the current process
+    """
+    t0 = perf_counter()
+    c0 = process_time()
+    doc = LocalCsvDocument(name, workers=workers, source_index=index)
+    nrows = sum(1 for _ in doc.iter_base())
+    elapsed = perf_counter() - t0
+    cpu = process_time() - c0
+    size = os.path.getsize(name)
+    label = f"w={workers} index={index}"
+    print(f"{label:>20}: {elapsed:7.2f} s  {size/elapsed/(1<<20):7.1f} MB/s"
+          f"  (main process CPU {cpu:6.2f} s)  {nrows} rows")
+
+
+def main(size_mb: int = 200, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        name = os.path.join(tmp, "doc.csv")
+        make_csv(name, size_mb << 20)
+        for index in (False, True):
+            for w in (1, workers):
+                subprocess.run([sys.executable, __file__, "--run", name,
+                                str(w), str(index)], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run(sys.argv[2], int(sys.argv[3]), sys.argv[4] == "True")
+    else:
+        main(*map(int, sys.argv[1:]))
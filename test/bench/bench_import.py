@@ -0,0 +1,46 @@
+"""
+Benchmark: import time for the package entry points, as measured by
+`python -X importtime` in a fresh interpreter (best of several runs)
+
+  PYTHONPATH=src python test/bench/bench_import.py [REPEAT]
+"""
+
+import os
+import sys
+import subprocess
+
+
+ENTRY_POINTS = [
+    "pii_preprocess.loader",
+    "pii_preprocess.app.doc",
+    "pii_preprocess.app.dataset",
+    "pii_preprocess.app.csvdoc",
+    "pii_preprocess.app.textdoc",
+    "pii_preprocess.doc.msoffice.msword",
+]
+
+
+def import_time(module: str) -> int:
+    """
+    Return the cumulative import time (in microseconds) for a module
+    """
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                          f"import {module}"],
+                         check=True, capture_output=True, text=True,
+                         env=os.environ)
+    total = 0
+    for line in out.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            total = int(fields[1])
+    return total
+
+
+def main(repeat: int = 5):
+    for module in ENTRY_POINTS:
+        t = min(import_time(module) for _ in range(repeat))
+        print(f"{module:>40}: {t/1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
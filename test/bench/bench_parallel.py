@@ -0,0 +1,71 @@
+"""
+Benchmark: parallel chunking of a large text file, in each parallel chunk
+mode, against sequential (memory-mapped) reading. It also checks that both
+produce the same chunks.
+
+  PYTHONPATH=src python test/bench/bench_parallel.py [SIZE_MB] [WORKERS]
+"""
+
+import os
+import sys
+import random
+import tempfile
+from time import perf_counter
+
+from pii_preprocess.doc.text.load import TextSrcDocument
+
+
+VOCABULARY = ["the", "mulberry", "tree", "is", "native", "to", "eastern",
+              "and", "central", "North", "America", "it", "grows", "fast",
+              "in", "moist", "soils", "(red)", "fruit", "1,200", "species"]
+
+MODES = [
+    {"mode": "line"},
+    {"mode": "paragraph", "min_words": 20, "max_words": 250},
+    {"mode": "word", "max_words": 100},
+]
+
+
+def make_file(name: str, size: int):
+    """
+    Write a synthetic document of (approximately) the given size, in bytes
+    """
+    rnd = random.Random(42)
+    paras = []
+    for _ in range(200):
+        lines = [" ".join(rnd.choices(VOCABULARY, k=rnd.randint(3, 15)))
+                 for _ in range(rnd.randint(1, 40))]
+        paras.append(".\n".join(lines) + ".\n\n")
+    sample = "".join(paras)
+    with open(name, "w", encoding="utf-8") as f:
+        for _ in range(size // len(sample) + 1):
+            f.write(sample)
+
+
+def run(name: str, opt: dict) -> list:
+    """
+    Read & chunk the file, returning the chunk lengths
+    """
+    t0 = perf_counter()
+    doc = TextSrcDocument(name, chunk_options={"mmap": True, **opt})
+    lengths = [len(c.data) for c in doc]
+    label = f"{opt['mode']}/{opt.get('workers', 1)}"
+    print(f"{label:>12}: {perf_counter() - t0:7.2f} s  {len(lengths)} chunks")
+    return lengths
+
+
+def main(size_mb: int = 200, workers: int = None):
+    workers = workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        name = os.path.join(tmp, "doc.txt")
+        make_file(name, size_mb << 20)
+        range_size = max(1 << 20, (size_mb << 20) // (4*workers))
+        for opt in MODES:
+            exp = run(name, opt)
+            got = run(name, {"workers": workers, "range_size": range_size,
+                             **opt})
+            assert got == exp, "parallel chunks differ"
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
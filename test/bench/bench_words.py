@@ -0,0 +1,121 @@
+"""
+Benchmark: word chunking (word mode, and paragraph mode with word limits),
+comparing the scanner-based splitters against the previous implementation
+based on re.split() + chunker, which creates a string object per word.
+
+Each variant runs in a fresh process, on a synthetic text document, and
+reports elapsed time and the peak memory on top of the document itself.
+
+  PYTHONPATH=src python test/bench/bench_words.py [SIZE_MB]
+"""
+
+import re
+import sys
+import random
+import resource
+import subprocess
+from time import perf_counter
+
+from pii_preprocess.doc.utils import chunker
+from pii_preprocess.doc.text.read.read_words import WordSplitter
+from pii_preprocess.doc.text.read.read_para import ParagraphSplitter
+
+
+VOCABULARY = ["the", "mulberry", "tree", "is", "native", "to", "eastern",
+              "and", "central", "North", "America", "it", "grows", "fast",
+              "in", "moist", "soils", "(red)", "fruit", "1,200", "species"]
+
+PARA_OPTIONS = {"max_words": 250, "min_words": 20}
+
+
+def make_text(size: int) -> str:
+    """
+    Build a synthetic document of (approximately) the given size, in bytes
+    """
+    rnd = random.Random(42)
+    paras = []
+    for _ in range(200):
+        words = rnd.choices(VOCABULARY, k=rnd.randint(5, 600))
+        paras.append(" ".join(words) + ".\n\n")
+    sample = "".join(paras)
+    return sample * (size // len(sample) + 1)
+
+
+def old_words(doc: str, max_words: int = 100):
+    """
+    Previous word mode implementation
+    """
+    return chunker(re.split(r"(\W+)", doc), max_words*2)
+
+
+def old_paragraphs(doc: str, wmin: int, wmax: int):
+    """
+    Previous paragraph mode implementation (with word limits)
+    """
+    reg = re.compile(r"(\n (?:\s*\n){1,})", flags=re.X)
+    ws = re.compile(r"(\W+)")
+    prev = ""
+    prev_nw = 0
+    for para in chunker(reg.split(doc), 2):
+        words = list(chunker(ws.split(para), 2, 2))
+        para_nw = len(words)
+        if wmin and prev_nw + para_nw <= wmin:
+            prev += para
+            prev_nw += para_nw
+            continue
+        if not wmax or prev_nw + para_nw < wmax:
+            yield prev + para
+        else:
+            if prev:
+                yield prev
+            if para_nw < wmax:
+                yield para
+            else:
+                for i in range(0, len(words), wmax):
+                    yield "".join(words[i:i+wmax])
+        prev = ""
+        prev_nw = 0
+    if prev:
+        yield prev
+
+
+VARIANTS = {
+    "word/re.split": lambda doc: old_words(doc),
+    "word/scanner": lambda doc: WordSplitter(doc, {}),
+    "para/re.split": lambda doc: old_paragraphs(doc, PARA_OPTIONS["min_words"],
+                                                PARA_OPTIONS["max_words"]),
+    "para/scanner": lambda doc: ParagraphSplitter(doc, PARA_OPTIONS),
+}
+
+
+def maxrss() -> int:
+    """
+    Peak resident memory of the current process, in MB
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def run(variant: str, size: int):
+    """
+    Run one variant, in the current process
+    """
+    doc = make_text(size)
+    base = maxrss()
+    t0 = perf_counter()
+    num = sum(1 for _ in VARIANTS[variant](doc))
+    elapsed = perf_counter() - t0
+    print(f"{variant:>14}: {elapsed:7.2f} s  {maxrss() - base:6d} MB  "
+          f"{num} chunks")
+
+
+def main(size_mb: int = 100):
+    for variant in VARIANTS:
+        subprocess.run([sys.executable, __file__, "--run", variant,
+                        str(size_mb)], check=True)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--run":
+        run(sys.argv[2], int(sys.argv[3]) << 20)
+    else:
+        main(*map(int, sys.argv[1:]))
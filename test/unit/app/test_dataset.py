@@ -0,0 +1,146 @@
+from pathlib import Path
+import os
+import json
+import shutil
+from argparse import Namespace
+
+import pytest
+
+from pii_preprocess.loader import DocumentLoader
+import pii_preprocess.app.dataset as mod
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+DOCS = ["csv/table-example.csv", "msword/example-headings.docx",
+        "text/doc-example.txt"]
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """
+    Create an input dataset
+    """
+    src = tmp_path / "input"
+    for name in DOCS:
+        dest = src / name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(DATADIR / name, dest)
+    (src / "text" / "ignored.blargh").write_text("not a document")
+    return src
+
+
+def read_manifest(outdir: Path):
+    with open(outdir / mod.MANIFEST_NAME, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# -----------------------------------------------------------------------
+
+
+def test100_convert(dataset, tmp_path):
+    """Test converting a dataset"""
+    out = tmp_path / "output"
+    obj = mod.DatasetConverter(DocumentLoader(), dataset, out)
+    stats = obj.run()
+    assert stats == {"converted": 3, "unchanged": 0, "failed": 0, "deleted": 0}
+
+    manifest = read_manifest(out)
+    assert sorted(manifest["files"]) == DOCS
+    for name in DOCS:
+        entry = manifest["files"][name]
+        assert entry["status"] == "ok"
+        assert entry["output"] == name + ".yml"
+        assert entry["chunks"] > 0
+        assert (out / entry["output"]).is_file()
+
+
+def test105_chunk_count(dataset, tmp_path, monkeypatch):
+    """Test that documents are iterated once, counting the written chunks"""
+    calls = []
+    orig = mod.ChunkCounter.iter_struct
+    monkeypatch.setattr(mod.ChunkCounter, "iter_struct",
+                        lambda self: calls.append(1) or orig(self))
+    out = tmp_path / "output"
+    mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert len(calls) == len(DOCS)
+    manifest = read_manifest(out)
+    exp = {"csv/table-example.csv": 3, "msword/example-headings.docx": 22,
+           "text/doc-example.txt": 2}
+    assert {n: e["chunks"] for n, e in manifest["files"].items()} == exp
+
+
+def test110_rerun(dataset, tmp_path):
+    """Test re-running the conversion: only changes are processed"""
+    out = tmp_path / "output"
+    mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+
+    # Nothing changed
+    stats = mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert stats == {"converted": 0, "unchanged": 3, "failed": 0, "deleted": 0}
+
+    # Modify one file, delete another
+    name = dataset / DOCS[2]
+    with open(name, "a", encoding="utf-8") as f:
+        f.write("\nA new paragraph\n")
+    os.utime(name, ns=(0, 0))
+    os.unlink(dataset / DOCS[0])
+
+    stats = mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert stats == {"converted": 1, "unchanged": 1, "failed": 0, "deleted": 1}
+    assert not (out / (DOCS[0] + ".yml")).exists()
+    assert sorted(read_manifest(out)["files"]) == DOCS[1:]
+
+
+def test120_config_change(dataset, tmp_path):
+    """Test that a change in loader config forces reconversion"""
+    out = tmp_path / "output"
+    mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+
+    loader = DocumentLoader(sniff=False)
+    stats = mod.DatasetConverter(loader, dataset, out).run()
+    assert stats["converted"] == 3
+
+
+def test130_failed(dataset, tmp_path):
+    """Test a document that fails conversion"""
+    (dataset / "text" / "bad.docx").write_text("not a Word document")
+    out = tmp_path / "output"
+    stats = mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert stats == {"converted": 3, "unchanged": 0, "failed": 1, "deleted": 0}
+
+    entry = read_manifest(out)["files"]["text/bad.docx"]
+    assert entry["status"] == "error"
+    assert entry["output"] is None
+
+    # Failed documents are retried
+    stats = mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert stats == {"converted": 0, "unchanged": 3, "failed": 1, "deleted": 0}
+
+
+def test140_failed_dump(dataset, tmp_path):
+    """Test a document that fails while it is being written"""
+    rows = b"".join(b"%d,x\n" % n for n in range(20000))
+    (dataset / "bad.csv").write_bytes(b"A,B\n" + rows + b"3,\xff\xfe\n")
+    out = tmp_path / "output"
+    stats = mod.DatasetConverter(DocumentLoader(), dataset, out).run()
+    assert stats == {"converted": 3, "unchanged": 0, "failed": 1, "deleted": 0}
+    assert read_manifest(out)["files"]["bad.csv"]["status"] == "error"
+    assert sorted(p.name for p in out.iterdir()) == \
+        [mod.MANIFEST_NAME, "csv", "msword", "text"]
+
+
+def test150_format_txt(dataset, tmp_path):
+    """Test text output, which is not available for tables"""
+    out = tmp_path / "output"
+    args = Namespace(inputdir=dataset, outputdir=out, config=None,
+                     format="txt", workers=1, content_hash=False, stats=None)
+    mod.main(args)
+    files = read_manifest(out)["files"]
+    entry = files["csv/table-example.csv"]
+    assert entry["status"] == "error" and entry["output"] is None
+    assert entry["error"] == "table documents cannot be written in txt format"
+    assert not (out / "csv" / "table-example.csv.txt").exists()
+    for name in DOCS[1:]:
+        assert files[name]["status"] == "ok"
+        assert (out / (name + ".txt")).is_file()
@@ -0,0 +1,48 @@
+"""
+Check that entry points do not import heavy modules they do not need
+"""
+
+import sys
+import subprocess
+from pathlib import Path
+
+import pytest
+
+
+SRCDIR = Path(__file__).parents[3] / "src"
+
+# Modules that must not be loaded just by importing an entry point
+HEAVY = ["docx", "lxml", "asyncio", "multiprocessing",
+         "pii_preprocess.doc.msoffice.msword"]
+
+
+def imported(module: str):
+    """
+    Import a module in a fresh interpreter, and return the loaded modules
+    """
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], check=True,
+                         capture_output=True, text=True,
+                         env={"PYTHONPATH": str(SRCDIR)})
+    return set(out.stdout.split())
+
+
+@pytest.mark.parametrize("module", [
+    "pii_preprocess.loader",
+    "pii_preprocess.app.doc",
+    "pii_preprocess.app.dataset",
+    "pii_preprocess.app.csvdoc",
+    "pii_preprocess.app.textdoc",
+])
+def test100_no_heavy_imports(module):
+    """Test that entry points do not import format modules eagerly"""
+    got = imported(module)
+    assert module in got
+    assert [m for m in HEAVY if m in got] == []
+
+
+def test110_lazy_formats():
+    """Test that format packages import their modules on demand"""
+    got = imported("pii_preprocess.doc, pii_preprocess.doc.text")
+    assert "pii_preprocess.doc.csv" not in got
+    assert "pii_preprocess.doc.text.load" not in got
@@ -0,0 +1,173 @@
+"""
+Test reading compressed files
+"""
+
+import bz2
+import gzip
+import lzma
+import random
+from pathlib import Path
+
+import pytest
+
+import pii_preprocess.compress as mod
+import pii_preprocess.doc.text.load as textmod
+import pii_preprocess.doc.csv as csvmod
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+TEXTDOC = DATADIR / "text" / "lang" / "en-morus-rubra.txt"
+
+
+def zstd_compress(data: bytes) -> bytes:
+    zstandard = pytest.importorskip("zstandard")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+COMPRESS = {".gz": gzip.compress, ".bz2": bz2.compress, ".xz": lzma.compress,
+            ".zst": zstd_compress}
+
+
+def sample_data() -> bytes:
+    rnd = random.Random(3)
+    return "".join(rnd.choice(["hello ", "wörld\n", "x"*rnd.randint(1, 50),
+                               "\r\n"]) for _ in range(20000)).encode("utf-8")
+
+
+def write(name: Path, data: bytes, member_size: int = None):
+    """
+    Write a compressed file, possibly as several members
+    """
+    compress = COMPRESS[name.suffix]
+    if not member_size:
+        name.write_bytes(compress(data))
+        return
+    name.write_bytes(b"".join(compress(data[i:i+member_size])
+                              for i in range(0, len(data), member_size)))
+
+
+# ----------------------------------------------------------------
+
+
+@pytest.mark.parametrize("ext", list(COMPRESS))
+@pytest.mark.parametrize("readahead", [None, False])
+def test100_open(tmp_path, ext, readahead):
+    """
+    Read compressed files, with & without read-ahead
+    """
+    data = sample_data()
+    name = tmp_path / ("doc.txt" + ext)
+    write(name, data)
+    with mod.open_file(name, "rb", readahead=readahead) as f:
+        assert f.read() == data
+    with mod.open_file(name, encoding="utf-8", readahead=readahead) as f:
+        assert f.read() == data.decode("utf-8").replace("\r\n", "\n")
+
+
+@pytest.mark.parametrize("ext", list(COMPRESS))
+@pytest.mark.parametrize("member_size", [None, 3000, 7001])
+def test110_parallel(tmp_path, monkeypatch, ext, member_size):
+    """
+    Parallel decompression of files with one or many members
+    """
+    monkeypatch.setattr(mod, "RANGE_SIZE", 2000)
+    data = sample_data()
+    name = tmp_path / ("doc.txt" + ext)
+    write(name, data, member_size)
+    with mod.open_file(name, "rb", workers=3) as f:
+        assert f.read() == data
+
+
+def test120_ranges(tmp_path):
+    """
+    Ranges start at member starts
+    """
+    name = tmp_path / "doc.txt.gz"
+    write(name, sample_data(), 5000)
+    codec = mod.file_codec(name)
+    raw = name.read_bytes()
+    ranges = mod.member_ranges(name, codec, 1000)
+    assert len(ranges) > 10
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(raw)
+    for start, end in ranges:
+        assert raw[start:start+3] == codec.magic
+
+
+def test125_false_magic(tmp_path, monkeypatch):
+    """
+    A member signature inside a member is not taken as a member start
+    """
+    chunks = [f"member {n}: ".encode() + b"x"*400 + b"\n" for n in range(12)]
+    chunks[3] = chunks[3][:200] + b"\x1f\x8b\x08" + chunks[3][200:]
+    data = b"".join(chunks)
+    members = [gzip.compress(c, 0) for c in chunks]
+    raw = b"".join(members)
+    name = tmp_path / "doc.txt.gz"
+    name.write_bytes(raw)
+    # Stored members hold the data verbatim
+    fake = raw.find(b"\x1f\x8b\x08", sum(map(len, members[:3])) + 3)
+    monkeypatch.setattr(mod, "RANGE_SIZE", fake - 1)
+    assert mod.member_ranges(name, mod.file_codec(name), fake - 1)[1][0] == fake
+    with mod.open_file(name, "rb", workers=2) as f:
+        assert f.read() == data
+
+
+def test130_corrupt(tmp_path):
+    """
+    Errors in a compressed file are raised
+    """
+    name = tmp_path / "doc.txt.gz"
+    write(name, sample_data(), 5000)
+    data = bytearray(name.read_bytes())
+    data[len(data)//2] ^= 0xff
+    name.write_bytes(data)
+    for workers in (1, 3):
+        with pytest.raises(Exception):
+            with mod.open_file(name, "rb", workers=workers) as f:
+                f.read()
+
+
+def test140_close(tmp_path):
+    """
+    A partially read file can be closed
+    """
+    name = tmp_path / "doc.txt.bz2"
+    write(name, sample_data(), 5000)
+    f = mod.open_file(name, encoding="utf-8")
+    assert f.readline() == sample_data().decode().split("\n")[0] + "\n"
+    f.close()
+    assert not f.buffer.raw.thread.is_alive()
+
+
+@pytest.mark.parametrize("opt", [{}, {"readahead": False},
+                                 {"decompress_workers": 2},
+                                 {"streaming": True, "decompress_workers": 2}],
+                         ids=str)
+def test200_text(tmp_path, monkeypatch, opt):
+    """
+    Read a compressed text document
+    """
+    monkeypatch.setattr(mod, "RANGE_SIZE", 500)
+    name = tmp_path / "doc.txt.gz"
+    write(name, TEXTDOC.read_bytes(), 1000)
+    exp = [c.data for c in textmod.TextSrcDocument(TEXTDOC)]
+    doc = textmod.TextSrcDocument(name, chunk_options=opt)
+    assert [c.data for c in doc] == exp
+
+
+@pytest.mark.parametrize("opt", [{}, {"readahead": False},
+                                 {"decompress_workers": 2},
+                                 {"source_index": True}], ids=str)
+def test210_csv(tmp_path, opt):
+    """
+    Read a compressed CSV document
+    """
+    src = tmp_path / "doc.csv"
+    src.write_text("A,B\n" + "".join(f"{n},ñ{n}\n" for n in range(3000)),
+                   encoding="utf-8")
+    name = tmp_path / "doc.csv.bz2"
+    write(name, src.read_bytes(), 4000)
+    exp = [c.data for c in csvmod.LocalCsvDocument(src)]
+    doc = csvmod.LocalCsvDocument(name, **opt)
+    assert [c.data for c in doc] == exp
@@ -7,6 +7,7 @@ from unittest.mock import Mock
 import pytest
 
 from pii_data.helper.io import load_yaml
+from pii_data.helper.exception import InvArgException
 from pii_data.types.doc.chunker import DocumentChunk
 import pii_data.types.doc.document as docmod
 
@@ -144,6 +145,44 @@ def test125_read_base_block():
     assert exp == got
 
 
+def test126_read_column_block():
+    """Test data read, group rows by columns"""
+    obj = myTestClass1()
+    got = list(obj.iter_column_block(block_size=2))
+    exp = [
+        {"id": "B1", "data": {n: [r[i] for r in DATA[0:2]]
+                              for i, n in enumerate(NAMES)}},
+        {"id": "B2", "data": {n: [DATA[2][i]] for i, n in enumerate(NAMES)}}
+    ]
+    assert exp == got
+
+
+def test127_read_column_block_numpy():
+    """Test data read, group rows by columns as NumPy arrays"""
+    np = pytest.importorskip("numpy")
+    obj = myTestClass1()
+    for array_type in ("object", "str"):
+        got = list(obj.iter_column_block(2, array_type))
+        assert len(got) == 2
+        col = got[0]["data"]["Name"]
+        assert isinstance(col, np.ndarray)
+        assert list(col) == ["John Smith", "Erik Jonsk"]
+
+
+def test128_read_column_block_ragged():
+    """Test data read, group rows by columns, with rows of different size"""
+    obj = myTestClass1()
+    obj.get_base_iter = lambda: iter([["a", "b"], ["c"], ["d", "e", "f", "g",
+                                                          "h", "i", "j"]])
+    got = next(iter(obj.iter_column_block(5)))["data"]
+    assert list(got) == NAMES + [7]
+    assert got["Date"] == ["a", "c", "d"]
+    assert got["Name"] == ["b", "", "e"]
+    assert got[7] == ["", "", "j"]
+    with pytest.raises(InvArgException):
+        next(iter(obj.iter_column_block(5, "float")))
+
+
 def test130_read_chunks():
     """Test data read, in chunks"""
     obj = myTestClass1()
@@ -270,6 +309,63 @@ def test320_ctx_manager():
     assert exp == got
 
 
+def test330_columns():
+    """Test column selection, by name and number"""
+    filename = fname("table-example.csv")
+    for columns in (["Name", "Description"], [2, 6], ["Name", 6]):
+        obj = mod.LocalCsvDocument(filename, columns=columns)
+        assert obj.metadata["column"]["name"] == ["Name", "Description"]
+        got = list(obj.iter_base())
+        exp = [{"id": f"R{n}", "data": [e[1], e[5]]}
+               for n, e in enumerate(DATA, start=1)]
+        assert exp == got
+        chunks = list(obj)
+        assert [c.data for c in chunks[:2]] == [DATA[0][1], DATA[0][5]]
+        assert chunks[1].context["column"] == {"number": 2,
+                                               "name": "Description"}
+
+
+def test331_columns_noheader():
+    """Test column selection, with no header row"""
+    obj = mod.LocalCsvDocument(fname("table-example.csv"), csv_header=False,
+                               columns=[3, 1, 9])
+    assert "column" not in obj.metadata
+    got = [r["data"] for r in obj.iter_base()]
+    assert got[0] == ["Credit Card", "Date", ""]
+    assert got[1:] == [[e[2], e[0], ""] for e in DATA]
+    with pytest.raises(InvArgException):
+        mod.LocalCsvDocument(fname("table-example.csv"), csv_header=False,
+                             columns=["Name"])
+
+
+def test332_columns_invalid():
+    """Test an invalid column selection"""
+    for columns in (["Unknown"], [0]):
+        with pytest.raises(InvArgException):
+            mod.LocalCsvDocument(fname("table-example.csv"), columns=columns)
+
+
+def test333_row_filter():
+    """Test a row filter: rows keep their original number"""
+    obj = mod.LocalCsvDocument(fname("table-example.csv"), columns=["Amount"],
+                               row_filter=lambda r: r[3] == "USD")
+    got = list(obj.iter_base())
+    assert got == [{"id": "R1", "data": ["12.39"]},
+                   {"id": "R3", "data": ["339.99"]}]
+    blocks = list(obj.iter_base_block(5))
+    assert blocks == [{"id": "B1", "data": [["12.39"], ["339.99"]]}]
+
+
+def test334_row_filter_name(tmp_path):
+    """Test a row filter given by name"""
+    name = tmp_path / "doc.csv"
+    name.write_text("A,B\n1,2\n\n,\n3,4\n")
+    obj = mod.LocalCsvDocument(name, row_filter="builtins.any")
+    got = list(obj.iter_base())
+    assert got == [{"id": "R1", "data": ["1", "2"]},
+                   {"id": "R4", "data": ["3", "4"]}]
+
+
 def test400_read_chunks():
     """Test document chunks"""
     filename = fname("table-example.csv")
@@ -0,0 +1,153 @@
+"""
+Test parallel parsing of CSV files: the rows (and their ids) must be
+identical to the ones from sequential parsing
+"""
+
+import csv
+import random
+
+import pytest
+
+import pii_preprocess.doc.csv as mod
+import pii_preprocess.doc.csv_parallel as parmod
+from pii_preprocess.doc.srcindex import source_index
+
+
+# Fragments to build random fields: quotes, delimiters, newlines (also within
+# quoted fields), multibyte characters
+PIECES = ["abc", "ñandú", "日本", " ", ",", '"', '""', "\n", "\r\n", "x"*30,
+          "1.5", ""]
+
+
+def random_csv(rnd: random.Random, nrows: int, line_end: str = "\n") -> str:
+    """
+    Build a random well-formed CSV text
+    """
+    rows = []
+    for _ in range(nrows):
+        row = ["".join(rnd.choices(PIECES, k=rnd.randint(0, 4)))
+               for _ in range(rnd.randint(1, 5))]
+        rows.append(row)
+    out = []
+    for row in rows:
+        fields = ['"' + f.replace('"', '""') + '"'
+                  if any(c in f for c in ',"\r\n') or rnd.random() < 0.2
+                  else f for f in row]
+        out.append(",".join(fields) + line_end)
+    return "".join(out)
+
+
+def read(name, **kwargs):
+    doc = mod.LocalCsvDocument(name, **kwargs)
+    return [(r["id"], r["data"]) for r in doc.iter_base()], doc
+
+
+# ----------------------------------------------------------------
+
+
+def test100_record_ranges(tmp_path):
+    """
+    Ranges start after a newline outside quotes
+    """
+    name = tmp_path / "doc.csv"
+    name.write_bytes(b'a,b\n"1\n2\n3",x\n4,y\n5,z\n')
+    ranges = parmod.record_ranges(name, b'"', [1, 0, 1, 0], 5)
+    assert ranges == [(0, 14), (14, 18), (18, 22)]
+    ranges = parmod.record_ranges(name, None, [0]*4, 5)
+    assert ranges == [(0, 7), (7, 14), (14, 18), (18, 22)]
+
+
+def test110_parse_range(tmp_path):
+    """
+    A range that does not end at a record boundary is detected
+    """
+    name = tmp_path / "doc.csv"
+    name.write_bytes(b'a,b\n"1\n2\n3",x\n')
+    rows, pos, nlines = parmod._parse_range(name, 0, 4, False, {}, True)
+    assert list(parmod.unpack_rows(rows)) == [["a", "b"]]
+    assert list(pos) == [1, 0] and nlines == 1
+    assert parmod._parse_range(name, 0, 7, False, {}, True) is None
+    rows, _, _ = parmod._parse_range(name, 4, 15, True, {}, False)
+    assert list(parmod.unpack_rows(rows)) == [["1\n2\n3", "x"]]
+
+
+def test120_pack_rows():
+    """
+    Pack rows into a string
+    """
+    for rows in ([], [[]], [[""]], [[], ["a", ""], [], ["\ufdd1", "b"]]):
+        packed = parmod.pack_rows(rows)
+        assert list(parmod.unpack_rows(packed)) == rows
+    assert parmod.pack_rows([["a", 1.5]]) is None
+
+
+@pytest.mark.parametrize("opt", [{}, {"csv_header": False},
+                                 {"source_index": True}], ids=str)
+@pytest.mark.parametrize("line_end", ["\n", "\r\n"], ids=repr)
+def test200_random(tmp_path, opt, line_end):
+    """
+    Parallel parsing of random documents, with small ranges
+    """
+    rnd = random.Random(7)
+    name = tmp_path / "doc.csv"
+    for _ in range(5):
+        name.write_text(random_csv(rnd, rnd.randint(1, 200), line_end),
+                        encoding="utf-8", newline="")
+        exp, doc1 = read(name, **opt)
+        got, doc2 = read(name, workers=2, range_size=rnd.randint(1, 300),
+                         **opt)
+        assert got == exp
+        if opt.get("source_index"):
+            assert list(source_index(doc2)) == list(source_index(doc1))
+
+
+@pytest.mark.parametrize("csv_options", [
+    {"delimiter": ";"},
+    {"quoting": csv.QUOTE_NONE},
+    {"quoting": csv.QUOTE_NONNUMERIC},
+], ids=str)
+def test210_dialects(tmp_path, csv_options):
+    """
+    Parallel parsing with other CSV dialects
+    """
+    name = tmp_path / "doc.csv"
+    if csv_options.get("quoting") == csv.QUOTE_NONNUMERIC:
+        text = "".join(f'"r{n}",{n}\n"a\n""b",-{n}.5\n' for n in range(200))
+    else:
+        text = "".join(f'r{n};"a,b";ñ"c\n' for n in range(200))
+    name.write_text(text, encoding="utf-8")
+    exp, _ = read(name, csv_options=csv_options)
+    got, _ = read(name, csv_options=csv_options, workers=3, range_size=50)
+    assert got == exp
+
+
+def test220_malformed(tmp_path):
+    """
+    Stray quotes break the quote parity; the wrong boundaries are detected
+    and parsing falls back to sequential
+    """
+    name = tmp_path / "doc.csv"
+    text = "".join(f'{n},"a\nb",c\n' for n in range(100))
+    text += 'x,stray"quote\n' + "".join(f'{n},"a\nb",c\n' for n in range(100))
+    name.write_text(text, encoding="utf-8")
+    for opt in ({}, {"source_index": True}):
+        exp, doc1 = read(name, **opt)
+        got, doc2 = read(name, workers=2, range_size=64, **opt)
+        assert got == exp
+        if opt:
+            assert list(source_index(doc2)) == list(source_index(doc1))
+
+
+def test230_no_parallel(tmp_path):
+    """
+    Small files and dialects with an escape character are parsed sequentially
+    """
+    name = tmp_path / "doc.csv"
+    name.write_text('a,b\n1,"x\\"\ny"\n2,z\n', encoding="utf-8")
+    doc = mod.LocalCsvDocument(name, workers=2)
+    assert not doc._use_parallel()
+    opt = {"escapechar": "\\", "doublequote": False}
+    exp, _ = read(name, csv_options=opt)
+    doc = mod.LocalCsvDocument(name, csv_options=opt, workers=2, range_size=4)
+    assert not doc._use_parallel()
+    assert [(r["id"], r["data"]) for r in doc.iter_base()] == exp
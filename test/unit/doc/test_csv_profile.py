@@ -0,0 +1,208 @@
+"""
+Test sampled column profiling for CSV files
+"""
+
+import gzip
+import random
+
+import pytest
+
+from pii_data.helper.exception import InvArgException
+
+import pii_preprocess.doc.csv as mod
+import pii_preprocess.doc.csv_profile as prof
+
+
+def write_csv(name, nrows: int = 300, seed: int = 5):
+    """
+    Write a CSV file with quoted fields containing newlines
+    """
+    rnd = random.Random(seed)
+    rows = ["id,name,phone,notes\r\n"]
+    for n in range(1, nrows + 1):
+        phone = f"{rnd.randint(100, 999)}-{rnd.randint(1000, 9999)}"
+        notes = rnd.choice(["", "ok", '"two\r\nlines"', '"a, ""b"""'])
+        rows.append(f"{n},{rnd.choice(['Ann', 'Bob', 'Eve'])},{phone},{notes}\r\n")
+    name.write_bytes("".join(rows).encode("utf-8"))
+
+
+def all_rows(name, **kwargs):
+    return [r["data"] for r in mod.LocalCsvDocument(name, **kwargs).iter_base()]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_shape():
+    """
+    Value shapes
+    """
+    assert prof.value_shape("Ab-12") == "Aa-99"
+    assert prof.value_shape("ñandú 3") == "aaaaa 9"
+    assert prof.value_shape("x"*30) == "a"*prof.SHAPE_LENGTH + "…"
+
+
+def test110_column_profile():
+    """
+    Statistics for a column
+    """
+    got = prof.column_profile(["12-34", "56-78", "", "ab"])
+    assert got == {
+        "count": 4,
+        "empty_ratio": 0.25,
+        "length": {"min": 2, "max": 5, "mean": 4.0},
+        "digit_ratio": 0.6667,
+        "alpha_ratio": 0.1667,
+        "distinct_ratio": 1.0,
+        "shapes": [{"shape": "99-99", "ratio": 0.6667},
+                   {"shape": "aa", "ratio": 0.3333}]
+    }
+    assert prof.column_profile(["", ""]) == {"count": 2, "empty_ratio": 1}
+    assert prof.profile_columns([["a", "1"], ["b"]])[1]["empty_ratio"] == 0.5
+
+
+def test120_reservoir():
+    """
+    Reservoir sampling
+    """
+    rnd = random.Random(1)
+    sample = prof.reservoir_sample(iter(range(1000)), 50, rnd)
+    assert len(sample) == 50 and len(set(sample)) == 50
+    assert max(sample) > 500
+    assert prof.reservoir_sample(iter(range(10)), 50, rnd) == list(range(10))
+    sample = prof.reservoir_sample(iter(range(1000)), 50, rnd, max_rows=100)
+    assert max(sample) < 100
+
+
+@pytest.mark.parametrize("method", ["reservoir", "seek"])
+def test200_profile(tmp_path, method):
+    """
+    Profile a document, and store the profile in its metadata
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    doc = mod.LocalCsvDocument(name)
+    got = doc.profile(size=100, method=method, seed=3)
+    assert doc.metadata["column"]["name"] == ["id", "name", "phone", "notes"]
+    assert doc.metadata["column"]["profile"] == got
+    assert len(got) == 4
+    assert got[0]["count"] == 100
+    assert got[0]["digit_ratio"] == 1.0
+    assert got[2]["shapes"] == [{"shape": "999-9999", "ratio": 1.0}]
+    assert got[1]["distinct_ratio"] == 0.03
+
+
+def test210_seek(tmp_path):
+    """
+    Rows sampled by seeking are real rows, also for fields with newlines
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name, 2000)
+    rows = all_rows(name)
+    sample = prof.seek_sample(str(name), None, 200, random.Random(7), 4)
+    assert len(sample) == 200
+    assert all(r in rows for r in sample)
+    assert len(set(r[0] for r in sample)) > 100
+
+
+class LowRandom(random.Random):
+    """
+    A random generator whose first random position is the lowest one
+    """
+    def randrange(self, start, *args):
+        if not getattr(self, "used", False):
+            self.used = True
+            return start
+        return super().randrange(start, *args)
+
+
+def test215_seek_first(tmp_path):
+    """
+    Without a header, the first row can be sampled by seeking
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name, 50)
+    raw = name.read_bytes()
+    name.write_bytes(raw[raw.index(b"\n") + 1:])
+    sample = prof.seek_sample(str(name), None, 10, LowRandom(3), 4,
+                              header=False)
+    assert sample[0][0] == "1"
+    # With a header, the header row is never sampled
+    write_csv(name, 50)
+    sample = prof.seek_sample(str(name), None, 10, LowRandom(3), 4)
+    assert sample[0][0] == "1"
+
+
+def test220_seek_index(tmp_path):
+    """
+    Seeking with a row index: the sample covers rows between indexed rows
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name, 2000)
+    rows = all_rows(name)
+    doc = mod.LocalCsvDocument(name, row_index=500)
+    list(doc.iter_base())
+    assert doc.row_index.complete
+    assert len(doc.row_index.boundaries()) == 4
+    sample = prof.seek_sample(str(name), None, 200, random.Random(7), None,
+                              doc.row_index)
+    assert len(sample) == 200
+    assert all(r in rows for r in sample)
+    ids = [int(r[0]) for r in sample]
+    assert len(set(ids)) == 200
+    assert sum((n - 1) % 500 >= prof.SEEK_ROWS for n in ids) > 150
+    got = doc.profile(size=200, method="seek", seed=2)
+    assert got[0]["count"] == 200
+
+    # A sample larger than the file holds all its rows
+    sample = prof.seek_sample(str(name), None, 5000, random.Random(7), None,
+                              doc.row_index)
+    assert sorted(sample, key=lambda r: int(r[0])) == rows
+
+
+def test230_auto(tmp_path, monkeypatch):
+    """
+    Automatic choice of the sampling method
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name, 2000)
+    called = []
+    orig = prof.seek_sample
+    monkeypatch.setattr(prof, "seek_sample",
+                        lambda *a: called.append(1) or orig(*a))
+    mod.LocalCsvDocument(name).profile(size=50)
+    assert not called
+    monkeypatch.setattr(prof, "SEEK_MIN_SIZE", 1000)
+    got = mod.LocalCsvDocument(name).profile(size=50)
+    assert called and got[0]["count"] == 50
+
+
+def test240_projection(tmp_path):
+    """
+    The profile follows column selection and row filtering
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    for method in ("reservoir", "seek"):
+        doc = mod.LocalCsvDocument(name, columns=["phone", "name"],
+                                   row_filter=lambda r: r[1] == "Bob")
+        got = doc.profile(size=50, method=method, seed=1)
+        assert len(got) == 2
+        assert got[0]["shapes"][0]["shape"] == "999-9999"
+        assert got[1]["shapes"] == [{"shape": "Aaa", "ratio": 1.0}]
+
+
+def test250_compressed(tmp_path):
+    """
+    Compressed files are sampled in a single pass
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    gzname = tmp_path / "doc.csv.gz"
+    gzname.write_bytes(gzip.compress(name.read_bytes()))
+    doc = mod.LocalCsvDocument(gzname)
+    assert doc.profile(size=20)[0]["count"] == 20
+    with pytest.raises(InvArgException):
+        doc.profile(method="seek")
+    with pytest.raises(InvArgException):
+        doc.profile(method="other")
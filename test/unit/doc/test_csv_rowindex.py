@@ -0,0 +1,153 @@
+"""
+Test the row-offset index for CSV files, and random access to rows
+"""
+
+import os
+import gzip
+import random
+
+import pytest
+
+import pii_preprocess.doc.csv as mod
+from pii_preprocess.doc.csv_rowindex import RowIndex, ROWINDEX_SUFFIX, \
+    index_ranges
+
+
+def write_csv(name, nrows: int = 100, seed: int = 5):
+    """
+    Write a CSV file with quoted fields containing newlines
+    """
+    rnd = random.Random(seed)
+    rows = ["A,B,C\r\n"]
+    for n in range(1, nrows + 1):
+        text = rnd.choice(["x", "ñandú", '"a\r\nb"', '"1,""2"""', ""])
+        rows.append(f"{n},{text},{rnd.randint(0, 9)}\r\n")
+    name.write_bytes("".join(rows).encode("utf-8"))
+
+
+def rows(doc, **kwargs):
+    it = doc.get_rows(**kwargs) if kwargs else doc.iter_base()
+    return [(r["id"], r["data"]) for r in it]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_index():
+    """
+    Only one every K rows is indexed
+    """
+    idx = RowIndex("doc.csv", 10)
+    for n in range(1, 36):
+        idx.add(n, n*100)
+    assert idx.boundaries() == [100, 1100, 2100, 3100]
+    assert idx.seek(1) == (1, 100)
+    assert idx.seek(10) == (1, 100)
+    assert idx.seek(11) == (11, 1100)
+    assert idx.seek(500) == (31, 3100)
+    assert RowIndex("doc.csv", 10).seek(5) == (1, None)
+
+
+def test110_ranges():
+    """
+    Ranges built from known boundaries
+    """
+    assert index_ranges([10, 15, 30, 41, 45], 50, 10) == \
+        [(0, 10), (10, 30), (30, 41), (41, 50)]
+    assert index_ranges([], 50, 10) == [(0, 50)]
+
+
+def test200_build(tmp_path):
+    """
+    The index is built in the first pass, stored and reused
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    doc = mod.LocalCsvDocument(name, row_index=7)
+    assert not doc.row_index.complete
+    exp = rows(doc)
+    assert doc.row_index.complete and doc.row_index.rows == 100
+    assert len(doc.row_index.boundaries()) == 15
+    assert os.path.exists(str(name) + ROWINDEX_SUFFIX)
+
+    # Reused by a new document
+    doc = mod.LocalCsvDocument(name, row_index=7)
+    assert doc.row_index.complete
+    assert rows(doc) == exp
+
+    # Not reused with a different step, or different parsing options
+    assert not mod.LocalCsvDocument(name, row_index=8).row_index.complete
+    doc = mod.LocalCsvDocument(name, row_index=7, csv_header=False)
+    assert not doc.row_index.complete
+
+
+def test210_stale(tmp_path):
+    """
+    A sidecar for a modified file is not used
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    list(mod.LocalCsvDocument(name, row_index=7).iter_base())
+    write_csv(name, 120)
+    os.utime(name, ns=(0, 0))
+    doc = mod.LocalCsvDocument(name, row_index=7)
+    assert not doc.row_index.complete
+
+
+@pytest.mark.parametrize("opt", [{}, {"columns": ["C", "A"]},
+                                 {"row_filter": lambda r: r[2] > "4"}],
+                         ids=["all", "columns", "filter"])
+def test220_get_rows(tmp_path, opt):
+    """
+    Row ranges are the same with and without the index
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    full = rows(mod.LocalCsvDocument(name, **opt))
+    doc = mod.LocalCsvDocument(name, row_index=7, **opt)
+    for start, stop in ((1, 5), (50, 60), (14, 15), (15, None), (99, 200),
+                        (0, 3), (30, 20)):
+        exp = [r for r in full
+               if int(r[0][1:]) >= start and (stop is None or
+                                              int(r[0][1:]) < stop)]
+        # Without index, and with index
+        assert rows(doc, start=start, stop=stop) == exp
+        if not doc.row_index.complete:
+            rows(doc)
+        assert rows(doc, start=start, stop=stop) == exp
+
+
+def test230_parallel(tmp_path):
+    """
+    The index is built and used by parallel parsing
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name, 500)
+    exp = rows(mod.LocalCsvDocument(name))
+    doc = mod.LocalCsvDocument(name, row_index=20, workers=2, range_size=300)
+    assert rows(doc) == exp
+    assert doc.row_index.complete
+    assert len(doc.row_index.boundaries()) == 25
+    seq = mod.LocalCsvDocument(name, row_index=20, source_index=True)
+    os.unlink(str(name) + ROWINDEX_SUFFIX)
+    seq.row_index.reset()
+    rows(seq)
+    assert seq.row_index.boundaries() == doc.row_index.boundaries()
+
+    doc = mod.LocalCsvDocument(name, row_index=20, workers=2, range_size=300)
+    assert doc.row_index.complete
+    assert rows(doc) == exp
+
+
+def test240_compressed(tmp_path):
+    """
+    Compressed files have no row index
+    """
+    name = tmp_path / "doc.csv"
+    write_csv(name)
+    gzname = tmp_path / "doc.csv.gz"
+    gzname.write_bytes(gzip.compress(name.read_bytes()))
+    doc = mod.LocalCsvDocument(gzname, row_index=True)
+    assert doc.row_index is None
+    assert rows(doc, start=10, stop=12) == rows(mod.LocalCsvDocument(name),
+                                                start=10, stop=12)
@@ -0,0 +1,193 @@
+"""
+Test the chunk source indexes
+"""
+
+from pathlib import Path
+
+import pytest
+
+import pii_preprocess.doc.text.load as textmod
+import pii_preprocess.doc.csv as csvmod
+import pii_preprocess.doc.msoffice.msword as wordmod
+from pii_preprocess.doc.srcindex import SourceIndex, source_index
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+TEXTDOCS = sorted((DATADIR / "text" / "lang").glob("*.txt"))
+
+
+def check_text_index(name: Path, doc):
+    """
+    Check that the index entries point to the chunks, both in the decoded
+    text and in the raw file
+    """
+    text = name.read_text(encoding="utf-8")
+    raw = name.read_bytes()
+    chunks = [c.data for c in doc]
+    index = source_index(doc)
+    assert index.complete
+    assert len(index) == len(chunks)
+    for chunk, entry in zip(chunks, index):
+        start = entry["offset"]
+        assert text[start:start + entry["length"]] == chunk
+        start = entry["byte_offset"]
+        assert raw[start:start + entry["byte_length"]].decode() == chunk
+    return index
+
+
+# ----------------------------------------------------------------
+
+
+def test100_index():
+    """
+    Index with implicit & explicit ids
+    """
+    index = SourceIndex("csv")
+    index.add(None, 1, 2, 0)
+    index.add(None, 2, 3, 10)
+    assert index.get("2") == {"id": "2", "row": 2, "line": 3, "byte_offset": 10}
+    assert index.get("1")["row"] == 1
+    assert index.get("0") is None and index.get("3") is None
+    index.add("R9", 9, 9, 90)
+    assert index.get("2")["row"] == 2
+    assert index.get("R9") == {"id": "R9", "row": 9, "line": 9,
+                               "byte_offset": 90}
+    assert index.get("R8") is None
+    assert len(index) == 3
+    index.reset()
+    assert len(index) == 0 and not index.complete
+
+
+@pytest.mark.parametrize("name", TEXTDOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("opt", [
+    {"mode": "single"},
+    {"mode": "line"},
+    {"mode": "word", "max_words": 7},
+    {"mode": "paragraph", "eos": True, "max_words": 20},
+    {"mode": "paragraph", "max_words": 20, "streaming": True},
+    {"mode": "word", "streaming": True, "block_size": 33},
+    {"mode": "line", "streaming": True},
+    {"mode": "paragraph", "mmap": True}
+], ids=str)
+def test200_text(name, opt):
+    """
+    Text documents, in all reading modes
+    """
+    doc = textmod.TextSrcDocument(name, chunk_options={"source_index": True,
+                                                       **opt})
+    index = check_text_index(name, doc)
+    # A second iteration leaves the index as it is
+    entries = list(index)
+    assert len(list(doc)) == len(entries)
+    assert list(index) == entries
+
+
+@pytest.mark.parametrize("opt", [
+    {"mode": "line"},
+    {"mode": "paragraph"},
+    {"mode": "word", "max_words": 7},
+    {"mode": "line", "streaming": True},
+    {"mode": "paragraph", "mmap": True}
+], ids=str)
+def test205_text_get(opt):
+    """
+    Index entries are found by chunk id
+    """
+    name = TEXTDOCS[0]
+    text = name.read_text(encoding="utf-8")
+    doc = textmod.TextSrcDocument(name, chunk_options={"source_index": True,
+                                                       **opt})
+    chunks = list(doc)
+    index = source_index(doc)
+    for chunk in chunks:
+        entry = index.get(chunk.id)
+        assert entry["id"] == chunk.id
+        start = entry["offset"]
+        assert text[start:start + entry["length"]] == chunk.data
+    assert index.get(str(int(chunks[-1].id) + 1)) is None
+
+
+def test210_text_tree():
+    """
+    Tree text documents: the index holds the stripped chunk text
+    """
+    name = DATADIR / "text" / "doc-example.txt"
+    doc = textmod.TextSrcDocument(name, chunk_options={"mode": "tree",
+                                                       "source_index": True})
+    text = name.read_text(encoding="utf-8")
+    chunks = {c.id: c.data for c in doc.iter_full()}
+    index = source_index(doc)
+    assert len(index) == len(chunks)
+    for entry in index:
+        start = entry["offset"]
+        assert text[start:start+entry["length"]] == chunks[entry["id"]]
+
+
+def test220_text_noindex():
+    """
+    No index unless requested
+    """
+    doc = textmod.TextSrcDocument(TEXTDOCS[0])
+    assert source_index(doc) is None
+
+
+def test300_csv(tmp_path):
+    """
+    CSV documents, with rows spanning several lines
+    """
+    name = tmp_path / "doc.csv"
+    name.write_bytes('A,B\r\n1,"x\r\ny"\r\n2,ñ\r\n3,"z\nz"\n4,w\n'.encode())
+    exp = [c.data for c in csvmod.LocalCsvDocument(name)]
+    doc = csvmod.LocalCsvDocument(name, source_index=True)
+    assert [c.data for c in doc] == exp
+    index = source_index(doc)
+    assert index.complete
+    assert [(e["id"], e["row"], e["line"]) for e in index] == \
+        [("R1", 1, 2), ("R2", 2, 4), ("R3", 3, 5), ("R4", 4, 7)]
+    raw = name.read_bytes()
+    assert [raw[e["byte_offset"]:e["byte_offset"]+1] for e in index] == \
+        [b"1", b"2", b"3", b"4"]
+
+
+def test400_docx():
+    """
+    Word documents, as tree & sequence
+    """
+    name = DATADIR / "msword" / "example-headings.docx"
+    for tree in (True, False):
+        doc = wordmod.MsWordDocument(name, tree=tree, source_index=True)
+        chunks = {c.id: c.data for c in doc.iter_full()}
+        index = source_index(doc)
+        assert index.complete
+        assert len(index) == len(chunks)
+        para = doc.doc.paragraphs
+        for entry in index:
+            first = para[entry["paragraph"]].text
+            assert chunks[entry["id"]].startswith(first)
+
+
+def test410_docx_option():
+    """
+    The Word source index option is parsed as a boolean
+    """
+    name = DATADIR / "msword" / "example-headings.docx"
+    for value, exp in (("false", False), ("true", True), (False, False)):
+        doc = wordmod.MsWordDocument(name, tree=False, source_index=value)
+        assert (source_index(doc) is not None) == exp
+
+
+def test500_serialize(tmp_path):
+    """
+    An index can be rebuilt from its serialized version
+    """
+    name = tmp_path / "doc.csv"
+    name.write_text("A,B\n1,x\n2,y\n", encoding="utf-8")
+    doc = csvmod.LocalCsvDocument(name, source_index=True)
+    list(doc)
+    index = source_index(doc)
+    index2 = SourceIndex.from_dict(index.as_dict())
+    assert index2.complete
+    assert list(index2) == list(index)
+    assert index2.get("R2") == index.get("R2")
+
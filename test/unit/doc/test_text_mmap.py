@@ -0,0 +1,112 @@
+"""
+Test reading plain text files as memory-mapped documents
+"""
+
+from pathlib import Path
+
+import pytest
+
+import pii_preprocess.doc.text.load as mod
+from pii_preprocess.doc.text.read.base import BaseReader
+from pii_preprocess.doc.text.read.read_mmap import OffsetChunks, decode_blocks
+from pii_preprocess.doc.text.read.read_words import StreamWordSplitter
+from pii_preprocess.doc.text.read.read_para import ParagraphReader
+
+
+DATADIR = Path(__file__).parents[2] / "data" / "text" / "lang"
+
+DOCS = sorted(DATADIR.glob("*.txt"))
+
+OPTIONS = [
+    {"mode": "word", "max_words": 11},
+    {"mode": "line"},
+    {"mode": "paragraph"},
+    {"mode": "paragraph", "eos": True, "min_words": 10, "max_words": 30}
+]
+
+
+def chunks(filename: Path, **opt):
+    """
+    Read a document and return its chunk data
+    """
+    doc = mod.TextSrcDocument(filename, chunk_options=opt)
+    return [c.data for c in doc]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_use_mmap(tmp_path):
+    """
+    Check the decision to use a memory-mapped document
+    """
+    name = DOCS[0]
+    assert BaseReader().use_mmap(name) is False
+    assert BaseReader({"mmap": True}).use_mmap(name) is True
+    assert BaseReader({"mmap": True}).use_mmap(name, "utf-16") is False
+    assert BaseReader({"mmap": True}).use_mmap(tmp_path / "a.txt.gz") is False
+
+
+def test110_decode_blocks():
+    """
+    Byte offsets for decoded blocks, with characters split across blocks
+    """
+    buf = "añ€b😀c".encode("utf-8")
+    blocks = list(decode_blocks(buf, "utf-8", 2))
+    assert "".join(b[2] for b in blocks) == "añ€b😀c"
+    for cpos, bpos, text in blocks:
+        assert buf[bpos:].decode("utf-8").startswith(text)
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("opt", OPTIONS, ids=str)
+def test200_chunks(name, opt):
+    """
+    Chunks are identical to in-memory ones, in the first iteration (from the
+    splitter) and in the next ones (from the offsets)
+    """
+    exp = chunks(name, **opt)
+    doc = mod.TextSrcDocument(name, chunk_options={"mmap": True,
+                                                   "block_size": 61, **opt})
+    assert [c.data for c in doc] == exp
+    assert [c.data for c in doc] == exp
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+def test210_offsets(name):
+    """
+    Chunk offsets point to the chunk bytes in the file
+    """
+    data = name.read_bytes()
+    ck = OffsetChunks(name, lambda b: StreamWordSplitter(b, {}), block_size=5)
+    exp = list(ck)
+    assert len(ck.offsets) == 2*len(exp)
+    for n, chunk in enumerate(exp):
+        start, end = ck.offsets[2*n:2*n+2]
+        assert data[start:end].decode("utf-8") == chunk
+
+
+def test220_abandoned(tmp_path):
+    """
+    Offsets are stored only after a complete iteration
+    """
+    ck = OffsetChunks(DOCS[0], lambda b: StreamWordSplitter(b, {}))
+    next(iter(ck))
+    assert ck.offsets is None
+    list(ck)
+    assert ck.offsets is not None
+
+
+@pytest.mark.parametrize("data", ["", "\ufeffone two\n\nthree\n"])
+def test230_special(data, tmp_path):
+    """
+    Empty files, and files with a BOM
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text(data, encoding="utf-8")
+    for encoding in ("utf-8", "utf-8-sig"):
+        doc = ParagraphReader({}).read(name, encoding)
+        exp = [c.data for c in doc]
+        doc = ParagraphReader({"mmap": True}).read(name, encoding)
+        assert [c.data for c in doc] == exp
+        assert [c.data for c in doc] == exp
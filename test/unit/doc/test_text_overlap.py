@@ -0,0 +1,102 @@
+"""
+Test text chunks with overlapping context
+"""
+
+import re
+from pathlib import Path
+
+import pytest
+
+from pii_data.helper.exception import InvArgException
+
+import pii_preprocess.doc.text.load as mod
+from pii_preprocess.doc.text.read.overlap import ContextWindows, \
+    head_words, tail_words
+
+
+DATADIR = Path(__file__).parents[2] / "data" / "text" / "lang"
+
+DOCS = sorted(DATADIR.glob("*.txt"))
+
+
+def read(filename: Path, **opt):
+    doc = mod.TextSrcDocument(filename, chunk_options=opt)
+    return list(doc.iter_struct())
+
+
+def nwords(text: str) -> int:
+    return len(re.findall(r"\w+", text))
+
+
+# ----------------------------------------------------------------
+
+
+def test100_cut():
+    """
+    Cut texts at word boundaries
+    """
+    text = " one, two  three. "
+    assert head_words(text, 2) == " one, two"
+    assert head_words(text, 5) == text
+    assert head_words(text, 0) == ""
+    assert tail_words(text, 2) == "two  three. "
+    assert tail_words(text, 5) == text
+    assert tail_words(text, 0) == ""
+
+
+def test110_windows():
+    """
+    Context taken from several neighbouring chunks
+    """
+    chunks = ["a b ", "c ", "d ", "e f g ", "h"]
+    got = list(ContextWindows(chunks, 2))
+    assert [c["data"] for c in got] == \
+        ["a b c d", "a b c d e", "b c d e f", "c d e f g h", "f g h"]
+    assert [c["context"]["core"] for c in got] == [
+        {"start": 0, "end": 4}, {"start": 4, "end": 6},
+        {"start": 4, "end": 6}, {"start": 4, "end": 10},
+        {"start": 4, "end": 5}]
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("opt", [
+    {"mode": "word", "max_words": 20},
+    {"mode": "paragraph", "max_words": 50},
+    {"mode": "paragraph", "max_words": 50, "streaming": True},
+    {"mode": "token", "max_tokens": 100},
+], ids=str)
+def test200_overlap(name, opt):
+    """
+    The chunk core is the chunk without overlap, and the context is the
+    text around it
+    """
+    overlap = 5
+    exp = [c["data"] for c in read(name, **opt)]
+    if opt["mode"] == "token":
+        opt = {**opt, "max_tokens": opt["max_tokens"] + 2*overlap}
+    got = read(name, overlap=overlap, **opt)
+    assert len(got) == len(exp)
+    for n, (chunk, core) in enumerate(zip(got, exp)):
+        data = chunk["data"]
+        pos = chunk["context"]["core"]
+        assert data[pos["start"]:pos["end"]] == core
+        prev = "".join(exp[:n])
+        assert prev.endswith(data[:pos["start"]])
+        assert "".join(exp[n+1:]).startswith(data[pos["end"]:])
+        # The context is the full overlap, unless we are at the document edge
+        if opt["mode"] != "token" and len(prev) > 100:
+            assert nwords(data[:pos["start"]]) == overlap
+
+
+def test210_token_budget():
+    """
+    In token mode, chunks plus context fit the token budget
+    """
+    for name in DOCS:
+        got = read(name, mode="token", max_tokens=60, overlap=10)
+        assert all(len(c["data"])/4 <= 60 for c in got)
+
+
+def test220_token_invalid():
+    with pytest.raises(InvArgException):
+        read(DOCS[0], mode="token", max_tokens=20, overlap=10)
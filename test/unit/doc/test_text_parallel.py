@@ -0,0 +1,138 @@
+"""
+Test parallel chunking of text files: the output must be identical to the
+one from sequential reading
+"""
+
+import random
+from pathlib import Path
+
+import pytest
+
+import pii_preprocess.doc.text.load as mod
+from pii_preprocess.doc.srcindex import source_index
+from pii_preprocess.doc.text.read.parallel import boundary_finder, \
+    find_boundary, byte_ranges
+
+
+DATADIR = Path(__file__).parents[2] / "data" / "text" / "lang"
+
+DOCS = sorted(DATADIR.glob("*.txt"))
+
+OPTIONS = [
+    {"mode": "line"},
+    {"mode": "paragraph"},
+    {"mode": "paragraph", "eos": True},
+    {"mode": "paragraph", "max_words": 5},
+    {"mode": "paragraph", "min_words": 4},
+    {"mode": "paragraph", "min_words": 3, "max_words": 7, "eos": True},
+    {"mode": "word", "max_words": 1},
+    {"mode": "word", "max_words": 7},
+]
+
+# Fragments to build random documents, with multibyte characters, blank lines
+# with spaces and Unicode whitespace
+PIECES = ["word", "ñandú", "日本語", "x", " ", "  ", ".", "!", ",", "\n",
+          "\n\n", " \n \n", "\t", "　", "…", "a1", "--", "\xa0"]
+
+
+def chunks(filename: Path, **opt):
+    doc = mod.TextSrcDocument(filename, chunk_options=opt)
+    return [c.data for c in doc]
+
+
+def random_doc(rnd: random.Random) -> str:
+    return "".join(rnd.choices(PIECES, k=rnd.randint(0, 400)))
+
+
+# ----------------------------------------------------------------
+
+
+def test100_boundary():
+    """
+    Safe boundaries for each mode
+    """
+    buf = "uno dos\n  \ntres\ncuatro\n\ncinco".encode("utf-8")
+    find = boundary_finder("line", {})
+    assert find_boundary(buf, 0, find) == 11
+    assert find_boundary(buf, 12, find) == 16
+    find = boundary_finder("paragraph", {})
+    assert find_boundary(buf, 0, find) == 11
+    assert find_boundary(buf, 12, find) == 24
+    assert find_boundary(buf, 25, find) == len(buf)
+    find = boundary_finder("paragraph", {"min_words": 1})
+    assert find_boundary(buf, 0, find) == 24
+    find = boundary_finder("word", {})
+    assert find_boundary(buf, 1, find) == 4
+
+
+def test110_ranges():
+    """
+    Ranges cover the whole buffer, and start at a character start
+    """
+    buf = ("ñandú " * 100).encode("utf-8")
+    ranges = byte_ranges(buf, 0, 20, boundary_finder("word", {}))
+    assert len(ranges) > 10
+    assert ranges[0][0] == 0 and ranges[-1][1] == len(buf)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert buf[start:].decode("utf-8").startswith("ñandú")
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("opt", OPTIONS, ids=str)
+def test200_parallel(name, opt):
+    """
+    Parallel chunking of real documents
+    """
+    exp = chunks(name, **opt)
+    assert chunks(name, workers=2, range_size=300, **opt) == exp
+
+
+@pytest.mark.parametrize("opt", OPTIONS, ids=str)
+def test210_random(tmp_path, opt):
+    """
+    Parallel chunking of random documents, with small ranges, and with the
+    source index
+    """
+    rnd = random.Random(11)
+    name = tmp_path / "doc.txt"
+    for _ in range(10):
+        text = random_doc(rnd)
+        name.write_text(text, encoding="utf-8")
+        exp = chunks(name, **opt)
+        doc = mod.TextSrcDocument(name, chunk_options={
+            "workers": 2, "range_size": rnd.randint(1, 40),
+            "source_index": True, **opt})
+        got = [c.data for c in doc]
+        assert got == exp
+        for chunk, entry in zip(got, source_index(doc)):
+            assert text[entry["offset"]:entry["offset"]+entry["length"]] == chunk
+
+
+@pytest.mark.parametrize("opt", OPTIONS, ids=str)
+def test215_crlf(tmp_path, opt):
+    """
+    Files with CRLF line endings produce the same chunks as with sequential
+    reading
+    """
+    rnd = random.Random(13)
+    name = tmp_path / "doc.txt"
+    for _ in range(5):
+        text = random_doc(rnd).replace("\n", "\r\n")
+        name.write_bytes(text.encode("utf-8"))
+        exp = chunks(name, **opt)
+        assert chunks(name, workers=2, range_size=20, **opt) == exp
+    for src in DOCS[:2]:
+        name.write_bytes(src.read_bytes().replace(b"\n", b"\r\n"))
+        exp = chunks(name, **opt)
+        assert chunks(name, workers=2, range_size=300, **opt) == exp
+
+
+def test220_fallback():
+    """
+    Modes that cannot be chunked in parallel use sequential reading
+    """
+    name = DOCS[0]
+    for opt in ({"mode": "token", "max_tokens": 50}, {"mode": "single"}):
+        assert chunks(name, workers=2, range_size=100, **opt) == \
+            chunks(name, **opt)
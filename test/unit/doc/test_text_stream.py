@@ -0,0 +1,216 @@
+"""
+Test reading plain text files in streaming mode
+"""
+
+import gzip
+from pathlib import Path
+
+import pytest
+
+from pii_data.types.doc.localdoc import SequenceLocalSrcDocument
+
+import pii_preprocess.doc.text.load as mod
+from pii_preprocess.doc.text.read.base import BaseReader
+from pii_preprocess.doc.text.read.read_tree import TreeChunks
+
+
+DATADIR = Path(__file__).parents[2] / "data" / "text" / "lang"
+
+DOCS = sorted(DATADIR.glob("*.txt"))
+
+
+def chunks(filename: Path, **opt):
+    """
+    Read a document and return its chunk data
+    """
+    doc = mod.TextSrcDocument(filename, chunk_options=opt)
+    return [c.data for c in doc]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_use_streaming():
+    """
+    Check the decision to use streaming
+    """
+    name = DOCS[0]
+    assert BaseReader().use_streaming(name) is False
+    assert BaseReader({"streaming": True}).use_streaming(name) is True
+    assert BaseReader({"memory_budget": 1000}).use_streaming(name) is True
+    assert BaseReader({"streaming": False,
+                       "memory_budget": 1000}).use_streaming(name) is False
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("max_words", [1, 11, 100])
+def test110_words(name, max_words):
+    """
+    Streaming word chunks are identical to in-memory ones
+    """
+    exp = chunks(name, mode="word", max_words=max_words)
+    got = chunks(name, mode="word", max_words=max_words, streaming=True,
+                 block_size=61)
+    assert got == exp
+
+
+def test120_words_reiterate():
+    """
+    A streaming document can be iterated more than once
+    """
+    doc = mod.TextSrcDocument(DOCS[0], chunk_options={"mode": "word",
+                                                      "memory_budget": 1000})
+    got1 = [c.data for c in doc]
+    got2 = [c.data for c in doc]
+    assert len(got1) > 1
+    assert got1 == got2
+
+
+def test130_words_compressed(tmp_path):
+    """
+    Streaming from a compressed file
+    """
+    name = tmp_path / "doc.txt.gz"
+    with gzip.open(name, "wb") as f:
+        f.write(DOCS[0].read_bytes())
+    exp = chunks(DOCS[0], mode="word")
+    got = chunks(name, mode="word", streaming=True)
+    assert got == exp
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+def test200_lines(name):
+    """
+    Streaming line chunks are identical to in-memory ones
+    """
+    exp = chunks(name, mode="line")
+    got = chunks(name, mode="line", streaming=True)
+    assert got == exp
+
+
+@pytest.mark.parametrize("data", [
+    "\n\n  first\n  \n\nsecond \n third\n",
+    "first\nsecond\nunterminated",
+    "first\n\n   ",
+    " \t\n",
+    ""
+])
+def test210_lines_blank(data, tmp_path):
+    """
+    Streaming line chunks, with blank & unterminated lines
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text(data, encoding="utf-8")
+    exp = chunks(name, mode="line")
+    got = chunks(name, mode="line", streaming=True)
+    assert got == exp
+    assert "" not in got
+
+
+def test220_lines_reiterate():
+    """
+    A streaming line document can be iterated more than once
+    """
+    doc = mod.TextSrcDocument(DOCS[0], chunk_options={"mode": "line",
+                                                      "streaming": True})
+    got1 = [c.data for c in doc]
+    got2 = [c.data for c in doc]
+    assert len(got1) > 1
+    assert got1 == got2
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("opt", [
+    {},
+    {"eos": True},
+    {"min_words": 20},
+    {"max_words": 30},
+    {"eos": True, "min_words": 10, "max_words": 30}
+], ids=str)
+def test300_paragraphs(name, opt):
+    """
+    Streaming paragraph chunks are identical to in-memory ones
+    """
+    exp = chunks(name, mode="paragraph", **opt)
+    for block_size in (7, 100, 4096):
+        got = chunks(name, mode="paragraph", streaming=True,
+                     block_size=block_size, **opt)
+        assert got == exp
+
+
+def test310_paragraphs_boundaries(tmp_path):
+    """
+    Streaming paragraphs, with separators crossing block boundaries
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text("one two.\n \n\nthree!\n  four\n\n\n\n  five.  \n",
+                    encoding="utf-8")
+    for eos in (False, True):
+        exp = chunks(name, mode="paragraph", eos=eos)
+        for block_size in range(1, 12):
+            got = chunks(name, mode="paragraph", eos=eos, streaming=True,
+                         block_size=block_size)
+            assert got == exp
+
+
+def tree_ids(chunks):
+    """
+    The tree structure of a sequence of chunks, as nested (id, children)
+    """
+    return [(c["id"], tree_ids(c.get("chunks", []))) for c in chunks]
+
+
+def test400_tree():
+    """
+    Streaming tree documents are identical to in-memory ones
+    """
+    name = DATADIR.parent / "doc-example.txt"
+    exp = mod.TextSrcDocument(name, chunk_options={"mode": "tree"})
+    got = mod.TextSrcDocument(name, chunk_options={"mode": "tree",
+                                                   "streaming": True})
+    assert type(got) is type(exp)
+    assert list(got.iter_struct()) == list(exp.iter_struct())
+    assert list(got) == list(exp)
+
+
+def test410_tree_dedent(tmp_path):
+    """
+    A dedent of several levels closes all of them
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text("a\n  b\n    c\n      d\n  e\nf\n    g\n  h\n")
+    exp = [("1", [("2", [("3", [("4", [])])]), ("5", [])]),
+           ("6", [("7", []), ("8", [])])]
+    for streaming in (False, True):
+        doc = mod.TextSrcDocument(name, chunk_options={"mode": "tree",
+                                                       "streaming": streaming})
+        assert tree_ids(doc.iter_struct()) == exp
+
+
+def test420_tree_incremental():
+    """
+    Top-level subtrees are produced as soon as they are complete
+    """
+    consumed = []
+
+    def lines():
+        for n, line in enumerate(["a\n", "  b\n", "c\n", "  d\n", "e\n"]):
+            consumed.append(n)
+            yield line
+
+    it = iter(TreeChunks(lines(), 2))
+    assert next(it)["id"] == "1"
+    # (one line is read ahead, to attach the blank lines after a chunk)
+    assert consumed == [0, 1, 2, 3]
+
+
+def test430_tree_sequence(tmp_path):
+    """
+    A document with no nested lines is a sequence document
+    """
+    name = tmp_path / "doc.txt"
+    name.write_text("a\nb\n\nc\n")
+    doc = mod.TextSrcDocument(name, chunk_options={"mode": "tree",
+                                                   "streaming": True})
+    assert isinstance(doc, SequenceLocalSrcDocument)
+    assert [c.data for c in doc] == ["a\n", "b\n\n", "c\n"]
@@ -0,0 +1,115 @@
+"""
+Test reading plain text files in token mode
+"""
+
+from pathlib import Path
+
+import pytest
+
+from pii_data.helper.exception import InvArgException
+
+import pii_preprocess.doc.text.load as mod
+from pii_preprocess.doc.text.read.read_para import ParagraphSplitter
+from pii_preprocess.doc.text.read.read_tokens import TokenSplitter
+
+
+DATADIR = Path(__file__).parents[2] / "data" / "text" / "lang"
+
+DOCS = sorted(DATADIR.glob("*.txt"))
+
+
+def whitespace_tokenizer(text: str):
+    """
+    A tokenizer returning a list of tokens
+    """
+    return text.split()
+
+
+def chunks(filename: Path, **opt):
+    doc = mod.TextSrcDocument(filename, chunk_options={"mode": "token", **opt})
+    return [c.data for c in doc]
+
+
+# ----------------------------------------------------------------
+
+
+@pytest.mark.parametrize("name", DOCS, ids=lambda n: n.stem)
+@pytest.mark.parametrize("max_tokens", [30, 100, 1000])
+def test100_estimator(name, max_tokens):
+    """
+    Chunks fit the budget, hold all the text, and are well filled
+    """
+    got = chunks(name, max_tokens=max_tokens, chars_per_token=3)
+    assert "".join(got) == name.read_text(encoding="utf-8")
+    for c in got:
+        assert len(c)/3 <= max_tokens
+    # All but the last chunk are (about) half full
+    for c in got[:-1]:
+        assert len(c)/3 >= 0.4*max_tokens
+
+
+def test110_tokenizer():
+    """
+    Use a tokenizer, given as a name or as a callable
+    """
+    name = DOCS[1]
+    for tok in (whitespace_tokenizer, __name__ + ".whitespace_tokenizer"):
+        got = chunks(name, max_tokens=30, tokenizer=tok)
+        assert "".join(got) == name.read_text(encoding="utf-8")
+        for c in got:
+            assert len(c.split()) <= 30
+
+
+def test120_split():
+    """
+    A paragraph larger than the budget is split at word boundaries, and its
+    last piece is packed with the next paragraph
+    """
+    doc = "one two three four five six seven\n\neight\n\nnine ten"
+    sp = TokenSplitter(ParagraphSplitter(doc, {}),
+                       {"max_tokens": 3, "tokenizer": whitespace_tokenizer})
+    assert list(sp) == ["one two three ", "four five six ",
+                        "seven\n\neight\n\n", "nine ten"]
+
+
+def test130_long_word():
+    """
+    A word larger than the budget is cut
+    """
+    sp = TokenSplitter(ParagraphSplitter("a " + "x"*25 + " b", {}),
+                       {"max_tokens": 2, "chars_per_token": 5})
+    got = list(sp)
+    assert "".join(got) == "a " + "x"*25 + " b"
+    assert all(len(c) <= 10 for c in got)
+
+
+def test135_long_first_word():
+    """
+    A paragraph starting with a word larger than the budget produces no
+    empty chunks
+    """
+    for doc in ("y"*100 + " end", "a b c d e f g\n\n" + "y"*100 + " end"):
+        sp = TokenSplitter(ParagraphSplitter(doc, {}),
+                           {"max_tokens": 8, "chars_per_token": 4})
+        got = list(sp)
+        assert "".join(got) == doc
+        assert all(got)
+        assert all(len(c) <= 32 for c in got)
+
+
+@pytest.mark.parametrize("opt", [{"streaming": True, "block_size": 50},
+                                 {"mmap": True}], ids=str)
+def test140_streaming(opt):
+    """
+    Token chunks are identical in streaming & memory-mapped reading
+    """
+    for name in DOCS:
+        exp = chunks(name, max_tokens=40)
+        assert chunks(name, max_tokens=40, **opt) == exp
+
+
+def test150_invalid():
+    with pytest.raises(InvArgException):
+        chunks(DOCS[0], max_tokens=0)
+    with pytest.raises(InvArgException):
+        chunks(DOCS[0], chars_per_token=0)
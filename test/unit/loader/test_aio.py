@@ -0,0 +1,143 @@
+
+import time
+import asyncio
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc.document import TreeSrcDocument, TableSrcDocument
+
+from pii_preprocess.loader.loader import DocumentLoader, LoaderEntry
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+DOCS = [
+    DATADIR / "csv" / "table-example.csv",
+    DATADIR / "msword" / "example-headings.docx",
+    DATADIR / "example.blargh",
+    DATADIR / "text" / "doc-example.txt",
+]
+
+
+class SlowDocument:
+
+    def __new__(cls, name, metadata=None):
+        time.sleep(float(Path(name).stem))
+        return DocumentLoader().load(DATADIR / "text" / "doc-example.txt")
+
+
+def slow_loader() -> DocumentLoader:
+    """
+    Create a loader with a type for slow documents
+    """
+    obj = DocumentLoader()
+    obj.add_config({"types": [{"mime": "x-slow", "ext": ".slow"}]})
+    obj._plan[".slow"] = (LoaderEntry("x-slow", SlowDocument, {}, {}, None),)
+    return obj
+
+
+async def collect(it):
+    return [r async for r in it]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_aload():
+    """Test async load of a single document"""
+    obj = DocumentLoader()
+    doc = asyncio.run(obj.aload(DOCS[1]))
+    assert isinstance(doc, TreeSrcDocument)
+    assert list(doc) == list(obj.load(DOCS[1]))
+
+
+def test110_aload_error():
+    """Test async load of an invalid document"""
+    obj = DocumentLoader()
+    with pytest.raises(ProcException):
+        asyncio.run(obj.aload(DOCS[2]))
+
+
+def test200_aiter_many():
+    """Test async load of many documents"""
+    obj = DocumentLoader()
+    got = asyncio.run(collect(obj.aiter_many(DOCS, concurrency=2)))
+    got = sorted(got, key=lambda r: r.index)
+    assert [r.name for r in got] == DOCS
+    assert isinstance(got[0].doc, TableSrcDocument)
+    assert isinstance(got[2].error, ProcException)
+    assert got[3].error is None
+
+
+def test210_aiter_many_async_source():
+    """Test async load of many documents, async source of names"""
+    async def names():
+        for n in DOCS:
+            await asyncio.sleep(0)
+            yield n
+
+    obj = DocumentLoader()
+    got = asyncio.run(collect(obj.aiter_many(names())))
+    assert sorted(r.index for r in got) == [0, 1, 2, 3]
+
+
+def test220_aiter_many_process():
+    """Test async load of many documents, process executor"""
+    obj = DocumentLoader()
+
+    async def run():
+        with ProcessPoolExecutor(2) as pool:
+            return await collect(obj.aiter_many(DOCS, executor=pool))
+
+    got = sorted(asyncio.run(run()), key=lambda r: r.index)
+    assert isinstance(got[1].doc, TreeSrcDocument)
+    assert list(got[1].doc) == list(obj.load(DOCS[1]))
+
+
+def test300_timeout():
+    """Test per-document timeouts"""
+    obj = slow_loader()
+    names = ["0.01.slow", "1.slow"]
+    got = asyncio.run(collect(obj.aiter_many(names, timeout=0.5)))
+    got = sorted(got, key=lambda r: r.index)
+    assert got[0].error is None
+    assert str(got[1].error) == "timeout loading document: 1.slow"
+
+
+def test305_timeout_slots():
+    """Test that a timed out load keeps its slot until it finishes"""
+    obj = slow_loader()
+    names = ["0.8.slow", "0.01.slow"]
+
+    async def run():
+        t0 = time.time()
+        out = []
+        async for res in obj.aiter_many(names, concurrency=1, timeout=0.2):
+            out.append((res, time.time() - t0))
+        return out
+
+    got = asyncio.run(run())
+    assert str(got[0][0].error) == "timeout loading document: 0.8.slow"
+    assert got[0][1] < 0.6
+    assert got[1][0].error is None
+    assert got[1][1] > 0.75
+
+
+def test310_cancel():
+    """Test abandoning an iteration"""
+    obj = slow_loader()
+    names = ["0.01.slow", "0.5.slow", "0.5.slow", "0.5.slow"]
+
+    async def run():
+        it = obj.aiter_many(names, concurrency=4)
+        first = await it.__anext__()
+        await it.aclose()
+        return first
+
+    t0 = time.time()
+    got = asyncio.run(run())
+    assert got.index == 0
+    assert time.time() - t0 < 2
@@ -0,0 +1,67 @@
+
+from pathlib import Path
+
+from pii_data.helper.exception import ProcException
+from pii_data.types.doc.document import TreeSrcDocument, TableSrcDocument
+
+import pii_preprocess.loader.loader as mod
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+DOCS = [
+    DATADIR / "csv" / "table-example.csv",
+    DATADIR / "msword" / "example-headings.docx",
+    DATADIR / "example.blargh",
+    DATADIR / "text" / "doc-example.txt",
+]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_load_many_seq():
+    """Test batch load, in-process"""
+    obj = mod.DocumentLoader()
+    got = obj.load_many(DOCS, workers=1)
+
+    assert [r.index for r in got] == [0, 1, 2, 3]
+    assert [r.name for r in got] == DOCS
+    assert isinstance(got[0].doc, TableSrcDocument)
+    assert isinstance(got[1].doc, TreeSrcDocument)
+    assert got[2].doc is None
+    assert isinstance(got[2].error, ProcException)
+    assert got[3].error is None
+
+
+def test110_load_many_pool():
+    """Test batch load, process pool"""
+    obj = mod.DocumentLoader()
+    got = obj.load_many(DOCS, workers=2)
+
+    assert [r.index for r in got] == [0, 1, 2, 3]
+    assert isinstance(got[0].doc, TableSrcDocument)
+    assert isinstance(got[1].doc, TreeSrcDocument)
+    assert str(got[2].error) == f"cannot find a type for file: {DOCS[2]}"
+
+    # Documents loaded in workers contain the same chunks
+    for r in (got[0], got[1], got[3]):
+        exp = list(obj.load(r.name))
+        assert exp == list(r.doc)
+
+
+def test120_iter_many_unordered():
+    """Test batch load, process pool, unordered"""
+    obj = mod.DocumentLoader()
+    got = list(obj.iter_many(DOCS, workers=2, ordered=False))
+    assert sorted(r.index for r in got) == [0, 1, 2, 3]
+    assert sum(r.error is not None for r in got) == 1
+
+
+def test130_load_many_metadata():
+    """Test batch load, additional metadata"""
+    obj = mod.DocumentLoader()
+    meta = {"dataset": {"name": "test"}}
+    got = obj.load_many(DOCS[:2], workers=2, metadata=meta)
+    for r in got:
+        assert r.doc.metadata["dataset"] == {"name": "test"}
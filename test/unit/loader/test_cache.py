@@ -0,0 +1,149 @@
+
+import os
+import shutil
+from pathlib import Path
+
+import pii_preprocess.loader.cache as mod
+from pii_preprocess.loader import DocumentLoader
+from pii_preprocess.doc.srcindex import source_index
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+DOCS = ["csv/table-example.csv", "msword/example-headings.docx",
+        "text/doc-example.txt"]
+
+
+# ----------------------------------------------------------------
+
+
+def test100_constructor(tmp_path):
+    """Test object creation"""
+    obj = mod.ConversionCache(tmp_path)
+    assert str(obj) == f"<ConversionCache {tmp_path}>"
+
+
+def test110_key(tmp_path):
+    """Test cache keys"""
+    name = tmp_path / "doc.txt"
+    name.write_text("some text\n")
+    obj = mod.ConversionCache(tmp_path / "cache")
+    key1 = obj.key(name, "abc")
+    assert key1 == obj.key(name, "abc")
+    assert key1 != obj.key(name, "abd")
+    assert key1 != obj.key(name, "abc", {"document": {"lang": "en"}})
+
+    # Changing the file changes the key
+    os.utime(name, ns=(0, 0))
+    assert key1 != obj.key(name, "abc")
+
+    # Non-existing files cannot be cached
+    assert obj.key(tmp_path / "none.txt", "abc") is None
+
+
+def test200_load(tmp_path):
+    """Test loading documents through the cache"""
+    obj = DocumentLoader(cache=tmp_path)
+    ref = DocumentLoader()
+    for name in DOCS:
+        exp = list(ref.load(DATADIR / name))
+
+        # First load, stored in the cache
+        doc = obj.load(DATADIR / name)
+        assert list(doc) == exp
+
+        # Second load: cache hit
+        doc2 = obj.load(DATADIR / name)
+        assert doc2.__class__ == doc.__class__
+        assert dict(doc2.metadata) == dict(doc.metadata)
+        assert list(doc2) == exp
+
+
+def test210_load_hit(tmp_path):
+    """Test that a cache hit skips the format readers"""
+    name = DATADIR / "csv" / "table-example.csv"
+    obj = DocumentLoader(cache=tmp_path / "cache")
+    exp = list(obj.load(name))
+    obj._plan[".csv"] = ()      # no loader available any more
+    assert list(obj.load(name)) == exp
+
+
+def test220_load_changed(tmp_path):
+    """Test that modified files are reloaded"""
+    name = tmp_path / "doc.txt"
+    shutil.copy(DATADIR / "text" / "doc-example.txt", name)
+    obj = DocumentLoader(cache=tmp_path / "cache")
+    exp = list(obj.load(name))
+
+    with open(name, "a", encoding="utf-8") as f:
+        f.write("\nA new paragraph\n")
+    os.utime(name, ns=(0, 0))
+    got = list(obj.load(name))
+    assert len(got) == len(exp) + 1
+    assert got[-1].data == "A new paragraph\n"
+
+
+def test230_iter_options(tmp_path):
+    """Test that cache hits keep the document iteration options"""
+    obj = DocumentLoader(cache=tmp_path / "cache")
+    obj.add_config({"loaders": {"text/csv": {
+        "class": "pii_preprocess.doc.LocalCsvDocument",
+        "class_kwargs": {"iter_options": {"context": True}}
+    }}})
+    name = DATADIR / "csv" / "table-example.csv"
+    doc = obj.load(name)
+    doc2 = obj.load(name)
+    assert doc2._iter_options == doc._iter_options == {"context": True}
+    assert list(doc2) == list(doc)
+
+
+def test240_source_index(tmp_path):
+    """Test that the source index is kept by local documents & cache hits"""
+    obj = DocumentLoader(cache=tmp_path / "cache")
+    obj.add_config({"loaders": {"text/csv": {
+        "class": "pii_preprocess.doc.LocalCsvDocument",
+        "class_kwargs": {"source_index": True}
+    }}})
+    name = DATADIR / "csv" / "table-example.csv"
+    doc = obj.load(name)
+    index = source_index(doc)
+    assert index is not None and index.complete
+    doc2 = obj.load(name)
+    assert list(source_index(doc2)) == list(index)
+
+    # Batch loading in worker processes
+    got = list(obj.iter_many([name], workers=2))
+    assert list(source_index(got[0].doc)) == list(index)
+
+
+def test300_evict(tmp_path):
+    """Test LRU eviction"""
+    cache = mod.ConversionCache(tmp_path / "cache")
+    obj = DocumentLoader(cache=cache)
+    for name in DOCS:
+        obj.load(DATADIR / name)
+    entries = sorted(e.path for e in cache._entries())
+    assert len(entries) == 3
+    for n, path in enumerate(entries):      # set access order
+        os.utime(path, ns=(n*1000, n*1000))
+
+    # Evict down to the size of the two newest entries
+    sizes = [os.stat(p).st_size for p in entries]
+    cache.evict(sizes[1] + sizes[2])
+    assert sorted(e.path for e in cache._entries()) == entries[1:]
+
+    cache.clear()
+    assert list(cache._entries()) == []
+
+
+def test310_size(tmp_path):
+    """Test that overwriting an entry does not grow the cache size"""
+    cache = mod.ConversionCache(tmp_path / "cache")
+    obj = DocumentLoader(cache=cache)
+    doc = obj.load(DATADIR / DOCS[0])
+    key = cache.key(DATADIR / DOCS[0], obj.config_hash())
+    size = cache._size
+    for _ in range(3):
+        cache.put(key, doc)
+    assert cache._size == size == sum(e.stat().st_size
+                                      for e in cache._entries())
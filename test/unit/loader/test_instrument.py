@@ -0,0 +1,101 @@
+
+import json
+from pathlib import Path
+
+import pii_preprocess.instrument as mod
+from pii_preprocess.loader import DocumentLoader
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+DOCS = [
+    DATADIR / "csv" / "table-example.csv",
+    DATADIR / "msword" / "example-headings.docx",
+    DATADIR / "text" / "doc-example.txt",
+    DATADIR / "example.blargh",
+]
+
+
+def check_stats(stats):
+    """Check the collected stats for the test documents"""
+    docs = [stats.docs[str(d)] for d in DOCS]
+    for doc in docs[:3]:
+        assert doc["failed"] == []
+        assert doc["bytes"] > 0
+        assert doc["load_time"] > 0
+        assert doc["open_time"] > 0
+        assert doc["chunks"] > 0
+        assert doc["complete"] is True
+        assert doc["chunk_size"]["min"] <= doc["chunk_size"]["max"]
+        assert sum(doc["chunk_size"]["hist"].values()) == doc["chunks"]
+
+    assert docs[0]["reader"] == "LocalCsvDocument"
+    assert docs[1]["loader"] == "MsWordDocument"
+    assert docs[1]["reader"] == "TreeMsWordDocument"
+    assert docs[2]["mime"] == "text/plain"
+    assert docs[3]["mime"] is None
+
+    summary = stats.summary()
+    assert summary["text/csv"]["documents"] == 1
+    assert summary["error"]["documents"] == 1
+
+
+# ----------------------------------------------------------------
+
+
+def test100_no_hooks():
+    """Test that chunks are not wrapped when there are no hooks"""
+    chunks = ["a", "b"]
+    assert mod.track_chunks("x", chunks) is chunks
+
+
+def test110_track():
+    """Test chunk tracking"""
+    events = []
+    hook = lambda ev, data: events.append((ev, data))
+    mod.add_hook(hook)
+    try:
+        chunks = mod.track_chunks("x", ["a", "bcd", {"data": "ef"}],
+                                  reiterable=True)
+        assert list(chunks) == ["a", "bcd", {"data": "ef"}]
+        assert len(list(chunks)) == 3
+    finally:
+        mod.remove_hook(hook)
+
+    assert len(events) == 2
+    ev, data = events[0]
+    assert ev == "doc.chunks"
+    assert data["name"] == "x"
+    assert data["chunks"] == 3
+    assert data["size"] == {"min": 1, "max": 3, "total": 6,
+                            "hist": {2: 1, 4: 2}}
+
+
+def test200_collector():
+    """Test the stats collector, in-process"""
+    with mod.StatsCollector() as stats:
+        for res in DocumentLoader().iter_many(DOCS, workers=1):
+            if res.doc:
+                list(res.doc.iter_full())
+    assert not mod.active()
+    check_stats(stats)
+
+
+def test210_collector_workers():
+    """Test the stats collector, with worker processes"""
+    with mod.StatsCollector() as stats:
+        DocumentLoader().load_many(DOCS, workers=2)
+    check_stats(stats)
+
+
+def test220_dump(tmp_path):
+    """Test dumping stats to JSON"""
+    with mod.StatsCollector() as stats:
+        doc = DocumentLoader().load(DOCS[0])
+        list(doc.iter_full())
+    outname = tmp_path / "stats.json"
+    stats.dump(outname)
+    with open(outname, encoding="utf-8") as f:
+        got = json.load(f)
+    assert got["format"] == mod.FMT_STATS
+    assert got["summary"]["text/csv"]["chunks"] == got["documents"][0]["chunks"]
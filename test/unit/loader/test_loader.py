@@ -87,3 +87,114 @@ def test230_load_csv(fix_uuid):
     name = DATADIR / "csv" / "table-example.csv"
     doc = obj.load(name)
     assert str(doc) == f"<CsvDocument file={name}>"
+
+
+def test300_plan():
+    """Test the compiled dispatch plan"""
+    obj = mod.DocumentLoader()
+    name = DATADIR / "csv" / "table-example.csv"
+    obj.load(name)
+    plan = obj._plan[".csv"]
+    assert len(plan) == 1
+    assert plan[0].mime == "text/csv"
+    assert plan[0].cls.__name__ == "LocalCsvDocument"
+
+    # The plan is reused
+    obj.load(name)
+    assert obj._plan[".csv"] is plan
+
+    # Adding config invalidates the plan
+    obj.add_config({})
+    assert ".csv" not in obj._plan
+
+
+def test310_plan_metadata():
+    """Test that config metadata is not modified by loads"""
+    obj = mod.DocumentLoader()
+    conf = {"loaders": {"text/csv": {
+        "class": "pii_preprocess.doc.LocalCsvDocument",
+        "class_kwargs": {"metadata": {"dataset": {"name": "test"}}}
+    }}}
+    obj.add_config(conf)
+    name = DATADIR / "csv" / "table-example.csv"
+
+    doc1 = obj.load(name, metadata={"dataset": {"version": "1"},
+                                    "default_lang": "en"})
+    doc2 = obj.load(name)
+    assert doc1.metadata["dataset"] == {"version": "1"}
+    assert doc1.metadata["document"]["main_lang"] == "en"
+    assert doc2.metadata["dataset"] == {"name": "test"}
+    assert obj.loaders["text/csv"]["class_kwargs"]["metadata"] == {
+        "dataset": {"name": "test"}}
+
+
+def test320_csv_columns():
+    """Test a column selection & row filter in the loader config"""
+    obj = mod.DocumentLoader()
+    conf = {"loaders": {"text/csv": {
+        "class": "pii_preprocess.doc.LocalCsvDocument",
+        "class_kwargs": {"columns": ["Name", 5], "row_filter": "builtins.all"}
+    }}}
+    obj.add_config(conf)
+    doc = obj.load(DATADIR / "csv" / "table-example.csv")
+    assert doc.metadata["column"]["name"] == ["Name", "Amount"]
+    got = [r["data"] for r in doc.iter_base()]
+    assert got == [["John Smith", "12.39"], ["Erik Jonsk", "11.99"],
+                   ["John Smith", "339.99"]]
+
+
+def test400_sniff_noext(tmp_path):
+    """Test loading files with no extension, by sniffing their contents"""
+    import shutil
+    obj = mod.DocumentLoader()
+    for name, cls in (("csv/table-example.csv", "LocalCsvDocument"),
+                      ("msword/example-headings.docx", "TreeMsWordDocument"),
+                      ("text/doc-example.txt", "SequenceLocalSrcDocument")):
+        dest = tmp_path / Path(name).stem
+        shutil.copy(DATADIR / name, dest)
+        doc = obj.load(dest)
+        assert doc.__class__.__name__ == cls
+
+
+def test410_sniff_mislabelled(tmp_path):
+    """Test loading a file with a wrong extension"""
+    import shutil
+    dest = tmp_path / "example.txt"
+    shutil.copy(DATADIR / "msword" / "example-headings.docx", dest)
+
+    # By default, the extension is trusted
+    obj = mod.DocumentLoader()
+    assert [e.mime for e in obj.candidates(dest)] == ["text/plain"]
+
+    # Sniff always
+    obj = mod.DocumentLoader(sniff=True)
+    assert [e.mime for e in obj.candidates(dest)] == ["application/msword"]
+    doc = obj.load(dest)
+    assert doc.__class__.__name__ == "TreeMsWordDocument"
+
+
+def test420_sniff_multiple(tmp_path):
+    """Test an extension mapping to more than one type"""
+    obj = mod.DocumentLoader()
+    obj.add_config({"types": [{"mime": "text/plain", "ext": ".csv",
+                               "sniffer": "text"}]})
+    assert [e.mime for e in obj._compile(".csv")] == ["text/csv", "text/plain"]
+
+    # A real CSV file (it is also valid text, but the CSV loader goes first)
+    name = DATADIR / "csv" / "table-example.csv"
+    assert [e.mime for e in obj.candidates(name)] == ["text/csv", "text/plain"]
+
+    # A text file with a .csv extension
+    dest = tmp_path / "example.csv"
+    dest.write_text("Just a line of text.\nAnd another one.\n")
+    assert [e.mime for e in obj.candidates(dest)] == ["text/plain"]
+
+
+def test430_sniff_none(tmp_path):
+    """Test a file that cannot be identified"""
+    obj = mod.DocumentLoader()
+    dest = tmp_path / "example"
+    dest.write_bytes(b"\x00\x01\x02\x03")
+    with pytest.raises(ProcException) as e:
+        obj.load(dest)
+    assert str(e.value) == f"cannot find a type for file: {dest}"
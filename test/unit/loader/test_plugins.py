@@ -0,0 +1,116 @@
+
+import pytest
+
+import pii_preprocess.loader.plugins as mod
+from pii_preprocess.loader import DocumentLoader
+
+PLUGIN = {
+    "mime": "application/x-blargh",
+    "ext": ".blargh",
+    "class": "pii_preprocess.doc.text.TextSrcDocument",
+    "class_kwargs": {"chunk_options": {"mode": "line"}},
+    "sniffer": "text"
+}
+
+
+class FakeEntryPoint:
+
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def load(self):
+        if isinstance(self.value, Exception):
+            raise self.value
+        return self.value
+
+
+@pytest.fixture
+def fix_eps(monkeypatch):
+    """
+    Monkey-patch the entry point discovery
+    """
+    eps = []
+    scans = []
+
+    def entry_points():
+        scans.append(1)
+        return eps
+
+    monkeypatch.setattr(mod, "_entry_points", entry_points)
+    return eps, scans
+
+
+# ----------------------------------------------------------------
+
+
+def test100_scan(fix_eps):
+    """Test scanning entry points"""
+    eps, _ = fix_eps
+    eps.append(FakeEntryPoint("blargh", PLUGIN))
+    eps.append(FakeEntryPoint("other", lambda: [dict(PLUGIN, mime="x/y")]))
+    got = mod.scan_plugins()
+    assert [p["plugin"] for p in got] == ["blargh", "other"]
+    assert got[1]["mime"] == "x/y"
+
+
+def test110_scan_error(fix_eps):
+    """Test scanning entry points, with invalid plugins"""
+    eps, _ = fix_eps
+    eps.append(FakeEntryPoint("bad1", ImportError("no module")))
+    eps.append(FakeEntryPoint("bad2", {"mime": "x/y"}))
+    eps.append(FakeEntryPoint("blargh", PLUGIN))
+    with pytest.warns(UserWarning):
+        got = mod.scan_plugins()
+    assert [p["plugin"] for p in got] == ["blargh"]
+
+
+def test120_cache(fix_eps, tmp_path):
+    """Test the plugin registry cache"""
+    eps, scans = fix_eps
+    eps.append(FakeEntryPoint("blargh", PLUGIN))
+    cachefile = tmp_path / "plugins.json"
+
+    got1 = mod.discover_plugins(cachefile)
+    assert cachefile.is_file()
+    got2 = mod.discover_plugins(cachefile)
+    assert got1 == got2
+    assert len(scans) == 1
+
+    mod.discover_plugins(cachefile, refresh=True)
+    assert len(scans) == 2
+
+
+def test130_cache_invalid(fix_eps, tmp_path, monkeypatch):
+    """Test that the cache is invalidated when the Python path changes"""
+    eps, scans = fix_eps
+    cachefile = tmp_path / "plugins.json"
+    mod.discover_plugins(cachefile)
+    monkeypatch.syspath_prepend(str(tmp_path / "newdir"))
+    (tmp_path / "newdir").mkdir()
+    mod.discover_plugins(cachefile)
+    assert len(scans) == 2
+
+
+def test200_loader(fix_eps, tmp_path):
+    """Test loading a document with a plugin loader"""
+    eps, _ = fix_eps
+    cachefile = tmp_path / "plugins.json"
+    name = tmp_path / "example.blargh"
+    name.write_text("a first line\nand a second line\n", encoding="utf-8")
+
+    obj = DocumentLoader(plugins=cachefile)
+    assert ".blargh" not in obj.types
+
+    eps.append(FakeEntryPoint("blargh", PLUGIN))
+    obj = DocumentLoader(plugins=cachefile)
+    assert ".blargh" not in obj.types       # cached
+
+    mod.discover_plugins(cachefile, refresh=True)
+    obj = DocumentLoader(plugins=cachefile)
+    assert obj.candidates(name)[0].mime == PLUGIN["mime"]
+    doc = obj.load(name)
+    assert len(list(doc)) == 2
+
+    obj = DocumentLoader(plugins=False)
+    assert PLUGIN["mime"] not in obj.loaders
@@ -0,0 +1,81 @@
+
+from pathlib import Path
+
+import pytest
+
+from pii_data.helper.exception import ConfigException
+
+import pii_preprocess.loader.sniff as mod
+
+
+DATADIR = Path(__file__).parents[2] / "data"
+
+
+def prefix(name: str) -> bytes:
+    return mod.read_prefix(DATADIR / name)
+
+
+# ----------------------------------------------------------------
+
+
+def test100_read_prefix():
+    """Test reading a file prefix"""
+    got = prefix("csv/table-example.csv")
+    assert got.startswith(b"Date,Name,")
+    assert mod.read_prefix(DATADIR / "non-existing-file") is None
+
+
+def test110_decode_prefix():
+    """Test decoding a file prefix"""
+    assert mod.decode_prefix("año".encode("utf-8")) == "año"
+    assert mod.decode_prefix("año".encode("utf-8")[:2]) == "a"
+    assert mod.decode_prefix(b"a\0b") is None
+    assert mod.decode_prefix(b"a\xffb") is None
+
+
+def test200_sniff_docx():
+    """Test sniffing MS Word files"""
+    assert mod.sniff_ooxml_word(prefix("msword/example-headings.docx"))
+    assert mod.sniff_ooxml_word(prefix("msword/example.docx"))
+    assert not mod.sniff_ooxml_word(prefix("csv/table-example.csv"))
+
+
+def test201_sniff_xlsx(tmp_path):
+    """Test sniffing other Office files"""
+    import zipfile
+    name = tmp_path / "example.xlsx"
+    with zipfile.ZipFile(name, "w") as z:
+        z.writestr("[Content_Types].xml", "<Types/>")
+        z.writestr("xl/workbook.xml", "<workbook/>")
+    assert not mod.sniff_ooxml_word(mod.read_prefix(name))
+
+
+def test210_sniff_csv():
+    """Test sniffing CSV files"""
+    assert mod.sniff_csv(prefix("csv/table-example.csv"))
+    assert mod.sniff_csv(b"a;b;c\n1;2;3\n")
+    assert not mod.sniff_csv(b"a,b\n1,2,3\n")
+    assert not mod.sniff_csv(prefix("text/doc-example.txt"))
+    assert not mod.sniff_csv(prefix("msword/example-headings.docx"))
+
+
+def test220_sniff_srcdoc():
+    """Test sniffing serialized Source Documents"""
+    assert mod.sniff_src_document(prefix("csv/table-example.yml"))
+    assert mod.sniff_src_document(b'{"format": "piisa:src-document:v1"}')
+    assert not mod.sniff_src_document(prefix("text/doc-example.txt"))
+
+
+def test230_sniff_text():
+    """Test sniffing text files"""
+    assert mod.sniff_text(prefix("text/doc-example.txt"))
+    assert mod.sniff_text(prefix("text/lang/zh-yangtze.txt"))
+    assert not mod.sniff_text(prefix("msword/example-headings.docx"))
+
+
+def test300_get_sniffer():
+    """Test fetching sniffers"""
+    assert mod.get_sniffer("csv") is mod.sniff_csv
+    assert mod.get_sniffer("pii_preprocess.loader.sniff.sniff_text") is mod.sniff_text
+    with pytest.raises(ConfigException):
+        mod.get_sniffer("blargh")